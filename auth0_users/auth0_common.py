@@ -0,0 +1,291 @@
+import gzip
+import json
+import logging
+import time
+import requests
+from urllib.parse import quote
+
+from call_metrics import get_http_outcome, timed_call
+from run_report import record_action
+
+logging.basicConfig(level=logging.INFO)
+
+auth0_users_per_page = 100
+auth0_page_search_limit = 1000
+auth0_user_fields = "user_id,email,multifactor"
+auth0_export_job_poll_interval = 2
+auth0_export_job_max_poll_interval = 30
+auth0_export_job_timeout = 3600
+
+
+def get_auth0_base_url(auth0_domain):
+    if auth0_domain.startswith("http://") or auth0_domain.startswith("https://"):
+        return auth0_domain.rstrip("/")
+    return f"https://{auth0_domain}"
+
+
+def create_auth0_session(base_url, client_id, client_secret):
+    session = requests.Session()
+    try:
+        logging.debug(f"Requesting Auth0 Management API token from {base_url}")
+        with timed_call(service="auth0", operation="get_token") as call:
+            response = session.post(
+                url=f"{base_url}/oauth/token",
+                json={
+                    "grant_type": "client_credentials",
+                    "client_id": client_id,
+                    "client_secret": client_secret,
+                    "audience": f"{base_url}/api/v2/",
+                },
+                timeout=30,
+            )
+            call["outcome"] = get_http_outcome(status_code=response.status_code)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logging.error(f"Unable to obtain Auth0 Management API token: {e}")
+        exit(1)
+    session.headers.update(
+        {"Authorization": f"Bearer {response.json()['access_token']}"}
+    )
+    return session
+
+
+def send_auth0_request(session, method, url, operation, params=None, max_attempts=5):
+    for attempt in range(1, max_attempts + 1):
+        with timed_call(service="auth0", operation=operation) as call:
+            response = session.request(method=method, url=url, params=params, timeout=30)
+            call["outcome"] = get_http_outcome(status_code=response.status_code)
+        if response.status_code != 429:
+            break
+        retry_after = int(response.headers.get("Retry-After", attempt))
+        logging.info(
+            f"Auth0 rate limit reached, retrying in {retry_after} seconds (attempt {attempt} of {max_attempts})"
+        )
+        time.sleep(retry_after)
+    return response
+
+
+def get_auth0_api(session, url, operation, params=None, max_attempts=5):
+    response = send_auth0_request(
+        session=session,
+        method="GET",
+        url=url,
+        operation=operation,
+        params=params,
+        max_attempts=max_attempts,
+    )
+    try:
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logging.error(f"Unable to query Auth0 Management API {url}: {e}")
+        exit(1)
+    return response.json()
+
+
+def get_auth0_users_by_page(base_url, session, per_page=auth0_users_per_page):
+    page = 0
+    fetched = 0
+    while True:
+        data = get_auth0_api(
+            session=session,
+            url=f"{base_url}/api/v2/users",
+            operation="list_users",
+            params={
+                "page": page,
+                "per_page": per_page,
+                "include_totals": "true",
+                "fields": auth0_user_fields,
+                "include_fields": "true",
+            },
+        )
+        users = data["users"]
+        for user in users:
+            yield user
+        fetched += len(users)
+        page += 1
+        if not users or fetched >= data["total"]:
+            return
+        if fetched >= auth0_page_search_limit:
+            logging.warning(
+                f"Reached the Auth0 paginated search limit of {auth0_page_search_limit} users out of "
+                f"{data['total']}, remaining users cannot be listed using page based pagination"
+            )
+            return
+
+
+def get_auth0_users_by_checkpoint(base_url, session, per_page=auth0_users_per_page):
+    checkpoint = None
+    while True:
+        params = {
+            "take": per_page,
+            "fields": auth0_user_fields,
+            "include_fields": "true",
+        }
+        if checkpoint:
+            params["from"] = checkpoint
+        data = get_auth0_api(
+            session=session,
+            url=f"{base_url}/api/v2/users",
+            operation="list_users",
+            params=params,
+        )
+        users = data["users"]
+        for user in users:
+            yield user
+        checkpoint = data.get("next")
+        if not users or not checkpoint:
+            return
+
+
+def create_auth0_users_export_job(base_url, session):
+    try:
+        logging.info("Submitting Auth0 users export job")
+        with timed_call(service="auth0", operation="create_users_export_job") as call:
+            response = session.post(
+                url=f"{base_url}/api/v2/jobs/users-exports",
+                json={
+                    "format": "json",
+                    "fields": [
+                        {"name": field} for field in auth0_user_fields.split(",")
+                    ],
+                },
+                timeout=30,
+            )
+            call["outcome"] = get_http_outcome(status_code=response.status_code)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logging.error(f"Unable to submit Auth0 users export job: {e}")
+        exit(1)
+    job_id = response.json()["id"]
+    logging.info(f"Submitted Auth0 users export job {job_id}")
+    return job_id
+
+
+def wait_for_auth0_export_job(
+    base_url,
+    job_id,
+    session,
+    poll_interval=auth0_export_job_poll_interval,
+    timeout=auth0_export_job_timeout,
+):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = get_auth0_api(
+            session=session, url=f"{base_url}/api/v2/jobs/{job_id}", operation="get_job"
+        )
+        if job["status"] == "completed":
+            logging.info(f"Auth0 users export job {job_id} has completed")
+            return job["location"]
+        if job["status"] == "failed":
+            logging.error(f"Auth0 users export job {job_id} has failed: {job}")
+            exit(1)
+        logging.info(
+            f"Auth0 users export job {job_id} is {job['status']}, checking again in {poll_interval} seconds"
+        )
+        time.sleep(poll_interval)
+        poll_interval = min(poll_interval * 2, auth0_export_job_max_poll_interval)
+    logging.error(f"Auth0 users export job {job_id} did not complete within {timeout} seconds")
+    exit(1)
+
+
+def get_auth0_users_from_export(location):
+    try:
+        logging.info("Streaming Auth0 users export")
+        with timed_call(service="auth0", operation="download_users_export") as call:
+            response = requests.get(url=location, stream=True, timeout=30)
+            call["outcome"] = get_http_outcome(status_code=response.status_code)
+        with response:
+            response.raise_for_status()
+            response.raw.decode_content = False
+            with gzip.GzipFile(fileobj=response.raw) as export_file:
+                for line in export_file:
+                    if line.strip():
+                        yield json.loads(line)
+    except requests.RequestException as e:
+        logging.error(f"Unable to download Auth0 users export: {e}")
+        exit(1)
+
+
+def get_auth0_users_by_export_job(
+    base_url, session, poll_interval=auth0_export_job_poll_interval
+):
+    job_id = create_auth0_users_export_job(base_url=base_url, session=session)
+    location = wait_for_auth0_export_job(
+        base_url=base_url, job_id=job_id, session=session, poll_interval=poll_interval
+    )
+    return get_auth0_users_from_export(location=location)
+
+
+def check_auth0_user_has_mfa_enabled(auth0_user):
+    if auth0_user.get("multifactor"):
+        return True
+    else:
+        return False
+
+
+def get_mfa_disabled_auth0_users(auth0_users):
+    for auth0_user in auth0_users:
+        if not check_auth0_user_has_mfa_enabled(auth0_user=auth0_user):
+            yield auth0_user.get("email") or auth0_user["user_id"]
+
+
+def get_mfa_disabled_auth0_users_from_api(
+    auth0_domain, client_id, client_secret, pagination="page"
+):
+    base_url = get_auth0_base_url(auth0_domain=auth0_domain)
+    session = create_auth0_session(
+        base_url=base_url, client_id=client_id, client_secret=client_secret
+    )
+    if pagination == "export":
+        auth0_users = get_auth0_users_by_export_job(base_url=base_url, session=session)
+    elif pagination == "checkpoint":
+        auth0_users = get_auth0_users_by_checkpoint(base_url=base_url, session=session)
+    else:
+        auth0_users = get_auth0_users_by_page(base_url=base_url, session=session)
+    return get_mfa_disabled_auth0_users(auth0_users=auth0_users)
+
+
+def get_auth0_users_by_email(base_url, session, email):
+    return get_auth0_api(
+        session=session,
+        url=f"{base_url}/api/v2/users-by-email",
+        operation="get_users_by_email",
+        params={"email": email, "fields": auth0_user_fields, "include_fields": "true"},
+    )
+
+
+def delete_auth0_user(base_url, session, user_id):
+    response = send_auth0_request(
+        session=session,
+        method="DELETE",
+        url=f"{base_url}/api/v2/users/{quote(user_id, safe='')}",
+        operation="delete_user",
+    )
+    if response.status_code == 404:
+        logging.info(f"Auth0 user {user_id} does not exist, continuing")
+        record_action(action="auth0_user_deletion", outcome="not_found")
+        return False
+    try:
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logging.error(f"Unable to delete Auth0 user {user_id}: {e}")
+        record_action(action="auth0_user_deletion", outcome="failed")
+        exit(1)
+    logging.info(f"Deleted Auth0 user {user_id}")
+    record_action(action="auth0_user_deletion", outcome="deleted")
+    return True
+
+
+def delete_auth0_users_by_email(auth0_domain, client_id, client_secret, email):
+    base_url = get_auth0_base_url(auth0_domain=auth0_domain)
+    session = create_auth0_session(
+        base_url=base_url, client_id=client_id, client_secret=client_secret
+    )
+    auth0_users = get_auth0_users_by_email(base_url=base_url, session=session, email=email)
+    if not auth0_users:
+        logging.info(f"Could not find an Auth0 user with email {email}, continuing")
+    return [
+        auth0_user["user_id"]
+        for auth0_user in auth0_users
+        if delete_auth0_user(base_url=base_url, session=session, user_id=auth0_user["user_id"])
+    ]
@@ -1,6 +1,9 @@
 import argparse
 import logging
-from notifications_python_client.notifications import NotificationsAPIClient
+import os
+from auth0_common import get_mfa_disabled_auth0_users_from_api
+from notify_common import create_notification, send_notifications
+from run_report import run_with_report
 
 logging.basicConfig(level=logging.INFO)
 
@@ -20,11 +23,27 @@ def parse_arguments():
         dest="auth0_tenant",
         required=True,
     )
+    parser.add_argument(
+        "--auth0-domain",
+        help="The domain of the Auth0 Tenant to query for users who do not have MFA enabled, using the "
+        "AUTH0_CLIENT_ID and AUTH0_CLIENT_SECRET environment variables",
+        dest="auth0_domain",
+        required=False,
+    )
+    parser.add_argument(
+        "--auth0-pagination",
+        help="The pagination method to use when querying the Auth0 Management API (defaults to page), export "
+        "uses a bulk users export job for tenants beyond the paginated search limit",
+        dest="auth0_pagination",
+        choices=["page", "checkpoint", "export"],
+        default="page",
+        required=False,
+    )
     parser.add_argument(
         "--mfa-disabled-users",
-        help="Comma separated list of Auth0 users who do not have MFA enabled",
+        help="Comma separated list of Auth0 users who do not have MFA enabled, used instead of --auth0-domain",
         dest="mfa_disabled_users",
-        required=True,
+        required=False,
     )
     parser.add_argument(
         "--template-id",
@@ -32,15 +51,29 @@ def parse_arguments():
         dest="template_id",
         required=True,
     )
-    return parser.parse_args()
+    args = parser.parse_args()
+    if not args.auth0_domain and not args.mfa_disabled_users:
+        parser.error("one of --auth0-domain or --mfa-disabled-users is required")
+    return args
 
 
-def get_args(args=parse_arguments()):
+def get_args(args):
     api_key = args.api_key
     auth0_tenant = args.auth0_tenant
-    mfa_disabled_users = args.mfa_disabled_users
     template_id = args.template_id
-    return api_key, auth0_tenant, mfa_disabled_users, template_id
+    return api_key, auth0_tenant, template_id
+
+
+def get_mfa_disabled_users(args):
+    if args.auth0_domain:
+        logging.info(f"Obtaining users who do not have MFA enabled from {args.auth0_domain}")
+        return get_mfa_disabled_auth0_users_from_api(
+            auth0_domain=args.auth0_domain,
+            client_id=os.environ.get("AUTH0_CLIENT_ID"),
+            client_secret=os.environ.get("AUTH0_CLIENT_SECRET"),
+            pagination=args.auth0_pagination,
+        )
+    return args.mfa_disabled_users.split(",")
 
 
 def check_auth0_user_has_email_address(auth0_user):
@@ -50,34 +83,35 @@ def check_auth0_user_has_email_address(auth0_user):
         return False
 
 
-def send_email_via_notify(api_key, email_address, auth0_tenant, template_id):
-    notifications_client = NotificationsAPIClient(api_key)
-    notifications_client.send_email_notification(
-        email_address=email_address,
-        template_id=template_id,
-        personalisation={"auth0_user": email_address, "auth0_tenant": auth0_tenant},
-    )
-
-
-def send_email_handler():
-    api_key, auth0_tenant, mfa_disabled_users, template_id = get_args(
-        args=parse_arguments()
-    )
-    for auth0_user in mfa_disabled_users.split(","):
+def get_mfa_notifications(auth0_tenant, mfa_disabled_users, template_id):
+    for auth0_user in mfa_disabled_users:
         user_has_email_address = check_auth0_user_has_email_address(auth0_user=auth0_user)
         if user_has_email_address:
             logging.info(
-                f"Sending email notification to {auth0_user} to request MFA is enabled"
+                f"Queueing email notification to {auth0_user} to request MFA is enabled"
             )
-            send_email_via_notify(
-                api_key=api_key,
-                auth0_tenant=auth0_tenant,
+            yield create_notification(
+                notification_type="auth0_mfa",
                 email_address=auth0_user,
-                template_id=template_id
+                template_id=template_id,
+                auth0_tenant=auth0_tenant,
             )
-            logging.info(f"Email sent to {auth0_user} regarding MFA")
         else:
             logging.info(f"{auth0_user} does not appear to be in an email address format, no email to be sent")
 
 
-send_email_handler()
+def send_email_handler():
+    args = parse_arguments()
+    api_key, auth0_tenant, template_id = get_args(args=args)
+    send_notifications(
+        api_key=api_key,
+        notifications=get_mfa_notifications(
+            auth0_tenant=auth0_tenant,
+            mfa_disabled_users=get_mfa_disabled_users(args=args),
+            template_id=template_id,
+        ),
+    )
+
+
+if __name__ == "__main__":
+    run_with_report(flow="auth0_mfa_disabled", function=send_email_handler)
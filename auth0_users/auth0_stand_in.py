@@ -0,0 +1,124 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+stand_in_access_token = "stand-in-token"
+
+
+def create_auth0_users_export(auth0_users):
+    export = "".join(f"{json.dumps(auth0_user)}\n" for auth0_user in auth0_users)
+    return gzip.compress(export.encode())
+
+
+def create_auth0_stand_in_handler(auth0_users):
+    export_job_polls = {}
+
+    class Auth0StandInHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status_code, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path == "/oauth/token":
+                self.send_json(200, {"access_token": stand_in_access_token})
+            elif self.path == "/api/v2/jobs/users-exports":
+                job_id = f"job_{len(export_job_polls)}"
+                export_job_polls[job_id] = 0
+                self.send_json(201, {"id": job_id, "status": "pending"})
+            else:
+                self.send_json(404, {"message": "Not Found"})
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {key: value[0] for key, value in parse_qs(url.query).items()}
+            if url.path.startswith("/exports/"):
+                body = create_auth0_users_export(auth0_users=auth0_users)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif self.headers.get("Authorization") != f"Bearer {stand_in_access_token}":
+                self.send_json(401, {"message": "Unauthorized"})
+            elif url.path.startswith("/api/v2/jobs/"):
+                job_id = url.path.rsplit("/", 1)[-1]
+                export_job_polls[job_id] += 1
+                if export_job_polls[job_id] < 2:
+                    self.send_json(200, {"id": job_id, "status": "processing"})
+                else:
+                    self.send_json(
+                        200,
+                        {
+                            "id": job_id,
+                            "status": "completed",
+                            "location": f"http://{self.headers['Host']}/exports/{job_id}.json.gz",
+                        },
+                    )
+            elif url.path == "/api/v2/users-by-email":
+                self.send_json(
+                    200,
+                    [
+                        auth0_user
+                        for auth0_user in auth0_users
+                        if auth0_user.get("email") == params.get("email")
+                    ],
+                )
+            elif url.path != "/api/v2/users":
+                self.send_json(404, {"message": "Not Found"})
+            elif "take" in params:
+                start = int(params.get("from", 0))
+                end = start + int(params["take"])
+                payload = {"users": auth0_users[start:end]}
+                if end < len(auth0_users):
+                    payload["next"] = str(end)
+                self.send_json(200, payload)
+            else:
+                per_page = int(params.get("per_page", 50))
+                start = int(params.get("page", 0)) * per_page
+                users = auth0_users[start:start + per_page]
+                self.send_json(
+                    200,
+                    {
+                        "start": start,
+                        "limit": per_page,
+                        "length": len(users),
+                        "total": len(auth0_users),
+                        "users": users,
+                    },
+                )
+
+        def do_DELETE(self):
+            url = urlparse(self.path)
+            user_id = unquote(url.path.rsplit("/", 1)[-1])
+            if self.headers.get("Authorization") != f"Bearer {stand_in_access_token}":
+                self.send_json(401, {"message": "Unauthorized"})
+                return
+            for auth0_user in auth0_users:
+                if url.path.startswith("/api/v2/users/") and auth0_user["user_id"] == user_id:
+                    auth0_users.remove(auth0_user)
+                    self.send_response(204)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+            self.send_json(404, {"message": "Not Found"})
+
+    return Auth0StandInHandler
+
+
+def start_auth0_stand_in(auth0_users):
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), create_auth0_stand_in_handler(auth0_users=auth0_users)
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    return server, base_url
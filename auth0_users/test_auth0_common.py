@@ -0,0 +1,97 @@
+from auth0_common import (
+    create_auth0_session, delete_auth0_users_by_email, get_auth0_base_url,
+    get_auth0_users_by_export_job,
+    get_mfa_disabled_auth0_users, get_mfa_disabled_auth0_users_from_api
+)
+from auth0_stand_in import start_auth0_stand_in
+
+import pytest
+
+
+def create_auth0_users(number_of_users: int):
+    auth0_users = []
+    for user_number in range(number_of_users):
+        auth0_user = {
+            "user_id": f"auth0|{user_number}",
+            "email": f"user{user_number}@example.com",
+        }
+        if user_number % 3 == 0:
+            auth0_user["multifactor"] = ["guardian"]
+        auth0_users.append(auth0_user)
+    return auth0_users
+
+
+@pytest.fixture
+def auth0_stand_in():
+    auth0_users = create_auth0_users(number_of_users=250)
+    server, base_url = start_auth0_stand_in(auth0_users=auth0_users)
+    yield auth0_users, base_url
+    server.shutdown()
+
+
+def test_get_auth0_base_url():
+    assert get_auth0_base_url("tenant.eu.auth0.com") == "https://tenant.eu.auth0.com"
+    assert get_auth0_base_url("http://127.0.0.1:8080/") == "http://127.0.0.1:8080"
+
+
+def test_get_mfa_disabled_auth0_users():
+    auth0_users = [
+        {"user_id": "auth0|1", "email": "user1@example.com", "multifactor": ["guardian"]},
+        {"user_id": "auth0|2", "email": "user2@example.com", "multifactor": []},
+        {"user_id": "auth0|3"},
+    ]
+
+    result = list(get_mfa_disabled_auth0_users(auth0_users=auth0_users))
+
+    assert result == ["user2@example.com", "auth0|3"]
+
+
+@pytest.mark.parametrize("pagination", ["page", "checkpoint"])
+def test_get_mfa_disabled_auth0_users_from_api(auth0_stand_in, pagination):
+    auth0_users, base_url = auth0_stand_in
+
+    result = list(get_mfa_disabled_auth0_users_from_api(
+        auth0_domain=base_url,
+        client_id="client-id",
+        client_secret="client-secret",
+        pagination=pagination,
+    ))
+
+    assert len(result) == 166
+    assert result == [user["email"] for user in auth0_users if "multifactor" not in user]
+
+
+def test_get_auth0_users_by_export_job(auth0_stand_in):
+    auth0_users, base_url = auth0_stand_in
+    session = create_auth0_session(
+        base_url=base_url, client_id="client-id", client_secret="client-secret"
+    )
+
+    result = list(get_mfa_disabled_auth0_users(
+        auth0_users=get_auth0_users_by_export_job(
+            base_url=base_url, session=session, poll_interval=0.01
+        )
+    ))
+
+    assert len(result) == 166
+    assert result == [user["email"] for user in auth0_users if "multifactor" not in user]
+
+
+def test_delete_auth0_users_by_email(auth0_stand_in):
+    auth0_users, base_url = auth0_stand_in
+
+    deleted_user_ids = delete_auth0_users_by_email(
+        auth0_domain=base_url,
+        client_id="client-id",
+        client_secret="client-secret",
+        email="user1@example.com",
+    )
+
+    assert deleted_user_ids == ["auth0|1"]
+    assert "auth0|1" not in [auth0_user["user_id"] for auth0_user in auth0_users]
+    assert delete_auth0_users_by_email(
+        auth0_domain=base_url,
+        client_id="client-id",
+        client_secret="client-secret",
+        email="user1@example.com",
+    ) == []
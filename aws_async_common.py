@@ -0,0 +1,146 @@
+import asyncio
+import botocore.exceptions
+import contextlib
+import logging
+import os
+from aiobotocore.config import AioConfig
+from aiobotocore.session import get_session
+from aws_client_registry import get_client_retries
+from call_metrics import instrument_boto3_client
+
+logging.basicConfig(level=logging.INFO)
+
+aws_async_max_pool_connections = int(os.environ.get("AWS_ASYNC_MAX_POOL_CONNECTIONS", 100))
+aws_async_max_concurrency = int(os.environ.get("AWS_ASYNC_MAX_CONCURRENCY", 50))
+aws_async_download_chunk_size = 1024 * 1024
+
+
+def create_async_session():
+    return get_session()
+
+
+@contextlib.asynccontextmanager
+async def create_async_client(
+    session,
+    service_name,
+    region_name="eu-west-2",
+    credentials=None,
+    max_pool_connections=aws_async_max_pool_connections,
+):
+    client_config = AioConfig(
+        max_pool_connections=max_pool_connections,
+        retries=get_client_retries(service_name=service_name),
+    )
+    credentials = credentials or {}
+    async with session.create_client(
+        service_name,
+        region_name=region_name,
+        config=client_config,
+        aws_access_key_id=credentials.get("AccessKeyId"),
+        aws_secret_access_key=credentials.get("SecretAccessKey"),
+        aws_session_token=credentials.get("SessionToken"),
+    ) as client:
+        yield instrument_boto3_client(client)
+
+
+async def assume_role(sts_client, account_id, role_name, role_session_name="ccs-user-management"):
+    try:
+        response = await sts_client.assume_role(
+            RoleArn=f"arn:aws:iam::{account_id}:role/{role_name}",
+            RoleSessionName=role_session_name,
+        )
+        return response["Credentials"]
+    except botocore.exceptions.ClientError as e:
+        logging.error(f"Unable to assume role {role_name} in AWS account {account_id}: {e}")
+        exit(1)
+
+
+async def gather_with_concurrency(coroutines, max_concurrency=aws_async_max_concurrency):
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_with_semaphore(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run_with_semaphore(coroutine) for coroutine in coroutines))
+
+
+def check_if_user_in_ignore_list(username, ignore_list):
+    users_to_ignore = ignore_list.split(",")
+    if users_to_ignore:
+        for user_to_ignore in users_to_ignore:
+            if user_to_ignore == username:
+                user_should_be_ignored = True
+                return user_should_be_ignored
+
+
+async def get_objects_from_s3(folder_path, ignore_list, s3_bucket_name, s3_client):
+    try:
+        objects_from_s3 = []
+        logging.info(
+            f"Attempting to obtain list of files from path {folder_path} in {s3_bucket_name}"
+        )
+        paginator = s3_client.get_paginator("list_objects_v2")
+        async for page in paginator.paginate(Bucket=s3_bucket_name, Prefix=folder_path):
+            for object in page.get("Contents", []):
+                if object["Key"] == folder_path:
+                    continue
+                if check_if_user_in_ignore_list(username=object["Key"], ignore_list=ignore_list):
+                    logging.info(f'{object["Key"]} is in the ignore list, so no action to be taken')
+                    continue
+                objects_from_s3.append({"key": object["Key"], "size": object["Size"]})
+        logging.info("List of files successfully obtained")
+        return objects_from_s3
+    except botocore.exceptions.ClientError as e:
+        logging.error(
+            f"Unable to obtain list of files in {folder_path} path for {s3_bucket_name}: {e}"
+        )
+        exit(1)
+
+
+async def get_file_from_s3(filepath_name, output_filename, s3_bucket_name, s3_client):
+    try:
+        logging.info(f"Attempting to download file {filepath_name} - outputting to: {output_filename}")
+        response = await s3_client.get_object(Bucket=s3_bucket_name, Key=filepath_name)
+        with open(output_filename, "wb") as output_file:
+            async with response["Body"] as body:
+                async for chunk in body.iter_chunks(chunk_size=aws_async_download_chunk_size):
+                    output_file.write(chunk)
+        logging.info(f"Successfully downloaded and saved as {output_filename}")
+    except botocore.exceptions.ClientError as e:
+        logging.error(f"Unable to download {filepath_name}: {e}")
+        exit(1)
+
+
+async def delete_file_within_folder(s3_client, bucket_name, bucket_resource):
+    try:
+        logging.debug(f"Deleting {bucket_resource} from S3 Bucket: {bucket_name}")
+        await s3_client.delete_object(Bucket=bucket_name, Key=bucket_resource)
+        logging.info(f"Successfully deleted {bucket_resource}")
+    except botocore.exceptions.ClientError as e:
+        logging.error(f"Failed to delete {bucket_resource} from S3 Bucket: {bucket_name}: {e}")
+        exit(1)
+
+
+async def delete_all_files_within_folder(
+    s3_client, bucket_name, bucket_path, max_concurrency=aws_async_max_concurrency
+):
+    logging.info(f"Checking for content in {bucket_path} folder for {bucket_name}")
+    objects_from_s3 = await get_objects_from_s3(
+        folder_path=f"{bucket_path}/",
+        ignore_list="",
+        s3_bucket_name=bucket_name,
+        s3_client=s3_client,
+    )
+    await gather_with_concurrency(
+        (
+            delete_file_within_folder(
+                s3_client=s3_client,
+                bucket_name=bucket_name,
+                bucket_resource=object_from_s3["key"],
+            )
+            for object_from_s3 in objects_from_s3
+        ),
+        max_concurrency=max_concurrency,
+    )
+    return len(objects_from_s3)
@@ -0,0 +1,125 @@
+import boto3
+import botocore.exceptions
+import datetime
+import logging
+import os
+import threading
+from botocore.config import Config
+from call_metrics import instrument_boto3_client
+
+logging.basicConfig(level=logging.INFO)
+
+aws_default_region = "eu-west-2"
+aws_client_max_pool_connections = int(os.environ.get("AWS_CLIENT_MAX_POOL_CONNECTIONS", 50))
+aws_client_connect_timeout_seconds = int(os.environ.get("AWS_CLIENT_CONNECT_TIMEOUT_SECONDS", 5))
+aws_client_read_timeout_seconds = int(os.environ.get("AWS_CLIENT_READ_TIMEOUT_SECONDS", 60))
+aws_credentials_refresh_margin = datetime.timedelta(minutes=5)
+aws_client_config = Config(
+    max_pool_connections=aws_client_max_pool_connections,
+    connect_timeout=aws_client_connect_timeout_seconds,
+    read_timeout=aws_client_read_timeout_seconds,
+    tcp_keepalive=True,
+    retries={"max_attempts": 5, "mode": "adaptive"},
+)
+# IAM calls are retried by call_iam_api, so botocore only sends each of them once
+aws_client_service_retries = {
+    "iam": {"total_max_attempts": 1, "mode": "standard"},
+}
+aws_client_registry = {
+    "session": None,
+    "clients": {},
+    "client_locks": {},
+    "lock": threading.RLock(),
+}
+
+
+def get_session():
+    with aws_client_registry["lock"]:
+        if aws_client_registry["session"] is None:
+            if boto3.DEFAULT_SESSION is None:
+                boto3.setup_default_session()
+            aws_client_registry["session"] = boto3.DEFAULT_SESSION
+        return aws_client_registry["session"]
+
+
+def get_client_retries(service_name):
+    return aws_client_service_retries.get(service_name, aws_client_config.retries)
+
+
+def assume_role(account_id, role_name, region_name=aws_default_region):
+    sts_client = get_client(service_name="sts", region_name=region_name)
+    try:
+        logging.debug(f"Assuming role {role_name} in AWS account {account_id}")
+        return sts_client.assume_role(
+            RoleArn=f"arn:aws:iam::{account_id}:role/{role_name}",
+            RoleSessionName="ccs-user-management",
+        )["Credentials"]
+    except botocore.exceptions.ClientError as e:
+        logging.error(f"Unable to assume role {role_name} in AWS account {account_id}: {e}")
+        exit(1)
+
+
+def check_client_expired(registered_client):
+    expiration = registered_client["expiration"]
+    if expiration is None:
+        return False
+    return (
+        expiration - aws_credentials_refresh_margin
+        <= datetime.datetime.now(datetime.timezone.utc)
+    )
+
+
+def create_registered_client(service_name, region_name, account_id, role_name):
+    credentials = {}
+    expiration = None
+    if role_name:
+        role_credentials = assume_role(
+            account_id=account_id, role_name=role_name, region_name=region_name
+        )
+        credentials = {
+            "aws_access_key_id": role_credentials["AccessKeyId"],
+            "aws_secret_access_key": role_credentials["SecretAccessKey"],
+            "aws_session_token": role_credentials["SessionToken"],
+        }
+        expiration = role_credentials["Expiration"]
+    logging.debug(f"Creating {service_name} client in {region_name}")
+    # The shared boto3 session is not thread safe, so only creating the client happens under the registry lock
+    with aws_client_registry["lock"]:
+        client = instrument_boto3_client(
+            get_session().client(
+                service_name,
+                region_name=region_name,
+                config=aws_client_config.merge(
+                    Config(retries=get_client_retries(service_name=service_name))
+                ),
+                **credentials,
+            )
+        )
+    return {"client": client, "expiration": expiration}
+
+
+def get_client(service_name, region_name=aws_default_region, account_id=None, role_name=None):
+    client_key = (service_name, region_name, account_id, role_name)
+    with aws_client_registry["lock"]:
+        client_lock = aws_client_registry["client_locks"].setdefault(client_key, threading.Lock())
+    # Assuming a role is a network call, so it only blocks other callers asking for the same client
+    with client_lock:
+        with aws_client_registry["lock"]:
+            registered_client = aws_client_registry["clients"].get(client_key)
+        if registered_client is None or check_client_expired(registered_client):
+            registered_client = create_registered_client(
+                service_name=service_name,
+                region_name=region_name,
+                account_id=account_id,
+                role_name=role_name,
+            )
+            with aws_client_registry["lock"]:
+                aws_client_registry["clients"][client_key] = registered_client
+        return registered_client["client"]
+
+
+def clear_client_registry():
+    with aws_client_registry["lock"]:
+        aws_client_registry["clients"].clear()
+        aws_client_registry["client_locks"].clear()
+        aws_client_registry["session"] = None
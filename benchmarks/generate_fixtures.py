@@ -0,0 +1,344 @@
+import argparse
+import csv
+import datetime
+import gzip
+import json
+import logging
+import os
+import random
+
+logging.basicConfig(level=logging.INFO)
+
+fixture_reference_time = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+inactivity_distributions = ("uniform", "exponential")
+credential_report_columns = [
+    "user",
+    "arn",
+    "user_creation_time",
+    "password_enabled",
+    "password_last_used",
+    "password_last_changed",
+    "password_next_rotation",
+    "mfa_active",
+    "access_key_1_active",
+    "access_key_1_last_rotated",
+    "access_key_1_last_used_date",
+    "access_key_1_last_used_region",
+    "access_key_1_last_used_service",
+    "access_key_2_active",
+    "access_key_2_last_rotated",
+    "access_key_2_last_used_date",
+    "access_key_2_last_used_region",
+    "access_key_2_last_used_service",
+    "cert_1_active",
+    "cert_1_last_rotated",
+    "cert_2_active",
+    "cert_2_last_rotated",
+]
+
+
+def parse_arguments():
+    description = "Arguments to generate synthetic IAM, Auth0 and GitHub fixtures for profiling"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--output-dir",
+        help="The directory to write the fixtures to",
+        dest="output_dir",
+        required=True,
+    )
+    parser.add_argument(
+        "--users",
+        help="The number of IAM and Auth0 users to generate (defaults to 1000)",
+        dest="users",
+        type=int,
+        default=1000,
+        required=False,
+    )
+    parser.add_argument(
+        "--accounts",
+        help="The number of AWS accounts to spread the IAM users across (defaults to 10)",
+        dest="accounts",
+        type=int,
+        default=10,
+        required=False,
+    )
+    parser.add_argument(
+        "--teams",
+        help="The number of GitHub teams to generate (defaults to 100)",
+        dest="teams",
+        type=int,
+        default=100,
+        required=False,
+    )
+    parser.add_argument(
+        "--min-team-size",
+        help="The minimum number of members in a GitHub team (defaults to 1)",
+        dest="min_team_size",
+        type=int,
+        default=1,
+        required=False,
+    )
+    parser.add_argument(
+        "--max-team-size",
+        help="The maximum number of members in a GitHub team (defaults to 25)",
+        dest="max_team_size",
+        type=int,
+        default=25,
+        required=False,
+    )
+    parser.add_argument(
+        "--email-username-ratio",
+        help="The proportion of IAM usernames that are email addresses (defaults to 0.7)",
+        dest="email_username_ratio",
+        type=float,
+        default=0.7,
+        required=False,
+    )
+    parser.add_argument(
+        "--mfa-enabled-ratio",
+        help="The proportion of IAM and Auth0 users with MFA enabled (defaults to 0.8)",
+        dest="mfa_enabled_ratio",
+        type=float,
+        default=0.8,
+        required=False,
+    )
+    parser.add_argument(
+        "--max-inactive-days",
+        help="The maximum number of days a user can be inactive for (defaults to 120)",
+        dest="max_inactive_days",
+        type=int,
+        default=120,
+        required=False,
+    )
+    parser.add_argument(
+        "--inactivity-distribution",
+        help="How inactive days are distributed, uniform or exponential (defaults to uniform)",
+        dest="inactivity_distribution",
+        choices=inactivity_distributions,
+        default="uniform",
+        required=False,
+    )
+    parser.add_argument(
+        "--seed",
+        help="The seed used to generate the fixtures (defaults to 1)",
+        dest="seed",
+        type=int,
+        default=1,
+        required=False,
+    )
+    return parser.parse_args()
+
+
+def generate_inactive_days(generator, max_inactive_days, inactivity_distribution):
+    if inactivity_distribution == "exponential":
+        return min(int(generator.expovariate(3 / max_inactive_days)), max_inactive_days - 1)
+    return generator.randrange(0, max_inactive_days)
+
+
+def generate_iam_users(
+    number_of_users,
+    number_of_accounts,
+    seed,
+    email_username_ratio=0.7,
+    mfa_enabled_ratio=0.8,
+    max_inactive_days=120,
+    inactivity_distribution="uniform",
+):
+    generator = random.Random(seed)
+    iam_users = []
+    for user_number in range(number_of_users):
+        if generator.random() < email_username_ratio:
+            iam_username = f"user{user_number}@example.com"
+        else:
+            iam_username = f"service-user-{user_number}"
+        iam_users.append(
+            {
+                "aws_account": str(100000000000 + generator.randrange(number_of_accounts)),
+                "iam_user": iam_username,
+                "inactive_number_of_days": generate_inactive_days(
+                    generator=generator,
+                    max_inactive_days=max_inactive_days,
+                    inactivity_distribution=inactivity_distribution,
+                ),
+                "mfa_active": generator.random() < mfa_enabled_ratio,
+            }
+        )
+    return iam_users
+
+
+def generate_auth0_users(number_of_users, seed, mfa_enabled_ratio=0.8):
+    generator = random.Random(seed)
+    auth0_users = []
+    for user_number in range(number_of_users):
+        auth0_user = {
+            "user_id": f"auth0|{user_number:08d}",
+            "email": f"user{user_number}@example.com",
+        }
+        if generator.random() < mfa_enabled_ratio:
+            auth0_user["multifactor"] = ["guardian"]
+        auth0_users.append(auth0_user)
+    return auth0_users
+
+
+def generate_github_teams(
+    number_of_teams, seed, min_team_size=1, max_team_size=25, number_of_members=None
+):
+    generator = random.Random(seed)
+    number_of_members = number_of_members or number_of_teams * max_team_size
+    github_teams = {}
+    for team_number in range(number_of_teams):
+        team_size = min(generator.randint(min_team_size, max_team_size), number_of_members)
+        github_teams[f"team-{team_number}"] = [
+            f"member-{member_number}"
+            for member_number in sorted(generator.sample(range(number_of_members), team_size))
+        ]
+    return github_teams
+
+
+def format_report_time(number_of_days_ago, reference_time=fixture_reference_time):
+    report_time = reference_time - datetime.timedelta(days=number_of_days_ago)
+    return report_time.strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+
+def write_stale_iam_users_csv(iam_users, csv_filename):
+    with open(csv_filename, "w", newline="") as csv_file:
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(["account_id", "iam_username", "inactivity_in_days"])
+        for iam_user in iam_users:
+            csv_writer.writerow(
+                [
+                    iam_user["aws_account"],
+                    iam_user["iam_user"],
+                    f"{iam_user['inactive_number_of_days']} days",
+                ]
+            )
+
+
+def write_no_mfa_users_csv(iam_users, csv_filename):
+    with open(csv_filename, "w", newline="") as csv_file:
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(["account_id", "arn", "iam_username"])
+        for iam_user in iam_users:
+            if iam_user["mfa_active"]:
+                continue
+            csv_writer.writerow(
+                [
+                    iam_user["aws_account"],
+                    f"arn:aws:iam::{iam_user['aws_account']}:user/{iam_user['iam_user']}",
+                    iam_user["iam_user"],
+                ]
+            )
+
+
+def write_credential_reports(iam_users, output_dir, reference_time=fixture_reference_time):
+    os.makedirs(output_dir, exist_ok=True)
+    iam_users_by_account = {}
+    for iam_user in iam_users:
+        iam_users_by_account.setdefault(iam_user["aws_account"], []).append(iam_user)
+    for aws_account, account_iam_users in sorted(iam_users_by_account.items()):
+        with open(os.path.join(output_dir, f"{aws_account}.csv"), "w", newline="") as csv_file:
+            csv_writer = csv.DictWriter(csv_file, fieldnames=credential_report_columns, restval="N/A")
+            csv_writer.writeheader()
+            for iam_user in account_iam_users:
+                last_used = format_report_time(
+                    number_of_days_ago=iam_user["inactive_number_of_days"],
+                    reference_time=reference_time,
+                )
+                csv_writer.writerow(
+                    {
+                        "user": iam_user["iam_user"],
+                        "arn": f"arn:aws:iam::{aws_account}:user/{iam_user['iam_user']}",
+                        "user_creation_time": format_report_time(
+                            number_of_days_ago=365, reference_time=reference_time
+                        ),
+                        "password_enabled": "true",
+                        "password_last_used": last_used,
+                        "mfa_active": str(iam_user["mfa_active"]).lower(),
+                        "access_key_1_active": "true",
+                        "access_key_1_last_used_date": last_used,
+                        "access_key_2_active": "false",
+                        "cert_1_active": "false",
+                        "cert_2_active": "false",
+                    }
+                )
+    return sorted(iam_users_by_account)
+
+
+def write_auth0_users_export(auth0_users, export_filename):
+    with gzip.open(export_filename, "wt") as export_file:
+        for auth0_user in auth0_users:
+            export_file.write(f"{json.dumps(auth0_user)}\n")
+
+
+def write_github_teams(github_teams, output_dir):
+    os.makedirs(os.path.join(output_dir, "members"), exist_ok=True)
+    with open(os.path.join(output_dir, "teams.json"), "w") as teams_file:
+        json.dump(
+            [
+                {"name": team_name, "id": team_number, "slug": team_name}
+                for team_number, team_name in enumerate(github_teams, start=1)
+            ],
+            teams_file,
+            indent=2,
+        )
+    for team_name, members in github_teams.items():
+        with open(os.path.join(output_dir, "members", f"{team_name}.json"), "w") as members_file:
+            json.dump(
+                [
+                    {"login": member, "id": int(member.rsplit("-", 1)[1])}
+                    for member in members
+                ],
+                members_file,
+                indent=2,
+            )
+
+
+def generate_fixtures():
+    args = parse_arguments()
+    iam_users = generate_iam_users(
+        number_of_users=args.users,
+        number_of_accounts=args.accounts,
+        seed=args.seed,
+        email_username_ratio=args.email_username_ratio,
+        mfa_enabled_ratio=args.mfa_enabled_ratio,
+        max_inactive_days=args.max_inactive_days,
+        inactivity_distribution=args.inactivity_distribution,
+    )
+    os.makedirs(args.output_dir, exist_ok=True)
+    write_stale_iam_users_csv(
+        iam_users=iam_users,
+        csv_filename=os.path.join(args.output_dir, "stale_iam_users.csv"),
+    )
+    write_no_mfa_users_csv(
+        iam_users=iam_users,
+        csv_filename=os.path.join(args.output_dir, "no_mfa_users.csv"),
+    )
+    aws_accounts = write_credential_reports(
+        iam_users=iam_users,
+        output_dir=os.path.join(args.output_dir, "credential_reports"),
+    )
+    write_auth0_users_export(
+        auth0_users=generate_auth0_users(
+            number_of_users=args.users,
+            seed=args.seed,
+            mfa_enabled_ratio=args.mfa_enabled_ratio,
+        ),
+        export_filename=os.path.join(args.output_dir, "auth0_users.json.gz"),
+    )
+    write_github_teams(
+        github_teams=generate_github_teams(
+            number_of_teams=args.teams,
+            seed=args.seed,
+            min_team_size=args.min_team_size,
+            max_team_size=args.max_team_size,
+        ),
+        output_dir=os.path.join(args.output_dir, "github"),
+    )
+    logging.info(
+        f"Written fixtures for {args.users} users across {len(aws_accounts)} accounts and "
+        f"{args.teams} GitHub teams to {args.output_dir}"
+    )
+
+
+if __name__ == "__main__":
+    generate_fixtures()
@@ -0,0 +1,369 @@
+import argparse
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "testing")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "testing")
+os.environ.setdefault("AWS_DEFAULT_REGION", "eu-west-2")
+os.environ.setdefault("GITHUB_ORG", "benchmark-org")
+os.environ.setdefault("IAM_REQUESTS_PER_SECOND", "100000")
+
+import boto3
+import responses
+from botocore.awsrequest import AWSResponse
+from moto import mock_iam, mock_s3, mock_secretsmanager
+from aws_client_registry import clear_client_registry
+from iam_common import build_iam_inventory, create_iam_client, delete_iam_user_handler
+from inactive_iam_users_orchestrator import get_list_of_files_from_s3
+from stale_iam_users import csv_file_handler
+from user_management_bucket_cleanup import delete_all_files_within_folder
+import remove_users
+from generate_fixtures import (
+    generate_github_teams,
+    generate_iam_users,
+    write_stale_iam_users_csv,
+)
+
+populations = {
+    "small": {"users": 10, "accounts": 2, "teams": 10, "max_team_size": 5},
+    "medium": {"users": 1000, "accounts": 10, "teams": 500, "max_team_size": 10},
+    "large": {"users": 50000, "accounts": 50, "teams": 500, "max_team_size": 25},
+}
+benchmark_api_key = "benchmark-26785a09-ab16-4eb0-8407-a37497a57506-3d844edf-8d35-48ac-975b-e847b4f122b0"
+benchmark_bucket_name = "ccs-user-management-benchmark"
+benchmark_policy_document = json.dumps(
+    {
+        "Version": "2012-10-17",
+        "Statement": [{"Effect": "Allow", "Action": "s3:ListBucket", "Resource": "*"}],
+    }
+)
+
+
+def parse_arguments():
+    description = "Arguments to benchmark the user management flows against local AWS, Notify and GitHub stand-ins"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--population",
+        help="The size of the synthetic population to benchmark against (defaults to small)",
+        dest="population",
+        choices=sorted(populations),
+        default="small",
+        required=False,
+    )
+    parser.add_argument(
+        "--latency-ms",
+        help="Latency in milliseconds to inject into every AWS, Notify and GitHub call (defaults to 0)",
+        dest="latency_ms",
+        type=float,
+        default=0,
+        required=False,
+    )
+    parser.add_argument(
+        "--seed",
+        help="The seed used to generate the synthetic population (defaults to 1)",
+        dest="seed",
+        type=int,
+        default=1,
+        required=False,
+    )
+    parser.add_argument(
+        "--benchmarks",
+        help="Comma separated list of benchmarks to run (defaults to all)",
+        dest="benchmarks",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--report-filename",
+        help="The name of the JSON file to write the benchmark report to",
+        dest="report_filename",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--compare-filename",
+        help="The name of a previous JSON benchmark report to compare the results with",
+        dest="compare_filename",
+        default=None,
+        required=False,
+    )
+    return parser.parse_args()
+
+
+def stub_list_service_specific_credentials(**kwargs):
+    return AWSResponse("https://iam.amazonaws.com/", 200, {}, None), {
+        "ServiceSpecificCredentials": []
+    }
+
+
+def inject_aws_latency(latency_seconds):
+    boto3.setup_default_session()
+    clear_client_registry()
+    boto3.DEFAULT_SESSION.events.register(
+        "before-call.iam.ListServiceSpecificCredentials",
+        stub_list_service_specific_credentials,
+    )
+    if latency_seconds:
+        boto3.DEFAULT_SESSION.events.register(
+            "before-call.*.*", lambda **kwargs: time.sleep(latency_seconds)
+        )
+
+
+def start_notify_stand_in(latency_seconds):
+    class NotifyStandInHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers["Content-Length"]))
+            time.sleep(latency_seconds)
+            self.send_response(201)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), NotifyStandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ["NOTIFY_BASE_URL"] = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    return server
+
+
+def benchmark_delete_iam_user_handler(iam_users, latency_seconds, use_inventory=False):
+    with mock_iam():
+        inject_aws_latency(latency_seconds=latency_seconds)
+        iam_client = create_iam_client()
+        setup_iam_client = boto3.client("iam")
+        for iam_user in iam_users:
+            setup_iam_client.create_user(UserName=iam_user["iam_user"])
+            setup_iam_client.create_access_key(UserName=iam_user["iam_user"])
+            setup_iam_client.put_user_policy(
+                UserName=iam_user["iam_user"],
+                PolicyName="inline",
+                PolicyDocument=benchmark_policy_document,
+            )
+        start_time = time.perf_counter()
+        iam_inventories = {}
+        if use_inventory:
+            for aws_account in sorted({iam_user["aws_account"] for iam_user in iam_users}):
+                iam_inventories[aws_account] = build_iam_inventory(
+                    aws_account=aws_account, iam_client=iam_client
+                )
+        for iam_user in iam_users:
+            delete_iam_user_handler(
+                aws_account=iam_user["aws_account"],
+                iam_client=iam_client,
+                iam_user=iam_user["iam_user"],
+                inventory=iam_inventories.get(iam_user["aws_account"]),
+            )
+        return len(iam_users), time.perf_counter() - start_time
+
+
+def benchmark_csv_file_handler(iam_users, latency_seconds):
+    with mock_iam(), mock_secretsmanager(), tempfile.TemporaryDirectory() as temporary_dir:
+        inject_aws_latency(latency_seconds=latency_seconds)
+        notify_server = start_notify_stand_in(latency_seconds=latency_seconds)
+        secretsmanager_client = boto3.client("secretsmanager")
+        for secret_name, secret_value in (
+            ("benchmark_notify_api_key", benchmark_api_key),
+            ("benchmark_notify_deletion_template", "deletion-template"),
+            ("benchmark_notify_warning_template", "warning-template"),
+        ):
+            secretsmanager_client.create_secret(Name=secret_name, SecretString=secret_value)
+        iam_client = boto3.client("iam")
+        csv_filename = os.path.join(temporary_dir, "stale_iam_users.csv")
+        write_stale_iam_users_csv(iam_users=iam_users, csv_filename=csv_filename)
+        for iam_user in iam_users:
+            if iam_user["inactive_number_of_days"] >= 90:
+                iam_client.create_user(UserName=iam_user["iam_user"])
+        start_time = time.perf_counter()
+        csv_file_handler(
+            api_key_resource_name="benchmark_notify_api_key",
+            csv_filename=csv_filename,
+            deletion_template_resource_name="benchmark_notify_deletion_template",
+            deletion_threshold=90,
+            ignore_list="",
+            warning_threshold=80,
+            warning_template_resource_name="benchmark_notify_warning_template",
+        )
+        wall_time = time.perf_counter() - start_time
+        notify_server.shutdown()
+        return len(iam_users), wall_time
+
+
+def create_user_management_objects(iam_users, s3_client, folder_path):
+    s3_client.create_bucket(
+        Bucket=benchmark_bucket_name,
+        CreateBucketConfiguration={"LocationConstraint": "eu-west-2"},
+    )
+    s3_client.put_object(Bucket=benchmark_bucket_name, Key=f"{folder_path}/")
+    aws_accounts = sorted({iam_user["aws_account"] for iam_user in iam_users})
+    for aws_account in aws_accounts:
+        s3_client.put_object(
+            Bucket=benchmark_bucket_name,
+            Key=f"{folder_path}/{aws_account}.csv",
+            Body=b"account_id,iam_username,inactivity_in_days\n",
+        )
+    return aws_accounts
+
+
+def benchmark_orchestrator_listing(iam_users, latency_seconds):
+    with mock_s3():
+        inject_aws_latency(latency_seconds=latency_seconds)
+        s3_client = boto3.client("s3")
+        aws_accounts = create_user_management_objects(
+            iam_users=iam_users, s3_client=s3_client, folder_path="expired_iam_users"
+        )
+        start_time = time.perf_counter()
+        get_list_of_files_from_s3(
+            folder_path="expired_iam_users/",
+            ignore_list="",
+            s3_bucket_name=benchmark_bucket_name,
+            s3_client=s3_client,
+        )
+        return len(aws_accounts), time.perf_counter() - start_time
+
+
+def benchmark_bucket_cleanup(iam_users, latency_seconds):
+    with mock_s3():
+        inject_aws_latency(latency_seconds=latency_seconds)
+        s3_client = boto3.client("s3")
+        aws_accounts = create_user_management_objects(
+            iam_users=iam_users, s3_client=s3_client, folder_path="expired_iam_users"
+        )
+        start_time = time.perf_counter()
+        delete_all_files_within_folder(
+            s3_client=s3_client,
+            bucket_name=benchmark_bucket_name,
+            bucket_path="expired_iam_users",
+        )
+        return len(aws_accounts), time.perf_counter() - start_time
+
+
+def benchmark_github_team_scan(github_teams, latency_seconds):
+    github_org_url = f"{remove_users.github_api_base_url}/orgs/{remove_users.github_org}"
+    team_members_url = re.compile(f"{re.escape(github_org_url)}/teams/([^/]+)/members")
+
+    def github_teams_response(request):
+        time.sleep(latency_seconds)
+        return 200, {}, json.dumps([{"slug": team_name} for team_name in github_teams])
+
+    def github_team_members_response(request):
+        time.sleep(latency_seconds)
+        team_name = team_members_url.match(request.url).group(1)
+        return 200, {}, json.dumps([{"login": member} for member in github_teams[team_name]])
+
+    users_to_check = [f"member-{member_number}" for member_number in range(5)]
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        remove_users.session = remove_users.create_github_session(
+            cache_path=os.path.join(temporary_dir, "github-cache.sqlite")
+        )
+        with responses.RequestsMock() as requests_mock, remove_users.session.cache_disabled():
+            requests_mock.add_callback(
+                responses.GET, f"{github_org_url}/teams", callback=github_teams_response
+            )
+            requests_mock.add_callback(
+                responses.GET, team_members_url, callback=github_team_members_response
+            )
+            start_time = time.perf_counter()
+            for team_name in remove_users.get_github_teams():
+                remove_users.check_team_members(
+                    users_to_check=users_to_check, team_name=team_name
+                )
+            return len(github_teams), time.perf_counter() - start_time
+
+
+def run_benchmarks(population, latency_ms, seed, benchmark_names=None):
+    latency_seconds = latency_ms / 1000
+    iam_users = generate_iam_users(
+        number_of_users=population["users"],
+        number_of_accounts=population["accounts"],
+        seed=seed,
+    )
+    github_teams = generate_github_teams(
+        number_of_teams=population["teams"],
+        seed=seed,
+        max_team_size=population["max_team_size"],
+    )
+    benchmarks = {
+        "delete_iam_user_handler": lambda: benchmark_delete_iam_user_handler(
+            iam_users=iam_users, latency_seconds=latency_seconds
+        ),
+        "delete_iam_user_handler_with_inventory": lambda: benchmark_delete_iam_user_handler(
+            iam_users=iam_users, latency_seconds=latency_seconds, use_inventory=True
+        ),
+        "csv_file_handler": lambda: benchmark_csv_file_handler(
+            iam_users=iam_users, latency_seconds=latency_seconds
+        ),
+        "orchestrator_listing": lambda: benchmark_orchestrator_listing(
+            iam_users=iam_users, latency_seconds=latency_seconds
+        ),
+        "bucket_cleanup": lambda: benchmark_bucket_cleanup(
+            iam_users=iam_users, latency_seconds=latency_seconds
+        ),
+        "github_team_scan": lambda: benchmark_github_team_scan(
+            github_teams=github_teams, latency_seconds=latency_seconds
+        ),
+    }
+    results = {}
+    for benchmark_name, benchmark in benchmarks.items():
+        if benchmark_names and benchmark_name not in benchmark_names:
+            continue
+        logging.warning(f"Running benchmark {benchmark_name}")
+        items, wall_time = benchmark()
+        results[benchmark_name] = {
+            "items": items,
+            "wall_time_seconds": round(wall_time, 4),
+            "throughput_per_second": round(items / wall_time, 2) if wall_time else None,
+        }
+        logging.warning(
+            f"{benchmark_name}: {items} items in {wall_time:.3f} seconds "
+            f"({results[benchmark_name]['throughput_per_second']} per second)"
+        )
+    return results
+
+
+def compare_benchmark_reports(report, previous_report):
+    for benchmark_name, result in report["results"].items():
+        previous_result = previous_report["results"].get(benchmark_name)
+        if not previous_result or not previous_result["wall_time_seconds"]:
+            continue
+        change = (
+            result["wall_time_seconds"] - previous_result["wall_time_seconds"]
+        ) / previous_result["wall_time_seconds"]
+        logging.warning(
+            f"{benchmark_name}: {previous_result['wall_time_seconds']}s -> {result['wall_time_seconds']}s "
+            f"({change:+.1%})"
+        )
+
+
+def main():
+    args = parse_arguments()
+    logging.getLogger().setLevel(logging.WARNING)
+    benchmark_names = args.benchmarks.split(",") if args.benchmarks else None
+    report = {
+        "population": args.population,
+        "latency_ms": args.latency_ms,
+        "seed": args.seed,
+        "results": run_benchmarks(
+            population=populations[args.population],
+            latency_ms=args.latency_ms,
+            seed=args.seed,
+            benchmark_names=benchmark_names,
+        ),
+    }
+    if args.report_filename:
+        with open(args.report_filename, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+    if args.compare_filename:
+        with open(args.compare_filename) as previous_report_file:
+            compare_benchmark_reports(report=report, previous_report=json.load(previous_report_file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import csv
+import os
+
+
+from generate_fixtures import (
+    generate_auth0_users,
+    generate_github_teams,
+    generate_iam_users,
+    write_credential_reports,
+    write_github_teams,
+    write_stale_iam_users_csv,
+)
+from stale_iam_users import build_action_plan
+
+
+def test_generate_iam_users_is_deterministic():
+    first_iam_users = generate_iam_users(number_of_users=100, number_of_accounts=5, seed=7)
+    second_iam_users = generate_iam_users(number_of_users=100, number_of_accounts=5, seed=7)
+    assert first_iam_users == second_iam_users
+    assert first_iam_users != generate_iam_users(number_of_users=100, number_of_accounts=5, seed=8)
+
+
+def test_generate_iam_users_distributions():
+    iam_users = generate_iam_users(
+        number_of_users=1000,
+        number_of_accounts=3,
+        seed=1,
+        email_username_ratio=0,
+        max_inactive_days=30,
+        inactivity_distribution="exponential",
+    )
+    assert not any("@" in iam_user["iam_user"] for iam_user in iam_users)
+    assert all(0 <= iam_user["inactive_number_of_days"] < 30 for iam_user in iam_users)
+    assert {iam_user["aws_account"] for iam_user in iam_users} == {
+        "100000000000",
+        "100000000001",
+        "100000000002",
+    }
+
+
+def test_stale_iam_users_csv_is_readable_by_planner(tmp_path):
+    iam_users = generate_iam_users(number_of_users=200, number_of_accounts=4, seed=3)
+    csv_filename = str(tmp_path / "stale_iam_users.csv")
+    write_stale_iam_users_csv(iam_users=iam_users, csv_filename=csv_filename)
+    action_plan = build_action_plan(
+        csv_filename=csv_filename,
+        deletion_threshold=90,
+        ignore_list="",
+        warning_threshold=80,
+    )
+    expected_actions = sum(
+        1 for iam_user in iam_users if iam_user["inactive_number_of_days"] >= 80
+    )
+    assert len(action_plan["actions"]) == expected_actions
+
+
+def test_credential_reports_are_written_per_account(tmp_path):
+    iam_users = generate_iam_users(number_of_users=50, number_of_accounts=2, seed=1)
+    aws_accounts = write_credential_reports(iam_users=iam_users, output_dir=str(tmp_path))
+    number_of_rows = 0
+    for aws_account in aws_accounts:
+        with open(tmp_path / f"{aws_account}.csv") as csv_file:
+            rows = list(csv.DictReader(csv_file))
+        assert all(row["arn"].startswith(f"arn:aws:iam::{aws_account}:user/") for row in rows)
+        number_of_rows += len(rows)
+    assert number_of_rows == 50
+
+
+def test_generate_github_teams_sizes(tmp_path):
+    github_teams = generate_github_teams(
+        number_of_teams=20, seed=1, min_team_size=3, max_team_size=6
+    )
+    assert all(3 <= len(members) <= 6 for members in github_teams.values())
+    write_github_teams(github_teams=github_teams, output_dir=str(tmp_path))
+    assert len(os.listdir(tmp_path / "members")) == 20
+
+
+def test_generate_auth0_users_mfa_ratio():
+    auth0_users = generate_auth0_users(number_of_users=100, seed=1, mfa_enabled_ratio=1)
+    assert all(auth0_user["multifactor"] for auth0_user in auth0_users)
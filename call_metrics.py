@@ -0,0 +1,177 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logging.basicConfig(level=logging.INFO)
+
+call_trace_filename = os.environ.get("CALL_TRACE_FILENAME")
+call_metrics = {
+    "durations": {},
+    "outcomes": {},
+    "retries": {},
+    "lock": threading.Lock(),
+    "trace_file": None,
+    "tracer": None,
+}
+
+
+def configure_opentelemetry():
+    if not os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return None
+    try:
+        from opentelemetry import trace
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        logging.warning(
+            "OTEL_EXPORTER_OTLP_ENDPOINT is set but the OpenTelemetry SDK is not installed, not exporting traces"
+        )
+        return None
+    tracer_provider = TracerProvider(
+        resource=Resource.create({"service.name": "ccs-user-management"})
+    )
+    tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(tracer_provider)
+    atexit.register(tracer_provider.shutdown)
+    return trace.get_tracer("ccs-user-management")
+
+
+def export_call_span(tracer, call_event, end_time_ns):
+    span = tracer.start_span(
+        name=f"{call_event['service']}.{call_event['operation']}",
+        start_time=end_time_ns - int(call_event["duration_ms"] * 1_000_000),
+        attributes={
+            "outcome": call_event["outcome"],
+            "retries": call_event["retries"],
+        },
+    )
+    span.end(end_time=end_time_ns)
+
+
+def record_call(service, operation, duration, outcome, retries=0):
+    call_event = {
+        "timestamp": time.time(),
+        "service": service,
+        "operation": operation,
+        "duration_ms": round(duration * 1000, 3),
+        "outcome": outcome,
+        "retries": retries,
+    }
+    call_name = f"{service}.{operation}"
+    with call_metrics["lock"]:
+        call_metrics["durations"].setdefault(call_name, []).append(duration)
+        outcomes = call_metrics["outcomes"].setdefault(call_name, {})
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        call_metrics["retries"][call_name] = (
+            call_metrics["retries"].get(call_name, 0) + retries
+        )
+        if call_trace_filename:
+            if call_metrics["trace_file"] is None:
+                call_metrics["trace_file"] = open(call_trace_filename, "a")
+            call_metrics["trace_file"].write(f"{json.dumps(call_event)}\n")
+    if call_metrics["tracer"]:
+        export_call_span(
+            tracer=call_metrics["tracer"], call_event=call_event, end_time_ns=time.time_ns()
+        )
+
+
+def get_http_outcome(status_code):
+    if status_code < 400:
+        return "success"
+    return str(status_code)
+
+
+@contextmanager
+def timed_call(service, operation):
+    call = {"outcome": "success", "retries": 0}
+    start_time = time.perf_counter()
+    try:
+        yield call
+    except BaseException:
+        if call["outcome"] == "success":
+            call["outcome"] = "error"
+        raise
+    finally:
+        record_call(
+            service=service,
+            operation=operation,
+            duration=time.perf_counter() - start_time,
+            outcome=call["outcome"],
+            retries=call["retries"],
+        )
+
+
+def record_boto3_call_start(model, context, **kwargs):
+    context["call_metrics_call"] = (
+        model.service_model.service_name,
+        model.name,
+        time.perf_counter(),
+    )
+
+
+def record_boto3_call(context, parsed=None, exception=None, **kwargs):
+    if "call_metrics_call" not in context:
+        return
+    service, operation, start_time = context.pop("call_metrics_call")
+    if exception is not None:
+        outcome = "error"
+    else:
+        outcome = parsed.get("Error", {}).get("Code", "success")
+    record_call(
+        service=service,
+        operation=operation,
+        duration=time.perf_counter() - start_time,
+        outcome=outcome,
+        retries=(parsed or {}).get("ResponseMetadata", {}).get("RetryAttempts", 0),
+    )
+
+
+def instrument_boto3_client(client):
+    client.meta.events.register("before-call.*.*", record_boto3_call_start)
+    client.meta.events.register("after-call.*.*", record_boto3_call)
+    client.meta.events.register("after-call-error.*.*", record_boto3_call)
+    return client
+
+
+def calculate_percentile(sorted_durations, percentile):
+    index = max(0, int(round(percentile / 100 * len(sorted_durations))) - 1)
+    return sorted_durations[index]
+
+
+def summarise_calls():
+    call_summary = {}
+    with call_metrics["lock"]:
+        for call_name, durations in call_metrics["durations"].items():
+            sorted_durations = sorted(durations)
+            call_summary[call_name] = {
+                "count": len(sorted_durations),
+                "outcomes": dict(call_metrics["outcomes"][call_name]),
+                "retries": call_metrics["retries"][call_name],
+                "p50_ms": round(calculate_percentile(sorted_durations, 50) * 1000, 3),
+                "p95_ms": round(calculate_percentile(sorted_durations, 95) * 1000, 3),
+                "p99_ms": round(calculate_percentile(sorted_durations, 99) * 1000, 3),
+            }
+    return call_summary
+
+
+def log_call_summary():
+    call_summary = summarise_calls()
+    for call_name, summary in sorted(call_summary.items()):
+        logging.info(
+            f"{call_name}: {summary['count']} calls, {summary['retries']} retries, "
+            f"p50 {summary['p50_ms']}ms, p95 {summary['p95_ms']}ms, p99 {summary['p99_ms']}ms, "
+            f"outcomes {summary['outcomes']}"
+        )
+    if call_metrics["trace_file"] is not None:
+        call_metrics["trace_file"].close()
+        call_metrics["trace_file"] = None
+
+
+call_metrics["tracer"] = configure_opentelemetry()
+atexit.register(log_call_summary)
@@ -0,0 +1,245 @@
+import argparse
+import botocore.exceptions
+import concurrent.futures
+import csv
+import datetime
+import io
+import logging
+import os
+import time
+from aws_client_registry import get_client
+from iam_common import call_iam_api
+from run_report import run_with_report
+
+logging.basicConfig(level=logging.INFO)
+
+credential_report_poll_interval_seconds = 2
+credential_report_max_poll_interval_seconds = 30
+credential_report_timeout_seconds = 900
+credential_report_max_workers = int(os.environ.get("CREDENTIAL_REPORT_MAX_WORKERS", 16))
+credential_report_not_ready_error_codes = (
+    "ReportNotPresent",
+    "ReportInProgress",
+    "ReportExpired",
+)
+credential_report_activity_columns = (
+    "password_last_used",
+    "access_key_1_last_used_date",
+    "access_key_2_last_used_date",
+)
+
+
+def parse_arguments():
+    description = "Arguments to generate and collect IAM credential reports from every AWS account in parallel"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--account-ids",
+        help="Comma separated list of AWS account IDs to collect credential reports from",
+        dest="account_ids",
+        required=True,
+    )
+    parser.add_argument(
+        "--role-name",
+        help="The name of the IAM role to assume in each account, when not set the current credentials are used "
+        "and only one account can be given",
+        dest="role_name",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--output-filename",
+        help="The name of the CSV file to write stale IAM users to, in the format read by stale_iam_users.py",
+        dest="output_filename",
+        required=True,
+    )
+    parser.add_argument(
+        "--no-mfa-filename",
+        help="The name of a CSV file to write IAM users without MFA to, in the format read by get_no_mfa_users.py",
+        dest="no_mfa_filename",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--timeout-seconds",
+        help="The number of seconds to wait for all credential reports to be generated (defaults to 900)",
+        dest="timeout_seconds",
+        type=int,
+        default=credential_report_timeout_seconds,
+        required=False,
+    )
+    args = parser.parse_args()
+    # The current credentials only reach one account, so every report would come from that account
+    if len(args.account_ids.split(",")) > 1 and not args.role_name:
+        parser.error("--role-name is required to collect credential reports from more than one account")
+    return args
+
+
+def get_args(args):
+    account_ids = args.account_ids.split(",")
+    role_name = args.role_name
+    output_filename = args.output_filename
+    no_mfa_filename = args.no_mfa_filename
+    timeout_seconds = args.timeout_seconds
+    return account_ids, role_name, output_filename, no_mfa_filename, timeout_seconds
+
+
+def create_iam_client_for_account(account_id, role_name):
+    if not role_name:
+        return get_client(service_name="iam")
+    return get_client(service_name="iam", account_id=account_id, role_name=role_name)
+
+
+def start_credential_report(account_id, iam_client):
+    try:
+        response = call_iam_api(iam_client=iam_client, operation="generate_credential_report")
+        logging.info(
+            f"Credential report generation in AWS account {account_id} is {response['State']}"
+        )
+        return response["State"]
+    except botocore.exceptions.ClientError as e:
+        logging.error(f"Unable to generate a credential report in AWS account {account_id}: {e}")
+        exit(1)
+
+
+def get_credential_report_if_ready(account_id, iam_client):
+    try:
+        response = call_iam_api(iam_client=iam_client, operation="get_credential_report")
+        return response["Content"].decode()
+    except botocore.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") in credential_report_not_ready_error_codes:
+            logging.debug(f"Credential report for AWS account {account_id} is not ready yet")
+            return None
+        logging.error(f"Unable to get the credential report for AWS account {account_id}: {e}")
+        exit(1)
+
+
+def parse_report_time(report_time):
+    try:
+        return datetime.datetime.fromisoformat(report_time)
+    except ValueError:
+        return None
+
+
+def parse_credential_report(account_id, credential_report, reference_time):
+    iam_users = []
+    for row in csv.DictReader(io.StringIO(credential_report)):
+        if row["user"] == "<root_account>":
+            continue
+        activity_times = [
+            parse_report_time(row[activity_column])
+            for activity_column in credential_report_activity_columns
+            if row.get(activity_column)
+        ]
+        activity_times = [activity_time for activity_time in activity_times if activity_time]
+        last_activity = max(activity_times) if activity_times else parse_report_time(
+            row["user_creation_time"]
+        )
+        iam_users.append(
+            {
+                "aws_account": account_id,
+                "iam_user": row["user"],
+                "arn": row["arn"],
+                "inactive_number_of_days": (reference_time - last_activity).days,
+                "mfa_active": row["mfa_active"] == "true",
+            }
+        )
+    logging.info(f"Parsed {len(iam_users)} IAM users from the credential report for AWS account {account_id}")
+    return iam_users
+
+
+def collect_account_credential_report(
+    account_id, get_iam_client, deadline, poll_interval_seconds, reference_time
+):
+    iam_client = get_iam_client(account_id)
+    report_state = start_credential_report(account_id=account_id, iam_client=iam_client)
+    while True:
+        if report_state == "COMPLETE":
+            credential_report = get_credential_report_if_ready(
+                account_id=account_id, iam_client=iam_client
+            )
+            if credential_report is not None:
+                return parse_credential_report(
+                    account_id=account_id,
+                    credential_report=credential_report,
+                    reference_time=reference_time,
+                )
+        if time.monotonic() + poll_interval_seconds > deadline:
+            logging.error(f"Timed out waiting for the credential report from AWS account {account_id}")
+            exit(1)
+        logging.info(
+            f"Waiting {poll_interval_seconds} seconds for the credential report from AWS account {account_id}"
+        )
+        time.sleep(poll_interval_seconds)
+        poll_interval_seconds = min(
+            poll_interval_seconds * 2, credential_report_max_poll_interval_seconds
+        )
+        report_state = start_credential_report(account_id=account_id, iam_client=iam_client)
+
+
+def collect_credential_reports(
+    account_ids,
+    get_iam_client,
+    timeout_seconds=credential_report_timeout_seconds,
+    poll_interval_seconds=credential_report_poll_interval_seconds,
+    reference_time=None,
+    max_workers=credential_report_max_workers,
+):
+    reference_time = reference_time or datetime.datetime.now(datetime.timezone.utc)
+    deadline = time.monotonic() + timeout_seconds
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        account_iam_users = executor.map(
+            lambda account_id: collect_account_credential_report(
+                account_id=account_id,
+                get_iam_client=get_iam_client,
+                deadline=deadline,
+                poll_interval_seconds=poll_interval_seconds,
+                reference_time=reference_time,
+            ),
+            account_ids,
+        )
+        return [iam_user for iam_users in account_iam_users for iam_user in iam_users]
+
+
+def write_stale_iam_users_csv(iam_users, output_filename):
+    with open(output_filename, "w", newline="") as output_file:
+        csv_writer = csv.writer(output_file)
+        csv_writer.writerow(["account_id", "iam_username", "inactivity_in_days"])
+        for iam_user in iam_users:
+            csv_writer.writerow(
+                [
+                    iam_user["aws_account"],
+                    iam_user["iam_user"],
+                    f"{iam_user['inactive_number_of_days']} days",
+                ]
+            )
+    logging.info(f"Written {len(iam_users)} IAM users to {output_filename}")
+
+
+def write_no_mfa_users_csv(iam_users, no_mfa_filename):
+    no_mfa_users = [iam_user for iam_user in iam_users if not iam_user["mfa_active"]]
+    with open(no_mfa_filename, "w", newline="") as no_mfa_file:
+        csv_writer = csv.writer(no_mfa_file)
+        csv_writer.writerow(["account_id", "arn", "iam_username"])
+        for iam_user in no_mfa_users:
+            csv_writer.writerow([iam_user["aws_account"], iam_user["arn"], iam_user["iam_user"]])
+    logging.info(f"Written {len(no_mfa_users)} IAM users without MFA to {no_mfa_filename}")
+
+
+def collect_credential_reports_handler():
+    account_ids, role_name, output_filename, no_mfa_filename, timeout_seconds = get_args(
+        args=parse_arguments()
+    )
+    iam_users = collect_credential_reports(
+        account_ids=account_ids,
+        get_iam_client=lambda account_id: create_iam_client_for_account(
+            account_id=account_id, role_name=role_name
+        ),
+        timeout_seconds=timeout_seconds,
+    )
+    write_stale_iam_users_csv(iam_users=iam_users, output_filename=output_filename)
+    if no_mfa_filename:
+        write_no_mfa_users_csv(iam_users=iam_users, no_mfa_filename=no_mfa_filename)
+
+
+if __name__ == "__main__":
+    run_with_report(flow="collect_credential_reports", function=collect_credential_reports_handler)
@@ -0,0 +1,108 @@
+import datetime
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from collect_credential_reports import collect_credential_reports, parse_arguments, parse_credential_report
+
+reference_time = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+credential_report_header = (
+    "user,arn,user_creation_time,password_enabled,password_last_used,mfa_active,"
+    "access_key_1_last_used_date,access_key_2_last_used_date\n"
+)
+
+
+def create_credential_report(account_id, rows):
+    return credential_report_header + "".join(
+        f"{user},arn:aws:iam::{account_id}:user/{user},2023-01-01T00:00:00+00:00,true,{password_last_used},"
+        f"{mfa_active},{access_key_last_used},N/A\n"
+        for user, password_last_used, mfa_active, access_key_last_used in rows
+    )
+
+
+@pytest.fixture
+def iam_clients(monkeypatch):
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+    iam_clients = {
+        account_id: boto3.client(
+            "iam",
+            region_name="eu-west-2",
+            aws_access_key_id="testing",
+            aws_secret_access_key="testing",
+        )
+        for account_id in ("111111111111", "222222222222")
+    }
+    stubbers = {account_id: Stubber(iam_client) for account_id, iam_client in iam_clients.items()}
+    for stubber in stubbers.values():
+        stubber.activate()
+    yield iam_clients, stubbers
+    for stubber in stubbers.values():
+        stubber.deactivate()
+
+
+def test_parse_arguments_requires_a_role_for_more_than_one_account(monkeypatch):
+    arguments = ["collect_credential_reports.py", "--output-filename", "stale.csv", "--account-ids"]
+    monkeypatch.setattr("sys.argv", arguments + ["111111111111,222222222222"])
+    with pytest.raises(SystemExit):
+        parse_arguments()
+
+    monkeypatch.setattr("sys.argv", arguments + ["111111111111"])
+    assert parse_arguments().account_ids == "111111111111"
+
+    monkeypatch.setattr(
+        "sys.argv", arguments + ["111111111111,222222222222", "--role-name", "user-management"]
+    )
+    assert parse_arguments().role_name == "user-management"
+
+
+def test_parse_credential_report_uses_latest_activity():
+    iam_users = parse_credential_report(
+        account_id="111111111111",
+        credential_report=create_credential_report(
+            "111111111111",
+            [
+                ("<root_account>", "N/A", "true", "N/A"),
+                ("alice@example.com", "2023-12-01T00:00:00+00:00", "true", "2023-12-22T00:00:00+00:00"),
+                ("service-user", "N/A", "false", "N/A"),
+            ],
+        ),
+        reference_time=reference_time,
+    )
+    assert [
+        (iam_user["iam_user"], iam_user["inactive_number_of_days"], iam_user["mfa_active"])
+        for iam_user in iam_users
+    ] == [("alice@example.com", 10, True), ("service-user", 365, False)]
+
+
+def test_collect_credential_reports_polls_until_every_report_is_ready(iam_clients):
+    iam_clients, stubbers = iam_clients
+    stubbers["111111111111"].add_response("generate_credential_report", {"State": "COMPLETE"})
+    stubbers["222222222222"].add_response("generate_credential_report", {"State": "STARTED"})
+    stubbers["111111111111"].add_response(
+        "get_credential_report",
+        {"Content": create_credential_report(
+            "111111111111", [("alice@example.com", "2023-12-01T00:00:00+00:00", "true", "N/A")]
+        ).encode()},
+    )
+    stubbers["222222222222"].add_response("generate_credential_report", {"State": "INPROGRESS"})
+    stubbers["222222222222"].add_response("generate_credential_report", {"State": "COMPLETE"})
+    stubbers["222222222222"].add_response(
+        "get_credential_report",
+        {"Content": create_credential_report(
+            "222222222222", [("bob@example.com", "2023-10-01T00:00:00+00:00", "false", "N/A")]
+        ).encode()},
+    )
+
+    iam_users = collect_credential_reports(
+        account_ids=["111111111111", "222222222222"],
+        get_iam_client=iam_clients.get,
+        reference_time=reference_time,
+    )
+
+    assert [(iam_user["aws_account"], iam_user["iam_user"]) for iam_user in iam_users] == [
+        ("111111111111", "alice@example.com"),
+        ("222222222222", "bob@example.com"),
+    ]
+    for stubber in stubbers.values():
+        stubber.assert_no_pending_responses()
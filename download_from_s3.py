@@ -1,7 +1,7 @@
 import argparse
-import boto3
 import botocore.exceptions
 import logging
+from aws_client_registry import get_client
 
 logging.basicConfig(level=logging.INFO)
 
@@ -38,7 +38,7 @@ def get_args(args=parse_arguments()):
 
 
 def create_s3_client():
-    s3_client = boto3.client('s3', region_name='eu-west-2')
+    s3_client = get_client(service_name='s3')
     return s3_client
 
 
@@ -0,0 +1,137 @@
+import bisect
+import contextlib
+import fcntl
+import json
+import logging
+import os
+
+logging.basicConfig(level=logging.INFO)
+
+escalation_actions = ("warning", "access_key_deactivation", "deletion")
+
+
+def create_default_escalation_policy(warning_threshold, deletion_threshold):
+    return f"{warning_threshold}:warning,{deletion_threshold}:deletion"
+
+
+def parse_escalation_policy(escalation_policy):
+    escalation_tiers = {}
+    for escalation_tier in escalation_policy.split(","):
+        try:
+            threshold, action = escalation_tier.strip().split(":")
+            threshold = int(threshold)
+        except ValueError:
+            logging.error(
+                f"Unable to parse escalation tier {escalation_tier}, expected <days>:<action>"
+            )
+            exit(1)
+        if action not in escalation_actions:
+            logging.error(
+                f"Unknown escalation action {action}, expected one of {', '.join(escalation_actions)}"
+            )
+            exit(1)
+        escalation_tiers[threshold] = action
+    return sorted(escalation_tiers.items())
+
+
+def compile_escalation_policy(escalation_policy):
+    escalation_tiers = parse_escalation_policy(escalation_policy=escalation_policy)
+    thresholds = [threshold for threshold, _ in escalation_tiers]
+    actions = [action for _, action in escalation_tiers]
+    deletion_thresholds = [
+        threshold for threshold, action in escalation_tiers if action == "deletion"
+    ]
+    return {
+        "escalation_policy": escalation_policy,
+        "thresholds": thresholds,
+        "actions": actions,
+        "deletion_threshold": deletion_thresholds[0] if deletion_thresholds else None,
+    }
+
+
+def get_escalation_tier(compiled_escalation_policy, number_of_inactive_days):
+    tier_index = (
+        bisect.bisect_right(compiled_escalation_policy["thresholds"], number_of_inactive_days)
+        - 1
+    )
+    if tier_index < 0:
+        return None, False
+    return (
+        compiled_escalation_policy["thresholds"][tier_index],
+        compiled_escalation_policy["actions"][tier_index],
+    )
+
+
+def check_tier_already_notified(previous_tier, tier):
+    return isinstance(previous_tier, int) and previous_tier >= tier
+
+
+def get_state_key(account_id, iam_username):
+    return f"{account_id}/{iam_username}"
+
+
+def get_state_key_account_id(state_key):
+    account_id, _, _ = state_key.partition("/")
+    return account_id
+
+
+def read_state_file(state_file):
+    if not os.path.exists(state_file):
+        logging.info(f"State file {state_file} does not exist, processing every user")
+        return {}
+    with open(state_file) as state_file_contents:
+        state = json.load(state_file_contents)
+    # State files written before escalation tiers hold action hashes rather than tiers, which are dropped so
+    # those users are evaluated afresh
+    tier_state = {
+        state_key: tier
+        for state_key, tier in state.items()
+        if isinstance(tier, int) and not isinstance(tier, bool)
+    }
+    if len(tier_state) < len(state):
+        logging.info(
+            f"Ignoring {len(state) - len(tier_state)} entries in {state_file} that are not escalation tiers"
+        )
+    logging.info(f"Read the previous state of {len(tier_state)} users from {state_file}")
+    return tier_state
+
+
+def write_state_file(state_file, state):
+    with open(f"{state_file}.tmp", "w") as state_file_contents:
+        json.dump(state, state_file_contents, separators=(",", ":"))
+    os.replace(f"{state_file}.tmp", state_file)
+    logging.info(f"Written the state of {len(state)} users to {state_file}")
+
+
+@contextlib.contextmanager
+def lock_state_file(state_file):
+    with open(f"{state_file}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def update_state_file(
+    state_file, state, replaced_account_ids=(), removed_state_keys=(), kept_state_keys=()
+):
+    replaced_account_ids = set(replaced_account_ids)
+    removed_state_keys = set(removed_state_keys)
+    # Kept entries stay as they are in the file, for users whose action did not happen
+    kept_state_keys = set(kept_state_keys)
+    with lock_state_file(state_file=state_file):
+        updated_state = {
+            state_key: tier
+            for state_key, tier in read_state_file(state_file=state_file).items()
+            if (
+                get_state_key_account_id(state_key=state_key) not in replaced_account_ids
+                or state_key in kept_state_keys
+            )
+            and state_key not in removed_state_keys
+        }
+        updated_state.update(
+            {state_key: tier for state_key, tier in state.items() if state_key not in kept_state_keys}
+        )
+        write_state_file(state_file=state_file, state=updated_state)
+    return updated_state
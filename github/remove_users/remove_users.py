@@ -1,12 +1,18 @@
 import argparse
+import datetime
 import logging
+import botocore.exceptions
 from requests_cache import CachedSession, SQLiteCache
 import json
 import os
+import threading
 import time
-
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 
+from call_metrics import get_http_outcome, timed_call
+from run_report import record_action, run_with_report, timed_stage
+
 logger = logging.getLogger('requests_cache')
 logger.setLevel(logging.INFO)
 logger.addHandler(logging.StreamHandler())
@@ -15,14 +21,94 @@ logger.addHandler(logging.StreamHandler())
 github_token = os.environ.get("GITHUB_TOKEN")
 github_org = os.environ.get("GITHUB_ORG")
 github_api_base_url = "https://api.github.com"
+github_max_workers = int(os.environ.get("GITHUB_MAX_WORKERS", 8))
+# GitHub asks for at least a second between mutating requests from one token
+github_mutations_per_second = float(os.environ.get("GITHUB_MUTATIONS_PER_SECOND", 1))
+github_max_attempts = 3
+github_per_page = 100
+github_mutation_pacer = {
+    "next_request": time.monotonic(),
+    "lock": threading.Lock(),
+}
+github_list_pages = {
+    "page_urls": {},
+    "lock": threading.Lock(),
+}
+
+# Expired entries are revalidated with their ETag rather than re-crawled
+github_cache_dir = os.environ.get("GITHUB_CACHE_DIR", ".")
+github_cache_s3_bucket = os.environ.get("GITHUB_CACHE_S3_BUCKET")
+github_cache_expire_after = int(os.environ.get("GITHUB_CACHE_EXPIRE_AFTER", 300))
+github_cache_max_age_days = int(os.environ.get("GITHUB_CACHE_MAX_AGE_DAYS", 7))
+
+
+def get_github_cache_path(org: str):
+    if not org:
+        logger.error(
+            "Set the GitHub organisation using environment variable GITHUB_ORG")
+        exit(1)
+    return os.path.join(github_cache_dir, f"github-cache-{org}.sqlite")
+
+
+def get_github_cache_s3_key(org: str):
+    return f"github-cache/{org}.sqlite"
+
+
+def create_github_session(cache_path: str):
+    # Set up a cache with a time limit in seconds
+    backend = SQLiteCache(db_path=cache_path)
+    return CachedSession(
+        allowable_methods=("GET",),
+        backend=backend,
+        expire_after=github_cache_expire_after
+    )
+
+
+def download_github_cache(s3_client, s3_bucket_name: str, org: str):
+    cache_path = get_github_cache_path(org=org)
+    try:
+        s3_client.download_file(
+            s3_bucket_name, get_github_cache_s3_key(org=org), f"{cache_path}.download")
+    except botocore.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey"):
+            logger.error(f"Unable to download the GitHub cache for {org}: {e}")
+            exit(1)
+        logger.info(f"No GitHub cache found for {org}, starting cold")
+        return False
+    os.replace(f"{cache_path}.download", cache_path)
+    logger.info(f"Downloaded the GitHub cache for {org} from {s3_bucket_name}")
+    return True
+
+
+def upload_github_cache(s3_client, s3_bucket_name: str, org: str):
+    get_github_session().cache.delete(
+        older_than=datetime.timedelta(days=github_cache_max_age_days))
+    try:
+        s3_client.upload_file(
+            get_github_cache_path(org=org), s3_bucket_name, get_github_cache_s3_key(org=org))
+        logger.info(f"Uploaded the GitHub cache for {org} to {s3_bucket_name}")
+    except botocore.exceptions.ClientError as e:
+        logger.error(f"Unable to upload the GitHub cache for {org}: {e}")
+
+
+def create_cache_s3_client():
+    # boto3 is only needed when the cache is synced with S3
+    from aws_client_registry import get_client
+    return get_client(service_name="s3")
 
-# Set up a cache with a time limit in seconds
-backend = SQLiteCache()
-session = CachedSession(
-    allowable_methods=("GET",),
-    backend=backend,
-    expire_after=300
-)
+
+# Created on first use so importing the module does not open a cache file
+session = None
+github_session_lock = threading.Lock()
+
+
+def get_github_session():
+    global session
+    with github_session_lock:
+        if session is None:
+            session = create_github_session(
+                cache_path=get_github_cache_path(org=github_org))
+    return session
 
 
 def parse_arguments():
@@ -34,13 +120,25 @@ def parse_arguments():
     )
 
     # Add the --dry-run flag
-    parser.add_argument('--dry-run', action='store_false',
+    parser.add_argument('--dry-run', action='store_true',
                         help='Enable dry-run mode')
 
     # Add the --ignore flag
     parser.add_argument('--ignore', nargs='+',
                         help='List of teams not to be checked', required=False)
 
+    # Add the --org-removal flag
+    parser.add_argument('--org-removal', action='store_true',
+                        help='Remove users from the organisation in one call when they are not in any ignored team')
+
+    # Add the --max-workers flag
+    parser.add_argument('--max-workers', type=int, default=github_max_workers,
+                        help='The number of removals to run concurrently')
+
+    # Add the --report-filename flag
+    parser.add_argument('--report-filename', required=False,
+                        help='Write the consolidated removal report to this JSON file')
+
     return parser.parse_args()
 
 
@@ -51,15 +149,44 @@ def get_headers():
     return headers
 
 
+def get_github_outcome(response):
+    if getattr(response, "revalidated", False):
+        return "cache_revalidated"
+    if getattr(response, "from_cache", False):
+        return "cache_hit"
+    return get_http_outcome(status_code=response.status_code)
+
+
+def get_github_list_url(path: str):
+    return f"{github_api_base_url}/orgs/{github_org}/{path}?per_page={github_per_page}"
+
+
+def get_github_pages(url: str, operation: str, headers: dict):
+    # Every page that was read is remembered so that invalidating the list drops all of them
+    page_urls = []
+    data = []
+    while url:
+        with timed_call(service="github", operation=operation) as call:
+            response = get_github_session().get(
+                url=url,
+                headers=headers
+            )
+            call["outcome"] = get_github_outcome(response=response)
+        page_urls.append(url)
+        if response.status_code != 200:
+            break
+        data.extend(json.loads(response.text))
+        url = response.links.get("next", {}).get("url")
+    with github_list_pages["lock"]:
+        github_list_pages["page_urls"][page_urls[0]] = page_urls
+    return response, data
+
+
 def get_github_teams(test_payload: dict = None, headers: dict = get_headers()):
     if not test_payload:
-        url = f"{github_api_base_url}/orgs/{github_org}/teams"
-        response = session.get(
-            url=url,
-            headers=headers
-        )
+        url = get_github_list_url(path="teams")
+        response, data = get_github_pages(url=url, operation="list_teams", headers=headers)
         status_code = response.status_code
-        data = json.loads(response.text)
     else:
         status_code = 200
         data = test_payload
@@ -98,13 +225,12 @@ def remove_ignored_teams(ignored_teams: list, teams: list):
 
 def get_github_team_members(name: str, test_payload: dict = None, headers: dict = get_headers()):
     if not test_payload:
-        url = f"{github_api_base_url}/orgs/{github_org}/teams/{name}/members"
-        response = session.get(
-            url=url,
+        response, data = get_github_pages(
+            url=get_github_list_url(path=f"teams/{name}/members"),
+            operation="list_team_members",
             headers=headers
         )
         status_code = response.status_code
-        data = json.loads(response.text)
     else:
         status_code = 200
         data = test_payload
@@ -115,28 +241,75 @@ def get_github_team_members(name: str, test_payload: dict = None, headers: dict
     return None
 
 
+def wait_for_mutation_slot():
+    with github_mutation_pacer["lock"]:
+        now = time.monotonic()
+        request_time = max(now, github_mutation_pacer["next_request"])
+        github_mutation_pacer["next_request"] = request_time + 1 / github_mutations_per_second
+    time.sleep(request_time - now)
+
+
+def get_retry_after_seconds(response):
+    if response.status_code not in (403, 429):
+        return None
+    if "Retry-After" in response.headers:
+        return int(response.headers["Retry-After"])
+    if response.headers.get("X-RateLimit-Remaining") == "0":
+        return max(0, int(response.headers.get("X-RateLimit-Reset", 0)) - time.time())
+    return None
+
+
+def send_github_delete(url: str, operation: str, headers: dict):
+    for attempt in range(1, github_max_attempts + 1):
+        wait_for_mutation_slot()
+        with timed_call(service="github", operation=operation) as call:
+            response = get_github_session().delete(
+                url=url,
+                headers=headers
+            )
+            call["outcome"] = get_github_outcome(response=response)
+        retry_after_seconds = get_retry_after_seconds(response=response)
+        if retry_after_seconds is None or attempt == github_max_attempts:
+            return response
+        logger.info(
+            f"GitHub rate limit reached, retrying {operation} in {retry_after_seconds} seconds")
+        time.sleep(retry_after_seconds)
+
+
+def invalidate_team_members_cache(team_names: list):
+    with github_list_pages["lock"]:
+        page_urls = [
+            page_url
+            for team_name in team_names
+            for page_url in github_list_pages["page_urls"].get(
+                get_github_list_url(path=f"teams/{team_name}/members"), [])
+        ]
+    get_github_session().cache.delete(urls=page_urls)
+
+
 def remove_github_user_from_team(team_name: str, user: str, headers: dict = get_headers()):
     url = f"{github_api_base_url}/orgs/{github_org}/teams/{team_name}/memberships/{user}"
-    response = session.delete(
-        url=url,
-        headers=headers
-    )
+    response = send_github_delete(
+        url=url, operation="remove_team_membership", headers=headers)
     status_code = response.status_code
     if status_code == 204:
         logger.info(f"Removed user: {user},from team: {team_name}")
+        invalidate_team_members_cache(team_names=[team_name])
         return True
     return False
 
 
-def manage_team_members(team_name: str, users: list, remove_users: bool = False):
-
-    for user in users:
-
-        if remove_users:
-            remove_github_user_from_team(team_name=team_name, user=user)
-        else:
-            logger.info(
-                f"Result: user: {user}, will be removed from team: {team_name}")
+def remove_github_user_from_org(user: str, team_names: list, headers: dict = get_headers()):
+    url = f"{github_api_base_url}/orgs/{github_org}/memberships/{user}"
+    response = send_github_delete(
+        url=url, operation="remove_org_membership", headers=headers)
+    status_code = response.status_code
+    if status_code == 204:
+        logger.info(f"Removed user: {user},from organisation: {github_org}")
+        invalidate_team_members_cache(team_names=team_names)
+        get_github_session().cache.delete(urls=[url])
+        return True
+    return False
 
 
 def check_team_members(users_to_check: list, team_name: str):
@@ -152,31 +325,179 @@ def check_team_members(users_to_check: list, team_name: str):
     )
 
 
-def main():
-    args = parse_arguments()
-    users = args.users
-    remove_users = args.dry_run
-    ignored_teams = args.ignore
+def get_user_team_memberships(users: list, teams: list):
+    memberships = {user: [] for user in users}
+    for team in teams:
+        result = check_team_members(users_to_check=users, team_name=team)
+        for user in result["users"]:
+            memberships[user].append(team)
+    return memberships
+
+
+def check_org_membership(user: str, headers: dict = get_headers()):
+    url = f"{github_api_base_url}/orgs/{github_org}/memberships/{user}"
+    with timed_call(service="github", operation="get_org_membership") as call:
+        response = get_github_session().get(
+            url=url,
+            headers=headers
+        )
+        call["outcome"] = get_github_outcome(response=response)
+    return response.status_code == 200
+
+
+def get_org_members_without_teams(memberships: dict):
+    # Members who are in no team still hold a seat in the organisation
+    return [
+        user for user, user_teams in memberships.items()
+        if not user_teams and check_org_membership(user=user)
+    ]
+
+
+def plan_github_removals(memberships: dict, ignored_teams: list, org_removal: bool = False,
+                         org_members: list = ()):
+    removal_plan = []
+    for user, user_teams in memberships.items():
+        teams_to_leave = [team for team in user_teams if team not in ignored_teams]
+        # Org-level removal would also take the user out of ignored teams
+        if org_removal and len(teams_to_leave) == len(user_teams):
+            if teams_to_leave or user in org_members:
+                removal_plan.append(dict(user=user, mode="org", teams=teams_to_leave))
+        elif teams_to_leave:
+            removal_plan.append(dict(user=user, mode="team", teams=teams_to_leave))
+    return removal_plan
+
+
+def run_planned_removal(planned_removal: dict):
+    if planned_removal["mode"] == "org":
+        removed = remove_github_user_from_org(
+            user=planned_removal["user"], team_names=planned_removal["teams"])
+        target = github_org
+    else:
+        removed = remove_github_user_from_team(
+            team_name=planned_removal["team"], user=planned_removal["user"])
+        target = planned_removal["team"]
+    record_action(
+        action=f"github_{planned_removal['mode']}_removal",
+        outcome="removed" if removed else "failed")
+    return dict(
+        user=planned_removal["user"],
+        mode=planned_removal["mode"],
+        target=target,
+        removed=removed
+    )
+
+
+def run_github_removals(removal_plan: list, max_workers: int = github_max_workers):
+    planned_removals = []
+    for planned_removal in removal_plan:
+        if planned_removal["mode"] == "org":
+            planned_removals.append(planned_removal)
+            continue
+        for team in planned_removal["teams"]:
+            planned_removals.append(
+                dict(user=planned_removal["user"], mode="team", team=team))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(run_planned_removal, planned_removals))
+
+
+def build_removal_report(removal_plan: list, results: list):
+    report = dict(users={}, calls=len(results), removed=0, failed=0)
+    for planned_removal in removal_plan:
+        report["users"][planned_removal["user"]] = dict(
+            mode=planned_removal["mode"],
+            teams=planned_removal["teams"],
+            removed_from=[],
+            failed=[]
+        )
+    for result in results:
+        user_report = report["users"][result["user"]]
+        if result["removed"]:
+            user_report["removed_from"].append(result["target"])
+            report["removed"] += 1
+        else:
+            user_report["failed"].append(result["target"])
+            report["failed"] += 1
+    return report
+
+
+def log_removal_plan(removal_plan: list):
+    for planned_removal in removal_plan:
+        if planned_removal["mode"] == "org":
+            logger.info(
+                f"Result: user: {planned_removal['user']}, will be removed from organisation: {github_org}")
+        else:
+            for team in planned_removal["teams"]:
+                logger.info(
+                    f"Result: user: {planned_removal['user']}, will be removed from team: {team}")
+
+
+def remove_github_users(users: list, ignored_teams: list = None, org_removal: bool = False,
+                        max_workers: int = github_max_workers, dry_run: bool = False):
+    ignored_teams = ignored_teams or []
     all_teams = get_github_teams()
     teams = remove_ignored_teams(ignored_teams=ignored_teams, teams=all_teams)
     logger.info(f"Teams to check: {teams}")
+
+    # Org-level removal needs to know about ignored team memberships too
+    with timed_stage(stage="plan"):
+        memberships = get_user_team_memberships(
+            users=users, teams=all_teams if org_removal else teams)
+        org_members = get_org_members_without_teams(
+            memberships=memberships) if org_removal else []
+    removal_plan = plan_github_removals(
+        memberships=memberships,
+        ignored_teams=ignored_teams,
+        org_removal=org_removal,
+        org_members=org_members
+    )
+    log_removal_plan(removal_plan=removal_plan)
+    if dry_run:
+        return build_removal_report(removal_plan=removal_plan, results=[])
+
+    with timed_stage(stage="remove"):
+        results = run_github_removals(
+            removal_plan=removal_plan, max_workers=max_workers)
+    return build_removal_report(removal_plan=removal_plan, results=results)
+
+
+def main():
+    args = parse_arguments()
+    if github_cache_s3_bucket:
+        s3_client = create_cache_s3_client()
+        # The cache is downloaded before the session opens it
+        download_github_cache(
+            s3_client=s3_client, s3_bucket_name=github_cache_s3_bucket, org=github_org)
+    get_github_session()
+    run_github_removal(args=args)
+    if github_cache_s3_bucket:
+        upload_github_cache(
+            s3_client=s3_client, s3_bucket_name=github_cache_s3_bucket, org=github_org)
+
+
+def run_github_removal(args):
+    remove_users = not args.dry_run
     if remove_users:
         logger.info(f"Pending changes, waiting for 5 seconds")
         time.sleep(5)
     else:
         logger.info(f"No changes will be made: dry-run enabled")
 
-    # Starting tasks to loop through teams and users
-    for team in teams:
-        result = check_team_members(users_to_check=users, team_name=team)
-        if result["users"]:
-            manage_team_members(
-                team_name=team, users=result["users"], remove_users=remove_users)
+    report = remove_github_users(
+        users=args.users,
+        ignored_teams=args.ignore,
+        org_removal=args.org_removal,
+        max_workers=args.max_workers,
+        dry_run=not remove_users
+    )
+    if not remove_users:
+        return
 
-    # Clear Cache
-    if remove_users:
-        session.cache.clear()
+    logger.info(
+        f"Removed {report['removed']} memberships with {report['calls']} calls, {report['failed']} failed")
+    if args.report_filename:
+        with open(args.report_filename, "w") as report_file:
+            json.dump(report, report_file, indent=2)
 
 
 if __name__ == "__main__":
-    main()
+    run_with_report(flow="remove_github_users", function=main)
@@ -1,12 +1,24 @@
 from remove_users import (
     parse_arguments, get_github_teams,
-    remove_ignored_teams, get_github_team_members
+    remove_ignored_teams, get_github_team_members,
+    plan_github_removals, run_github_removals, build_removal_report
 )
 
+import boto3
 import pytest
 import json
 import responses
+from moto import mock_s3
 import os
+import remove_users
+
+
+@pytest.fixture(autouse=True)
+def github_session(tmp_path, monkeypatch):
+    # Keep every test's cache out of the working directory
+    monkeypatch.setattr(
+        remove_users, "session",
+        remove_users.create_github_session(cache_path=str(tmp_path / "github-cache-test.sqlite")))
 
 
 # Users
@@ -142,3 +154,154 @@ def test_get_github_team_members():
 
     assert len(members) == 3
     assert members == ["user1", "user2", "user3"]
+
+
+# Plan and run GitHub removals
+def test_plan_github_removals():
+    memberships = {
+        "leaver": ["test-admins", "test-developers"],
+        "mover": ["test-developers", "test-ops"],
+        "unchanged": ["test-ops"],
+        "teamless": [],
+        "outsider": [],
+    }
+
+    removal_plan = plan_github_removals(
+        memberships=memberships, ignored_teams=["test-ops"], org_removal=True,
+        org_members=["teamless"])
+
+    assert removal_plan == [
+        {"user": "leaver", "mode": "org", "teams": ["test-admins", "test-developers"]},
+        {"user": "mover", "mode": "team", "teams": ["test-developers"]},
+        {"user": "teamless", "mode": "org", "teams": []},
+    ]
+
+
+@responses.activate
+def test_get_org_members_without_teams():
+    org_url = f"{remove_users.github_api_base_url}/orgs/{remove_users.github_org}"
+    responses.add(responses.GET, f"{org_url}/memberships/teamless", json={"state": "active"})
+    responses.add(responses.GET, f"{org_url}/memberships/outsider", status=404)
+    memberships = {"leaver": ["test-admins"], "teamless": [], "outsider": []}
+
+    org_members = remove_users.get_org_members_without_teams(memberships=memberships)
+
+    assert org_members == ["teamless"]
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_run_github_removals(monkeypatch):
+    monkeypatch.setattr(remove_users, "github_mutations_per_second", 1000)
+    org_url = f"{remove_users.github_api_base_url}/orgs/{remove_users.github_org}"
+    responses.add(responses.DELETE, f"{org_url}/memberships/leaver", status=204)
+    responses.add(
+        responses.DELETE, f"{org_url}/teams/test-developers/memberships/mover",
+        status=429, headers={"Retry-After": "0"})
+    responses.add(
+        responses.DELETE, f"{org_url}/teams/test-developers/memberships/mover", status=204)
+    responses.add(
+        responses.DELETE, f"{org_url}/teams/test-admins/memberships/mover", status=404)
+    removal_plan = [
+        {"user": "leaver", "mode": "org", "teams": ["test-admins", "test-developers"]},
+        {"user": "mover", "mode": "team", "teams": ["test-developers", "test-admins"]},
+    ]
+
+    results = run_github_removals(removal_plan=removal_plan, max_workers=2)
+    report = build_removal_report(removal_plan=removal_plan, results=results)
+
+    assert report["calls"] == 3
+    assert report["removed"] == 2
+    assert report["users"]["leaver"]["removed_from"] == [remove_users.github_org]
+    assert report["users"]["mover"]["removed_from"] == ["test-developers"]
+    assert report["users"]["mover"]["failed"] == ["test-admins"]
+
+
+@responses.activate
+def test_remove_github_users_dry_run_only_plans():
+    org_url = f"{remove_users.github_api_base_url}/orgs/{remove_users.github_org}"
+    responses.add(
+        responses.GET, f"{org_url}/teams", json=[{"slug": "test-admins"}, {"slug": "test-ops"}])
+    responses.add(
+        responses.GET, f"{org_url}/teams/test-admins/members", json=[{"login": "leaver"}])
+
+    report = remove_users.remove_github_users(
+        users=["leaver"], ignored_teams=["test-ops"], dry_run=True)
+
+    assert report["users"]["leaver"]["teams"] == ["test-admins"]
+    assert report["calls"] == 0
+    assert all(call.request.method == "GET" for call in responses.calls)
+
+
+@responses.activate
+def test_org_removal_keeps_members_of_ignored_teams_beyond_the_first_page():
+    org_url = f"{remove_users.github_api_base_url}/orgs/{remove_users.github_org}"
+    teams_url = f"{org_url}/teams?per_page={remove_users.github_per_page}"
+    responses.add(
+        responses.GET, teams_url,
+        json=[{"slug": f"team-{team_number}"} for team_number in range(100)],
+        headers={"Link": f'<{teams_url}&page=2>; rel="next", <{teams_url}&page=2>; rel="last"'},
+        match=[responses.matchers.query_param_matcher({"per_page": "100"})])
+    responses.add(
+        responses.GET, f"{teams_url}&page=2", json=[{"slug": "test-ops"}],
+        match=[responses.matchers.query_param_matcher({"per_page": "100", "page": "2"})])
+    for team_number in range(100):
+        responses.add(responses.GET, f"{org_url}/teams/team-{team_number}/members", json=[])
+    responses.add(responses.GET, f"{org_url}/teams/test-ops/members", json=[{"login": "keeper"}])
+
+    report = remove_users.remove_github_users(
+        users=["keeper"], ignored_teams=["test-ops"], org_removal=True, dry_run=True)
+
+    assert report["users"] == {}
+
+
+# Persistent GitHub cache
+@responses.activate
+def test_github_session_revalidates_expired_entries(tmp_path, monkeypatch):
+    monkeypatch.setattr(remove_users, "github_cache_expire_after", 0)
+    cache_path = str(tmp_path / "github-cache-test.sqlite")
+    url = f"{remove_users.github_api_base_url}/orgs/test/teams"
+    responses.add(responses.GET, url, json=[{"slug": "test-admins"}], headers={"ETag": '"teams"'})
+    responses.add(responses.GET, url, status=304, headers={"ETag": '"teams"'})
+
+    remove_users.create_github_session(cache_path=cache_path).get(url)
+    response = remove_users.create_github_session(cache_path=cache_path).get(url)
+
+    assert response.from_cache
+    assert response.json() == [{"slug": "test-admins"}]
+    assert responses.calls[1].request.headers["If-None-Match"] == '"teams"'
+    assert remove_users.get_github_outcome(response=response) == "cache_revalidated"
+
+
+@mock_s3
+def test_github_cache_round_trips_through_s3(tmp_path, monkeypatch):
+    monkeypatch.setattr(remove_users, "github_cache_dir", str(tmp_path))
+    monkeypatch.setattr(
+        remove_users, "session",
+        remove_users.create_github_session(cache_path=remove_users.get_github_cache_path(org="test")))
+    s3_client = boto3.client("s3", region_name="eu-west-2")
+    s3_client.create_bucket(
+        Bucket="cache", CreateBucketConfiguration={"LocationConstraint": "eu-west-2"})
+
+    assert not remove_users.download_github_cache(
+        s3_client=s3_client, s3_bucket_name="cache", org="test")
+    remove_users.upload_github_cache(s3_client=s3_client, s3_bucket_name="cache", org="test")
+    assert remove_users.download_github_cache(
+        s3_client=s3_client, s3_bucket_name="cache", org="test")
+
+
+def test_github_session_is_created_on_first_use(tmp_path, monkeypatch):
+    monkeypatch.setattr(remove_users, "session", None)
+    monkeypatch.setattr(remove_users, "github_cache_dir", str(tmp_path))
+    monkeypatch.setattr(remove_users, "github_org", "test")
+
+    assert remove_users.get_github_session() is remove_users.get_github_session()
+    assert (tmp_path / "github-cache-test.sqlite").exists()
+
+
+def test_github_session_requires_an_org(monkeypatch):
+    monkeypatch.setattr(remove_users, "session", None)
+    monkeypatch.setattr(remove_users, "github_org", None)
+
+    with pytest.raises(SystemExit):
+        remove_users.get_github_session()
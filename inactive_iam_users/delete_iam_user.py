@@ -1,5 +1,7 @@
 import argparse
-from iam_common import create_iam_client, delete_iam_user_handler
+import logging
+from iam_common import create_iam_client, delete_iam_user_handler, log_iam_retry_counts
+from run_report import run_with_report
 
 
 def parse_delete_iam_user_arguments():
@@ -32,6 +34,14 @@ def delete_iam_user():
     iam_user_deleted = delete_iam_user_handler(
         aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
     )
+    log_iam_retry_counts()
+    if iam_user_deleted is False:
+        logging.error(f"Unable to delete IAM user {iam_user} in AWS account {aws_account}")
+        exit(1)
+    logging.info(
+        f"IAM user {iam_user} in AWS account {aws_account} "
+        f"{'deleted' if iam_user_deleted else 'not found'}"
+    )
 
 
-delete_iam_user()
+run_with_report(flow="delete_iam_user", function=delete_iam_user)
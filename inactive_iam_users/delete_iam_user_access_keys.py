@@ -1,32 +1,29 @@
 import logging
 from inactive_users_common import *
 from iam_common import *
+from run_report import run_with_report
 
 logging.basicConfig(level=logging.INFO)
 
-
-def check_if_user_in_deletion_threshold(days_inactive, deletion_threshold, username):
-    if int(days_inactive) >= int(deletion_threshold):
-        logging.info(
-            f"The access keys for {username} have been inactive for {days_inactive} days and should be deleted"
-        )
-        action_to_be_taken = True
-    else:
-        logging.info(
-            f"The access keys for {username} have been in active for {days_inactive}, which is not within the deletion"
-            f" threshold of {deletion_threshold} days"
-        )
-        action_to_be_taken = False
-    return action_to_be_taken
+access_key_notification_types = {
+    "deactivate": "iam_access_key_deactivation",
+    "delete": "iam_access_key_deletion",
+}
 
 
 def delete_iam_user_access_keys():
     (
+        access_key_grace_period_days,
         account_id,
         api_key,
         days_inactive,
+        deactivation_template_id,
+        deletion_template_id,
         deletion_threshold,
+        escalation_policy,
         ignore_list,
+        notification_spool,
+        state_file,
         template_id,
         username,
         warning_threshold,
@@ -37,47 +34,61 @@ def delete_iam_user_access_keys():
     if user_in_ignore_list:
         logging.info(f"User {username} is in the ignore list, so no action to be taken")
     else:
-        user_in_deletion_threshold = check_if_user_in_deletion_threshold(
-            days_inactive=days_inactive,
-            deletion_threshold=deletion_threshold,
-            username=username,
+        logging.info(
+            f"Reviewing access keys for {username} in {account_id} against the {deletion_threshold} day threshold"
         )
-        if user_in_deletion_threshold:
-            logging.info(
-                f"Proceeding with access key deletion for {username} in {account_id}"
-            )
-            iam_client = create_iam_client()
-            access_key_deleted = delete_user_access_keys(
-                aws_account=account_id, iam_client=iam_client, iam_user=username
-            )
-            if access_key_deleted:
-                user_has_email_address = check_iam_user_has_email_address(
-                    iam_user=username
+        iam_client = create_iam_client()
+        access_key_actions = manage_account_access_keys(
+            aws_account=account_id,
+            iam_client=iam_client,
+            iam_users=[username],
+            deactivation_threshold=int(deletion_threshold),
+            grace_period_days=access_key_grace_period_days,
+        ).get(username, [])
+        if access_key_actions:
+            user_has_email_address = check_iam_user_has_email_address(iam_user=username)
+            if user_has_email_address:
+                logging.info(
+                    f"Sending email notification to {username} regarding inactivity on {account_id}"
                 )
-                if user_has_email_address:
-                    logging.info(
-                        f"Sending email notification to {username} regarding inactivity on {account_id}"
-                    )
-                    send_email_via_notify(
-                        api_key=api_key,
-                        aws_account=account_id,
-                        email_address=username,
-                        inactive_number_of_days=days_inactive,
-                        max_number_of_days=deletion_threshold,
-                        template_id=template_id,
-                    )
+                dispatch_notifications(
+                    api_key=api_key,
+                    notifications=[
+                        create_notification(
+                            notification_type=access_key_notification_types[action],
+                            email_address=username,
+                            template_id={
+                                "deactivate": deactivation_template_id,
+                                "delete": deletion_template_id,
+                            }[action],
+                            aws_account=account_id,
+                            inactive_number_of_days=max(
+                                access_key_action["inactive_number_of_days"]
+                                for access_key_action in access_key_actions
+                                if access_key_action["action"] == action
+                            ),
+                            max_number_of_days=deletion_threshold,
+                        )
+                        for action in sorted(
+                            {access_key_action["action"] for access_key_action in access_key_actions}
+                        )
+                    ],
+                    notification_spool=notification_spool,
+                )
+                if not notification_spool:
                     logging.info(
                         f"Email sent to {username} regarding inactivity on {account_id}"
                     )
-                else:
-                    logging.info(
-                        f"{username} does not appear to be in an email address format, no email to be sent"
-                    )
             else:
                 logging.info(
-                    f"Not sending email notification to {username} regarding inactivity on {account_id} as account was "
-                    f"not deleted/removed"
+                    f"{username} does not appear to be in an email address format, no email to be sent"
                 )
+        else:
+            logging.info(
+                f"Not sending email notification to {username} regarding inactivity on {account_id} as no access "
+                f"keys were deactivated or deleted"
+            )
+    log_iam_retry_counts()
 
 
-delete_iam_user_access_keys()
+run_with_report(flow="delete_iam_user_access_keys", function=delete_iam_user_access_keys)
@@ -1,6 +1,7 @@
 import logging
 from inactive_users_common import *
 from iam_common import *
+from run_report import run_with_report
 
 logging.basicConfig(level=logging.INFO)
 
@@ -21,11 +22,17 @@ def check_if_user_in_deletion_threshold(days_inactive, deletion_threshold, usern
 
 def delete_inactive_iam_user():
     (
+        access_key_grace_period_days,
         account_id,
         api_key,
         days_inactive,
+        deactivation_template_id,
+        deletion_template_id,
         deletion_threshold,
+        escalation_policy,
         ignore_list,
+        notification_spool,
+        state_file,
         template_id,
         username,
         warning_threshold,
@@ -57,17 +64,24 @@ def delete_inactive_iam_user():
                     logging.info(
                         f"Sending email notification to {username} regarding inactivity on {account_id}"
                     )
-                    send_email_via_notify(
+                    dispatch_notifications(
                         api_key=api_key,
-                        aws_account=account_id,
-                        email_address=username,
-                        inactive_number_of_days=days_inactive,
-                        max_number_of_days=deletion_threshold,
-                        template_id=template_id,
-                    )
-                    logging.info(
-                        f"Email sent to {username} regarding inactivity on {account_id}"
+                        notifications=[
+                            create_notification(
+                                notification_type="iam_user_deletion",
+                                email_address=username,
+                                template_id=template_id,
+                                aws_account=account_id,
+                                inactive_number_of_days=days_inactive,
+                                max_number_of_days=deletion_threshold,
+                            )
+                        ],
+                        notification_spool=notification_spool,
                     )
+                    if not notification_spool:
+                        logging.info(
+                            f"Email sent to {username} regarding inactivity on {account_id}"
+                        )
                 else:
                     logging.info(
                         f"{username} does not appear to be in an email address format, no email to be sent"
@@ -77,6 +91,7 @@ def delete_inactive_iam_user():
                     f"Not sending email notification to {username} regarding inactivity on {account_id} as account was "
                     f"not deleted/removed"
                 )
+    log_iam_retry_counts()
 
 
-delete_inactive_iam_user()
+run_with_report(flow="delete_inactive_iam_user", function=delete_inactive_iam_user)
@@ -1,4 +1,5 @@
 import argparse
+from report_parsing import get_reference_time, parse_number_of_inactive_days
 
 
 def parse_inactive_days_arguments():
@@ -6,7 +7,7 @@ def parse_inactive_days_arguments():
     parser = argparse.ArgumentParser(description=description)
     parser.add_argument(
         "--inactivity-in-days-string",
-        help="The string response for inactivity in days, to be converted into a single int value",
+        help="The inactivity in days, as <days> days or an ISO timestamp of the last activity, to be converted into a single int value",
         dest="inactivity_in_days_string",
         required=True,
     )
@@ -19,8 +20,8 @@ def get_inactive_days_args(args=parse_inactive_days_arguments()):
 
 
 def get_number_of_inactive_days_for_user(inactivity_in_days):
-    number_of_inactive_days = int(
-        "".join(list(filter(str.isdigit, inactivity_in_days)))
+    number_of_inactive_days = parse_number_of_inactive_days(
+        inactivity_in_days=inactivity_in_days, reference_time=get_reference_time()
     )
     print(number_of_inactive_days)
     return number_of_inactive_days
@@ -1,14 +1,196 @@
-import boto3
 import botocore.exceptions
+import collections
+import datetime
 import logging
+import os
+import random
+import threading
+import time
+import weakref
+from aws_client_registry import get_client
+from run_report import record_action
 
 logging.basicConfig(level=logging.INFO)
 
+iam_max_attempts = 5
+iam_max_backoff_seconds = 20
+iam_requests_per_second = int(os.environ.get("IAM_REQUESTS_PER_SECOND", 10))
+iam_retryable_error_codes = (
+    "Throttling",
+    "ThrottlingException",
+    "LimitExceeded",
+    "RequestLimitExceeded",
+    "ServiceFailure",
+    "ServiceUnavailable",
+    "ConcurrentModification",
+)
+iam_conflict_error_codes = (
+    "NoSuchEntity",
+    "DeleteConflict",
+    "EntityAlreadyExists",
+    "EntityTemporarilyUnmodifiable",
+)
+# IAM throttles per AWS account, and each account is reached through its own client
+iam_token_buckets = {
+    "buckets": weakref.WeakKeyDictionary(),
+    "lock": threading.Lock(),
+}
+iam_retry_counts = collections.Counter()
+access_key_grace_period_days = 14
+# IAM access keys cannot be tagged, so the time each key was deactivated is kept in a tag on its user
+access_key_deactivation_tag_prefix = "ccs-user-management:access-key-deactivated:"
+iam_inventory_min_deletions = 5
+
+
+def get_iam_token_bucket(iam_client):
+    with iam_token_buckets["lock"]:
+        iam_token_bucket = iam_token_buckets["buckets"].get(iam_client)
+        if iam_token_bucket is None:
+            iam_token_bucket = {
+                "tokens": iam_requests_per_second,
+                "updated": time.monotonic(),
+                "lock": threading.Lock(),
+            }
+            iam_token_buckets["buckets"][iam_client] = iam_token_bucket
+        return iam_token_bucket
+
+
+def take_iam_token(iam_client):
+    iam_token_bucket = get_iam_token_bucket(iam_client=iam_client)
+    with iam_token_bucket["lock"]:
+        now = time.monotonic()
+        iam_token_bucket["tokens"] = min(
+            iam_requests_per_second,
+            iam_token_bucket["tokens"]
+            + (now - iam_token_bucket["updated"]) * iam_requests_per_second,
+        )
+        iam_token_bucket["updated"] = now
+        if iam_token_bucket["tokens"] >= 1:
+            iam_token_bucket["tokens"] -= 1
+            return 0
+        return (1 - iam_token_bucket["tokens"]) / iam_requests_per_second
+
+
+def acquire_iam_token(iam_client):
+    wait_seconds = take_iam_token(iam_client=iam_client)
+    while wait_seconds:
+        time.sleep(wait_seconds)
+        wait_seconds = take_iam_token(iam_client=iam_client)
+
+
+def classify_client_error(client_error):
+    error_code = client_error.response.get("Error", {}).get("Code")
+    if error_code in iam_retryable_error_codes:
+        return "retryable"
+    if error_code in iam_conflict_error_codes:
+        return "conflict"
+    return "fatal"
+
+
+def call_iam_api(iam_client, operation, **kwargs):
+    for attempt in range(1, iam_max_attempts + 1):
+        acquire_iam_token(iam_client=iam_client)
+        try:
+            response = getattr(iam_client, operation)(**kwargs)
+            iam_retry_counts[operation] += response.get("ResponseMetadata", {}).get(
+                "RetryAttempts", 0
+            )
+            return response
+        except botocore.exceptions.ClientError as e:
+            iam_retry_counts[operation] += e.response.get("ResponseMetadata", {}).get(
+                "RetryAttempts", 0
+            )
+            if classify_client_error(client_error=e) != "retryable" or attempt == iam_max_attempts:
+                raise
+            backoff_seconds = random.uniform(0, min(iam_max_backoff_seconds, 2 ** attempt))
+            logging.info(
+                f"IAM {operation} was throttled, retrying in {backoff_seconds:.1f} seconds "
+                f"(attempt {attempt} of {iam_max_attempts})"
+            )
+            iam_retry_counts[operation] += 1
+            time.sleep(backoff_seconds)
+
+
+def handle_iam_client_error(client_error, message):
+    if classify_client_error(client_error=client_error) == "conflict":
+        logging.warning(f"{message}, continuing: {client_error}")
+        return
+    logging.error(f"{message}: {client_error}")
+    exit(1)
+
+
+def log_iam_retry_counts():
+    for operation, retry_count in sorted(iam_retry_counts.items()):
+        if retry_count:
+            logging.info(f"IAM {operation} was retried {retry_count} times")
+
+
+def paginate_iam_api(iam_client, operation, result_key, **kwargs):
+    while True:
+        response = call_iam_api(iam_client=iam_client, operation=operation, **kwargs)
+        yield from response.get(result_key, [])
+        if not response.get("IsTruncated"):
+            return
+        kwargs["Marker"] = response["Marker"]
+
+
+def create_empty_user_inventory():
+    return {"groups": [], "inline_policies": [], "attached_policies": [], "mfa_devices": []}
+
+
+def create_user_inventory(user_detail):
+    return {
+        "groups": [{"GroupName": group_name} for group_name in user_detail.get("GroupList", [])],
+        "inline_policies": [
+            user_policy["PolicyName"] for user_policy in user_detail.get("UserPolicyList", [])
+        ],
+        "attached_policies": [
+            {"PolicyArn": attached_policy["PolicyArn"]}
+            for attached_policy in user_detail.get("AttachedManagedPolicies", [])
+        ],
+        "mfa_devices": [],
+    }
+
+
+def add_virtual_mfa_device_to_inventory(users, virtual_mfa_device):
+    iam_user = virtual_mfa_device.get("User", {}).get("UserName")
+    if iam_user in users:
+        users[iam_user]["mfa_devices"].append({"SerialNumber": virtual_mfa_device["SerialNumber"]})
+
+
+def build_iam_inventory(aws_account, iam_client):
+    try:
+        logging.info(f"Building IAM inventory for AWS account: {aws_account}")
+        users = {}
+        for user in paginate_iam_api(
+            iam_client=iam_client,
+            operation="get_account_authorization_details",
+            result_key="UserDetailList",
+            Filter=["User"],
+        ):
+            users[user["UserName"]] = create_user_inventory(user_detail=user)
+        for user in paginate_iam_api(
+            iam_client=iam_client, operation="list_users", result_key="Users"
+        ):
+            users.setdefault(user["UserName"], create_empty_user_inventory())
+        for virtual_mfa_device in paginate_iam_api(
+            iam_client=iam_client,
+            operation="list_virtual_mfa_devices",
+            result_key="VirtualMFADevices",
+            AssignmentStatus="Assigned",
+        ):
+            add_virtual_mfa_device_to_inventory(users=users, virtual_mfa_device=virtual_mfa_device)
+        logging.info(f"IAM inventory for AWS account {aws_account} contains {len(users)} users")
+        return {"aws_account": aws_account, "users": users}
+    except botocore.exceptions.ClientError as e:
+        logging.error(f"Unable to build IAM inventory for AWS account {aws_account}: {e}")
+        exit(1)
+
 
 def create_iam_client():
     try:
         logging.debug("Creating IAM Client")
-        iam_client = boto3.client("iam", region_name="eu-west-2")
+        iam_client = get_client(service_name="iam")
         logging.debug("Successfully created IAM Client")
         return iam_client
     except botocore.exceptions.ClientError as e:
@@ -21,7 +203,7 @@ def check_if_user_exists(aws_account, iam_client, iam_user):
         logging.debug(
             f"Checking to see if user {iam_user} exists in AWS account: {aws_account}"
         )
-        iam_client.get_user(UserName=iam_user)
+        call_iam_api(iam_client=iam_client, operation="get_user", UserName=iam_user)
         return True
     except iam_client.exceptions.NoSuchEntityException:
         logging.debug(
@@ -40,7 +222,11 @@ def delete_iam_login_profile(aws_account, iam_client, iam_user):
         logging.info(
             f"Attempting to delete IAM login profile for {iam_user} from AWS account: {aws_account}"
         )
-        iam_client.delete_login_profile(UserName=iam_user)
+        call_iam_api(
+            iam_client=iam_client,
+            operation="delete_login_profile",
+            UserName=iam_user,
+        )
         logging.info(
             f"IAM login profile {iam_user} has been deleted from AWS account: {aws_account}"
         )
@@ -49,8 +235,9 @@ def delete_iam_login_profile(aws_account, iam_client, iam_user):
             f"User {iam_user} does not have a login profile associated with their IAM user, continuing"
         )
     except botocore.exceptions.ClientError as e:
-        logging.error(f"Unable to delete IAM login profile {iam_user}: {e}")
-        exit(1)
+        handle_iam_client_error(
+            client_error=e, message=f"Unable to delete IAM login profile {iam_user}"
+        )
 
 
 def delete_user_access_keys(aws_account, iam_client, iam_user):
@@ -58,12 +245,19 @@ def delete_user_access_keys(aws_account, iam_client, iam_user):
         logging.info(
             f"Checking for access keys associated with {iam_user} in AWS account: {aws_account}"
         )
-        access_keys = iam_client.list_access_keys(UserName=iam_user)
+        access_keys = call_iam_api(
+            iam_client=iam_client,
+            operation="list_access_keys",
+            UserName=iam_user,
+        )
         user_access_keys = access_keys["AccessKeyMetadata"]
         if user_access_keys:
             for user_access_key in user_access_keys:
-                iam_client.delete_access_key(
-                    UserName=iam_user, AccessKeyId=user_access_key["AccessKeyId"]
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation="delete_access_key",
+                    UserName=iam_user,
+                    AccessKeyId=user_access_key["AccessKeyId"],
                 )
             logging.info(
                 f"Deleted all access keys associated with user {iam_user} in AWS account {aws_account}"
@@ -75,8 +269,192 @@ def delete_user_access_keys(aws_account, iam_client, iam_user):
             )
             return False
     except botocore.exceptions.ClientError as e:
-        logging.error(f"Unable to delete access keys for user {iam_user}: {e}")
-        exit(1)
+        handle_iam_client_error(
+            client_error=e, message=f"Unable to delete access keys for user {iam_user}"
+        )
+
+
+def get_access_key_inactive_days(access_key, access_key_last_used, reference_time):
+    last_activity = access_key_last_used.get("LastUsedDate") or access_key["CreateDate"]
+    return (reference_time - last_activity).days
+
+
+def get_access_key_deactivation_tag_key(access_key_id):
+    return f"{access_key_deactivation_tag_prefix}{access_key_id}"
+
+
+def get_access_key_deactivation_times(iam_client, iam_user):
+    deactivation_times = {}
+    for user_tag in paginate_iam_api(
+        iam_client=iam_client, operation="list_user_tags", result_key="Tags", UserName=iam_user
+    ):
+        if user_tag["Key"].startswith(access_key_deactivation_tag_prefix):
+            deactivation_times[user_tag["Key"][len(access_key_deactivation_tag_prefix):]] = (
+                datetime.datetime.fromisoformat(user_tag["Value"])
+            )
+    return deactivation_times
+
+
+def tag_access_key_deactivation(iam_client, iam_user, access_key_id, deactivation_time):
+    call_iam_api(
+        iam_client=iam_client,
+        operation="tag_user",
+        UserName=iam_user,
+        Tags=[
+            {
+                "Key": get_access_key_deactivation_tag_key(access_key_id=access_key_id),
+                "Value": deactivation_time.isoformat(),
+            }
+        ],
+    )
+
+
+def evaluate_user_access_keys(
+    aws_account,
+    iam_client,
+    iam_user,
+    deactivation_threshold,
+    grace_period_days=access_key_grace_period_days,
+    reference_time=None,
+):
+    reference_time = reference_time or datetime.datetime.now(datetime.timezone.utc)
+    access_key_actions = []
+    deactivation_times = None
+    try:
+        access_keys = call_iam_api(
+            iam_client=iam_client, operation="list_access_keys", UserName=iam_user
+        )
+        for access_key in access_keys["AccessKeyMetadata"]:
+            access_key_last_used = call_iam_api(
+                iam_client=iam_client,
+                operation="get_access_key_last_used",
+                AccessKeyId=access_key["AccessKeyId"],
+            )
+            inactive_number_of_days = get_access_key_inactive_days(
+                access_key=access_key,
+                access_key_last_used=access_key_last_used["AccessKeyLastUsed"],
+                reference_time=reference_time,
+            )
+            if access_key["Status"] == "Active" and inactive_number_of_days >= deactivation_threshold:
+                action = "deactivate"
+            elif access_key["Status"] == "Inactive" and inactive_number_of_days >= deactivation_threshold:
+                if deactivation_times is None:
+                    deactivation_times = get_access_key_deactivation_times(
+                        iam_client=iam_client, iam_user=iam_user
+                    )
+                deactivation_time = deactivation_times.get(access_key["AccessKeyId"])
+                if deactivation_time is None:
+                    logging.info(
+                        f"Access key {access_key['AccessKeyId']} for user {iam_user} in AWS account {aws_account} "
+                        f"was deactivated without a record of when, starting its {grace_period_days} day grace period"
+                    )
+                    tag_access_key_deactivation(
+                        iam_client=iam_client,
+                        iam_user=iam_user,
+                        access_key_id=access_key["AccessKeyId"],
+                        deactivation_time=reference_time,
+                    )
+                    continue
+                if (reference_time - deactivation_time).days < grace_period_days:
+                    continue
+                action = "delete"
+            else:
+                continue
+            access_key_actions.append(
+                {
+                    "access_key_id": access_key["AccessKeyId"],
+                    "action": action,
+                    "inactive_number_of_days": inactive_number_of_days,
+                }
+            )
+    except botocore.exceptions.ClientError as e:
+        handle_iam_client_error(
+            client_error=e,
+            message=f"Unable to evaluate access keys for user {iam_user} in AWS account {aws_account}",
+        )
+    return access_key_actions
+
+
+def apply_user_access_key_actions(aws_account, iam_client, iam_user, access_key_actions):
+    for access_key_action in access_key_actions:
+        access_key_id = access_key_action["access_key_id"]
+        try:
+            if access_key_action["action"] == "deactivate":
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation="update_access_key",
+                    UserName=iam_user,
+                    AccessKeyId=access_key_id,
+                    Status="Inactive",
+                )
+                tag_access_key_deactivation(
+                    iam_client=iam_client,
+                    iam_user=iam_user,
+                    access_key_id=access_key_id,
+                    deactivation_time=datetime.datetime.now(datetime.timezone.utc),
+                )
+                logging.info(
+                    f"Deactivated access key {access_key_id} for user {iam_user} in AWS account {aws_account}, "
+                    f"unused for {access_key_action['inactive_number_of_days']} days"
+                )
+            else:
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation="delete_access_key",
+                    UserName=iam_user,
+                    AccessKeyId=access_key_id,
+                )
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation="untag_user",
+                    UserName=iam_user,
+                    TagKeys=[get_access_key_deactivation_tag_key(access_key_id=access_key_id)],
+                )
+                logging.info(
+                    f"Deleted inactive access key {access_key_id} for user {iam_user} in AWS account {aws_account}, "
+                    f"unused for {access_key_action['inactive_number_of_days']} days"
+                )
+            record_action(action=f"access_key_{access_key_action['action']}", outcome="success")
+        except botocore.exceptions.ClientError as e:
+            record_action(action=f"access_key_{access_key_action['action']}", outcome="failed")
+            handle_iam_client_error(
+                client_error=e,
+                message=f"Unable to {access_key_action['action']} access key {access_key_id} for user {iam_user}",
+            )
+
+
+def manage_account_access_keys(
+    aws_account,
+    iam_client,
+    iam_users,
+    deactivation_threshold,
+    grace_period_days=access_key_grace_period_days,
+    reference_time=None,
+):
+    access_key_actions_by_user = {}
+    for iam_user in iam_users:
+        access_key_actions = evaluate_user_access_keys(
+            aws_account=aws_account,
+            iam_client=iam_client,
+            iam_user=iam_user,
+            deactivation_threshold=deactivation_threshold,
+            grace_period_days=grace_period_days,
+            reference_time=reference_time,
+        )
+        if access_key_actions:
+            access_key_actions_by_user[iam_user] = access_key_actions
+    for iam_user, access_key_actions in access_key_actions_by_user.items():
+        apply_user_access_key_actions(
+            aws_account=aws_account,
+            iam_client=iam_client,
+            iam_user=iam_user,
+            access_key_actions=access_key_actions,
+        )
+    logging.info(
+        f"Reviewed the access keys of {len(iam_users)} users in AWS account {aws_account}, "
+        f"{len(access_key_actions_by_user)} users had access keys deactivated or deleted"
+    )
+    return access_key_actions_by_user
 
 
 def delete_user_signing_certificates(aws_account, iam_client, iam_user):
@@ -84,11 +462,17 @@ def delete_user_signing_certificates(aws_account, iam_client, iam_user):
         logging.info(
             f"Checking for signing certificates associated with {iam_user} in AWS account: {aws_account}"
         )
-        signing_certificates = iam_client.list_signing_certificates(UserName=iam_user)
+        signing_certificates = call_iam_api(
+            iam_client=iam_client,
+            operation="list_signing_certificates",
+            UserName=iam_user,
+        )
         user_signing_certificates = signing_certificates["Certificates"]
         if user_signing_certificates:
             for user_signing_certificate in user_signing_certificates:
-                iam_client.delete_signing_certificate(
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation="delete_signing_certificate",
                     UserName=iam_user,
                     CertificateId=user_signing_certificate["CertificateId"],
                 )
@@ -100,8 +484,9 @@ def delete_user_signing_certificates(aws_account, iam_client, iam_user):
                 f"No signing certificates found to be associated with user {iam_user} in AWS account {aws_account}"
             )
     except botocore.exceptions.ClientError as e:
-        logging.error(f"Unable to delete signing certificates for user {iam_user}: {e}")
-        exit(1)
+        handle_iam_client_error(
+            client_error=e, message=f"Unable to delete signing certificates for user {iam_user}"
+        )
 
 
 def delete_user_public_ssh_keys(aws_account, iam_client, iam_user):
@@ -109,11 +494,17 @@ def delete_user_public_ssh_keys(aws_account, iam_client, iam_user):
         logging.info(
             f"Checking for public SSH keys associated with {iam_user} in AWS account: {aws_account}"
         )
-        public_ssh_keys = iam_client.list_ssh_public_keys(UserName=iam_user)
+        public_ssh_keys = call_iam_api(
+            iam_client=iam_client,
+            operation="list_ssh_public_keys",
+            UserName=iam_user,
+        )
         user_public_ssh_keys = public_ssh_keys["SSHPublicKeys"]
         if user_public_ssh_keys:
             for user_public_ssh_key in user_public_ssh_keys:
-                iam_client.delete_ssh_public_key(
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation="delete_ssh_public_key",
                     UserName=iam_user,
                     SSHPublicKeyId=user_public_ssh_key["SSHPublicKeyId"],
                 )
@@ -125,8 +516,9 @@ def delete_user_public_ssh_keys(aws_account, iam_client, iam_user):
                 f"No public SSH keys found to be associated with user {iam_user} in AWS account {aws_account}"
             )
     except botocore.exceptions.ClientError as e:
-        logging.error(f"Unable to delete public SSH keys for user {iam_user}: {e}")
-        exit(1)
+        handle_iam_client_error(
+            client_error=e, message=f"Unable to delete public SSH keys for user {iam_user}"
+        )
 
 
 def delete_user_service_specific_credentials(aws_account, iam_client, iam_user):
@@ -134,19 +526,21 @@ def delete_user_service_specific_credentials(aws_account, iam_client, iam_user):
         logging.info(
             f"Checking for service specific credentials associated with {iam_user} in AWS account: {aws_account}"
         )
-        service_specific_credentials = iam_client.list_service_specific_credentials(
-            UserName=iam_user
+        service_specific_credentials = call_iam_api(
+            iam_client=iam_client,
+            operation="list_service_specific_credentials",
+            UserName=iam_user,
         )
         user_service_specific_credentials = service_specific_credentials[
             "ServiceSpecificCredentials"
         ]
         if user_service_specific_credentials:
             for user_service_specific_credential in user_service_specific_credentials:
-                iam_client.delete_service_specific_credential(
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation="delete_service_specific_credential",
                     UserName=iam_user,
-                    ServiceSpecificCredentialId=user_service_specific_credential[
-                        "ServiceSpecificCredentialId"
-                    ],
+                    ServiceSpecificCredentialId=user_service_specific_credential["ServiceSpecificCredentialId"],
                 )
             logging.info(
                 f"Deleted all service specific credentials associated with user {iam_user} in AWS account {aws_account}"
@@ -156,26 +550,35 @@ def delete_user_service_specific_credentials(aws_account, iam_client, iam_user):
                 f"No service specific credentials found to be associated with user {iam_user} in AWS account {aws_account}"
             )
     except botocore.exceptions.ClientError as e:
-        logging.error(
-            f"Unable to delete service specific credentials for user {iam_user}: {e}"
+        handle_iam_client_error(
+            client_error=e, message=f"Unable to delete service specific credentials for user {iam_user}"
         )
-        exit(1)
 
 
-def delete_user_mfa_device(aws_account, iam_client, iam_user):
+def delete_user_mfa_device(aws_account, iam_client, iam_user, user_mfa_devices=None):
     try:
-        logging.info(
-            f"Checking for MFA Devices associated with {iam_user} in AWS account: {aws_account}"
-        )
-        mfa_devices = iam_client.list_mfa_devices(UserName=iam_user)
-        user_mfa_devices = mfa_devices["MFADevices"]
+        if user_mfa_devices is None:
+            logging.info(
+                f"Checking for MFA Devices associated with {iam_user} in AWS account: {aws_account}"
+            )
+            mfa_devices = call_iam_api(
+                iam_client=iam_client,
+                operation="list_mfa_devices",
+                UserName=iam_user,
+            )
+            user_mfa_devices = mfa_devices["MFADevices"]
         if user_mfa_devices:
             for user_mfa_device in user_mfa_devices:
-                iam_client.deactivate_mfa_device(
-                    UserName=iam_user, SerialNumber=user_mfa_device["SerialNumber"]
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation="deactivate_mfa_device",
+                    UserName=iam_user,
+                    SerialNumber=user_mfa_device["SerialNumber"],
                 )
-                iam_client.delete_virtual_mfa_device(
-                    SerialNumber=user_mfa_device["SerialNumber"]
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation="delete_virtual_mfa_device",
+                    SerialNumber=user_mfa_device["SerialNumber"],
                 )
             logging.info(
                 f"Deleted MFA Devices associated with user {iam_user} in AWS account {aws_account}"
@@ -185,20 +588,31 @@ def delete_user_mfa_device(aws_account, iam_client, iam_user):
                 f"No MFA Devices found to be associated with user {iam_user} in AWS account {aws_account}"
             )
     except botocore.exceptions.ClientError as e:
-        logging.error(f"Unable to delete MFA Devices for user {iam_user}: {e}")
-        exit(1)
+        handle_iam_client_error(
+            client_error=e, message=f"Unable to delete MFA Devices for user {iam_user}"
+        )
 
 
-def delete_user_policies(aws_account, iam_client, iam_user):
+def delete_user_policies(aws_account, iam_client, iam_user, user_policies=None):
     try:
-        logging.info(
-            f"Checking for policies associated with {iam_user} in AWS account: {aws_account}"
-        )
-        policies = iam_client.list_user_policies(UserName=iam_user)
-        user_policies = policies["PolicyNames"]
+        if user_policies is None:
+            logging.info(
+                f"Checking for policies associated with {iam_user} in AWS account: {aws_account}"
+            )
+            policies = call_iam_api(
+                iam_client=iam_client,
+                operation="list_user_policies",
+                UserName=iam_user,
+            )
+            user_policies = policies["PolicyNames"]
         if user_policies:
             for user_policy in user_policies:
-                iam_client.delete_user_policy(UserName=iam_user, PolicyName=user_policy)
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation="delete_user_policy",
+                    UserName=iam_user,
+                    PolicyName=user_policy,
+                )
             logging.info(
                 f"Deleted all policies associated with user {iam_user} in AWS account {aws_account}"
             )
@@ -207,21 +621,32 @@ def delete_user_policies(aws_account, iam_client, iam_user):
                 f"No policies found to be associated with user {iam_user} in AWS account {aws_account}"
             )
     except botocore.exceptions.ClientError as e:
-        logging.error(f"Unable to delete policies for user {iam_user}: {e}")
-        exit(1)
+        handle_iam_client_error(
+            client_error=e, message=f"Unable to delete policies for user {iam_user}"
+        )
 
 
-def delete_attached_user_policies(aws_account, iam_client, iam_user):
+def delete_attached_user_policies(
+    aws_account, iam_client, iam_user, user_attached_policies=None
+):
     try:
-        logging.info(
-            f"Checking for attached policies associated with {iam_user} in AWS account: {aws_account}"
-        )
-        attached_policies = iam_client.list_attached_user_policies(UserName=iam_user)
-        user_attached_policies = attached_policies["AttachedPolicies"]
+        if user_attached_policies is None:
+            logging.info(
+                f"Checking for attached policies associated with {iam_user} in AWS account: {aws_account}"
+            )
+            attached_policies = call_iam_api(
+                iam_client=iam_client,
+                operation="list_attached_user_policies",
+                UserName=iam_user,
+            )
+            user_attached_policies = attached_policies["AttachedPolicies"]
         if user_attached_policies:
             for user_attached_policy in user_attached_policies:
-                iam_client.detach_user_policy(
-                    UserName=iam_user, PolicyArn=user_attached_policy["PolicyArn"]
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation="detach_user_policy",
+                    UserName=iam_user,
+                    PolicyArn=user_attached_policy["PolicyArn"],
                 )
             logging.info(
                 f"Deleted all attached policies associated with user {iam_user} in AWS account {aws_account}"
@@ -231,21 +656,30 @@ def delete_attached_user_policies(aws_account, iam_client, iam_user):
                 f"No attached policies found to be associated with user {iam_user} in AWS account {aws_account}"
             )
     except botocore.exceptions.ClientError as e:
-        logging.error(f"Unable to delete attached policies for user {iam_user}: {e}")
-        exit(1)
+        handle_iam_client_error(
+            client_error=e, message=f"Unable to delete attached policies for user {iam_user}"
+        )
 
 
-def delete_user_from_groups(aws_account, iam_client, iam_user):
+def delete_user_from_groups(aws_account, iam_client, iam_user, user_groups=None):
     try:
-        logging.info(
-            f"Checking for groups associated with {iam_user} in AWS account: {aws_account}"
-        )
-        groups = iam_client.list_groups_for_user(UserName=iam_user)
-        user_groups = groups["Groups"]
+        if user_groups is None:
+            logging.info(
+                f"Checking for groups associated with {iam_user} in AWS account: {aws_account}"
+            )
+            groups = call_iam_api(
+                iam_client=iam_client,
+                operation="list_groups_for_user",
+                UserName=iam_user,
+            )
+            user_groups = groups["Groups"]
         if user_groups:
             for user_group in user_groups:
-                iam_client.remove_user_from_group(
-                    UserName=iam_user, GroupName=user_group["GroupName"]
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation="remove_user_from_group",
+                    UserName=iam_user,
+                    GroupName=user_group["GroupName"],
                 )
             logging.info(
                 f"Removed user {iam_user} from all groups in AWS account {aws_account}"
@@ -255,53 +689,96 @@ def delete_user_from_groups(aws_account, iam_client, iam_user):
                 f"No groups found to be associated with user {iam_user} in AWS account {aws_account}"
             )
     except botocore.exceptions.ClientError as e:
-        logging.error(f"Unable remove user {iam_user} from groups: {e}")
-        exit(1)
+        handle_iam_client_error(
+            client_error=e, message=f"Unable remove user {iam_user} from groups"
+        )
 
 
 def delete_iam_user_account(aws_account, iam_client, iam_user):
     try:
         logging.info(f"Deleting IAM user {iam_user} in AWS account: {aws_account}")
-        iam_client.delete_user(UserName=iam_user)
+        call_iam_api(iam_client=iam_client, operation="delete_user", UserName=iam_user)
         logging.info(f"Deleted IAM user {iam_user} from {aws_account}")
+        return True
     except botocore.exceptions.ClientError as e:
         logging.error(f"Unable remove user {iam_user} from {aws_account}: {e}")
+        return False
 
 
-def delete_iam_user_handler(aws_account, iam_client, iam_user):
-    user_exists = check_if_user_exists(aws_account, iam_client, iam_user)
+def delete_iam_user_dependencies(aws_account, iam_client, iam_user, user_inventory=None):
+    user_inventory = user_inventory or {}
+    delete_iam_login_profile(
+        aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
+    )
+    delete_user_access_keys(
+        aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
+    )
+    delete_user_signing_certificates(
+        aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
+    )
+    delete_user_public_ssh_keys(
+        aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
+    )
+    delete_user_service_specific_credentials(
+        aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
+    )
+    delete_user_policies(
+        aws_account=aws_account,
+        iam_client=iam_client,
+        iam_user=iam_user,
+        user_policies=user_inventory.get("inline_policies"),
+    )
+    delete_user_mfa_device(
+        aws_account=aws_account,
+        iam_client=iam_client,
+        iam_user=iam_user,
+        user_mfa_devices=user_inventory.get("mfa_devices"),
+    )
+    delete_attached_user_policies(
+        aws_account=aws_account,
+        iam_client=iam_client,
+        iam_user=iam_user,
+        user_attached_policies=user_inventory.get("attached_policies"),
+    )
+    delete_user_from_groups(
+        aws_account=aws_account,
+        iam_client=iam_client,
+        iam_user=iam_user,
+        user_groups=user_inventory.get("groups"),
+    )
+
+
+def delete_iam_user_handler(aws_account, iam_client, iam_user, inventory=None):
+    if inventory is None:
+        user_exists = check_if_user_exists(aws_account, iam_client, iam_user)
+        user_inventory = None
+    else:
+        user_inventory = inventory["users"].get(iam_user)
+        user_exists = user_inventory is not None
     if user_exists:
-        delete_iam_login_profile(
-            aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
+        delete_iam_user_dependencies(
+            aws_account=aws_account,
+            iam_client=iam_client,
+            iam_user=iam_user,
+            user_inventory=user_inventory,
         )
-        delete_user_access_keys(
+        user_deleted = delete_iam_user_account(
             aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
         )
-        delete_user_signing_certificates(
-            aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
-        )
-        delete_user_public_ssh_keys(
-            aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
-        )
-        delete_user_service_specific_credentials(
-            aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
-        )
-        delete_user_policies(
-            aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
-        )
-        delete_user_mfa_device(
-            aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
-        )
-        delete_attached_user_policies(
-            aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
-        )
-        delete_user_from_groups(
-            aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
-        )
-        delete_iam_user_account(
-            aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
-        )
-        return True
+        if not user_deleted and user_inventory is not None:
+            logging.info(
+                f"Deleting {iam_user} using the IAM inventory failed, retrying with a full teardown"
+            )
+            delete_iam_user_dependencies(
+                aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
+            )
+            user_deleted = delete_iam_user_account(
+                aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
+            )
+        record_action(action="iam_user_deletion", outcome="deleted" if user_deleted else "failed")
+        return user_deleted
     else:
+        # None rather than False, a missing user is not a failed deletion
         logging.info(f"Could not find user {iam_user} in {aws_account}, continuing")
-        return False
+        record_action(action="iam_user_deletion", outcome="not_found")
+        return None
@@ -0,0 +1,408 @@
+import asyncio
+import botocore.exceptions
+import logging
+import random
+from aws_async_common import aws_async_max_concurrency, create_async_client, gather_with_concurrency
+from iam_common import (
+    add_virtual_mfa_device_to_inventory,
+    classify_client_error,
+    create_empty_user_inventory,
+    create_user_inventory,
+    handle_iam_client_error,
+    iam_max_attempts,
+    iam_max_backoff_seconds,
+    iam_retry_counts,
+    take_iam_token,
+)
+from run_report import record_action
+
+logging.basicConfig(level=logging.INFO)
+
+iam_listed_user_resources = {
+    "access keys": ("list_access_keys", "AccessKeyMetadata", "delete_access_key", "AccessKeyId"),
+    "signing certificates": (
+        "list_signing_certificates",
+        "Certificates",
+        "delete_signing_certificate",
+        "CertificateId",
+    ),
+    "public SSH keys": (
+        "list_ssh_public_keys",
+        "SSHPublicKeys",
+        "delete_ssh_public_key",
+        "SSHPublicKeyId",
+    ),
+    "service specific credentials": (
+        "list_service_specific_credentials",
+        "ServiceSpecificCredentials",
+        "delete_service_specific_credential",
+        "ServiceSpecificCredentialId",
+    ),
+}
+
+
+async def acquire_iam_token(iam_client):
+    wait_seconds = take_iam_token(iam_client=iam_client)
+    while wait_seconds:
+        await asyncio.sleep(wait_seconds)
+        wait_seconds = take_iam_token(iam_client=iam_client)
+
+
+async def call_iam_api(iam_client, operation, **kwargs):
+    for attempt in range(1, iam_max_attempts + 1):
+        await acquire_iam_token(iam_client=iam_client)
+        try:
+            response = await getattr(iam_client, operation)(**kwargs)
+            iam_retry_counts[operation] += response.get("ResponseMetadata", {}).get(
+                "RetryAttempts", 0
+            )
+            return response
+        except botocore.exceptions.ClientError as e:
+            iam_retry_counts[operation] += e.response.get("ResponseMetadata", {}).get(
+                "RetryAttempts", 0
+            )
+            if classify_client_error(client_error=e) != "retryable" or attempt == iam_max_attempts:
+                raise
+            backoff_seconds = random.uniform(0, min(iam_max_backoff_seconds, 2 ** attempt))
+            logging.info(
+                f"IAM {operation} was throttled, retrying in {backoff_seconds:.1f} seconds "
+                f"(attempt {attempt} of {iam_max_attempts})"
+            )
+            iam_retry_counts[operation] += 1
+            await asyncio.sleep(backoff_seconds)
+
+
+async def paginate_iam_api(iam_client, operation, result_key, **kwargs):
+    while True:
+        response = await call_iam_api(iam_client=iam_client, operation=operation, **kwargs)
+        for item in response.get(result_key, []):
+            yield item
+        if not response.get("IsTruncated"):
+            return
+        kwargs["Marker"] = response["Marker"]
+
+
+def create_iam_client(session, credentials=None):
+    return create_async_client(session=session, service_name="iam", credentials=credentials)
+
+
+async def check_if_user_exists(aws_account, iam_client, iam_user):
+    try:
+        await call_iam_api(iam_client=iam_client, operation="get_user", UserName=iam_user)
+        return True
+    except iam_client.exceptions.NoSuchEntityException:
+        logging.debug(f"User {iam_user} does exist in {aws_account}, no action to be taken")
+        return False
+    except botocore.exceptions.ClientError as e:
+        logging.error(f"Unable to check if IAM user {iam_user} exists in {aws_account}: {e}")
+        exit(1)
+
+
+async def build_iam_inventory(aws_account, iam_client):
+    try:
+        users = {}
+        async for user in paginate_iam_api(
+            iam_client=iam_client,
+            operation="get_account_authorization_details",
+            result_key="UserDetailList",
+            Filter=["User"],
+        ):
+            users[user["UserName"]] = create_user_inventory(user_detail=user)
+        async for user in paginate_iam_api(
+            iam_client=iam_client, operation="list_users", result_key="Users"
+        ):
+            users.setdefault(user["UserName"], create_empty_user_inventory())
+        async for virtual_mfa_device in paginate_iam_api(
+            iam_client=iam_client,
+            operation="list_virtual_mfa_devices",
+            result_key="VirtualMFADevices",
+            AssignmentStatus="Assigned",
+        ):
+            add_virtual_mfa_device_to_inventory(users=users, virtual_mfa_device=virtual_mfa_device)
+        logging.info(f"IAM inventory for AWS account {aws_account} contains {len(users)} users")
+        return {"aws_account": aws_account, "users": users}
+    except botocore.exceptions.ClientError as e:
+        logging.error(f"Unable to build IAM inventory for AWS account {aws_account}: {e}")
+        exit(1)
+
+
+async def delete_iam_login_profile(aws_account, iam_client, iam_user):
+    try:
+        await call_iam_api(
+            iam_client=iam_client, operation="delete_login_profile", UserName=iam_user
+        )
+        logging.info(
+            f"IAM login profile {iam_user} has been deleted from AWS account: {aws_account}"
+        )
+    except iam_client.exceptions.NoSuchEntityException:
+        logging.info(
+            f"User {iam_user} does not have a login profile associated with their IAM user, continuing"
+        )
+    except botocore.exceptions.ClientError as e:
+        handle_iam_client_error(
+            client_error=e, message=f"Unable to delete IAM login profile {iam_user}"
+        )
+
+
+async def delete_listed_user_resources(aws_account, iam_client, iam_user, resource_name):
+    list_operation, result_key, delete_operation, id_key = iam_listed_user_resources[resource_name]
+    try:
+        response = await call_iam_api(
+            iam_client=iam_client, operation=list_operation, UserName=iam_user
+        )
+        user_resources = response[result_key]
+        await asyncio.gather(
+            *(
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation=delete_operation,
+                    UserName=iam_user,
+                    **{id_key: user_resource[id_key]},
+                )
+                for user_resource in user_resources
+            )
+        )
+        if user_resources:
+            logging.info(
+                f"Deleted all {resource_name} associated with user {iam_user} in AWS account {aws_account}"
+            )
+        return bool(user_resources)
+    except botocore.exceptions.ClientError as e:
+        handle_iam_client_error(
+            client_error=e, message=f"Unable to delete {resource_name} for user {iam_user}"
+        )
+
+
+async def delete_user_access_keys(aws_account, iam_client, iam_user):
+    return await delete_listed_user_resources(
+        aws_account=aws_account, iam_client=iam_client, iam_user=iam_user, resource_name="access keys"
+    )
+
+
+async def delete_user_signing_certificates(aws_account, iam_client, iam_user):
+    return await delete_listed_user_resources(
+        aws_account=aws_account,
+        iam_client=iam_client,
+        iam_user=iam_user,
+        resource_name="signing certificates",
+    )
+
+
+async def delete_user_public_ssh_keys(aws_account, iam_client, iam_user):
+    return await delete_listed_user_resources(
+        aws_account=aws_account,
+        iam_client=iam_client,
+        iam_user=iam_user,
+        resource_name="public SSH keys",
+    )
+
+
+async def delete_user_service_specific_credentials(aws_account, iam_client, iam_user):
+    return await delete_listed_user_resources(
+        aws_account=aws_account,
+        iam_client=iam_client,
+        iam_user=iam_user,
+        resource_name="service specific credentials",
+    )
+
+
+async def delete_user_mfa_device(aws_account, iam_client, iam_user, user_mfa_devices=None):
+    try:
+        if user_mfa_devices is None:
+            mfa_devices = await call_iam_api(
+                iam_client=iam_client, operation="list_mfa_devices", UserName=iam_user
+            )
+            user_mfa_devices = mfa_devices["MFADevices"]
+        for user_mfa_device in user_mfa_devices:
+            await call_iam_api(
+                iam_client=iam_client,
+                operation="deactivate_mfa_device",
+                UserName=iam_user,
+                SerialNumber=user_mfa_device["SerialNumber"],
+            )
+            await call_iam_api(
+                iam_client=iam_client,
+                operation="delete_virtual_mfa_device",
+                SerialNumber=user_mfa_device["SerialNumber"],
+            )
+    except botocore.exceptions.ClientError as e:
+        handle_iam_client_error(
+            client_error=e, message=f"Unable to delete MFA Devices for user {iam_user}"
+        )
+
+
+async def delete_user_policies(aws_account, iam_client, iam_user, user_policies=None):
+    try:
+        if user_policies is None:
+            policies = await call_iam_api(
+                iam_client=iam_client, operation="list_user_policies", UserName=iam_user
+            )
+            user_policies = policies["PolicyNames"]
+        await asyncio.gather(
+            *(
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation="delete_user_policy",
+                    UserName=iam_user,
+                    PolicyName=user_policy,
+                )
+                for user_policy in user_policies
+            )
+        )
+    except botocore.exceptions.ClientError as e:
+        handle_iam_client_error(
+            client_error=e, message=f"Unable to delete policies for user {iam_user}"
+        )
+
+
+async def delete_attached_user_policies(
+    aws_account, iam_client, iam_user, user_attached_policies=None
+):
+    try:
+        if user_attached_policies is None:
+            attached_policies = await call_iam_api(
+                iam_client=iam_client, operation="list_attached_user_policies", UserName=iam_user
+            )
+            user_attached_policies = attached_policies["AttachedPolicies"]
+        await asyncio.gather(
+            *(
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation="detach_user_policy",
+                    UserName=iam_user,
+                    PolicyArn=user_attached_policy["PolicyArn"],
+                )
+                for user_attached_policy in user_attached_policies
+            )
+        )
+    except botocore.exceptions.ClientError as e:
+        handle_iam_client_error(
+            client_error=e, message=f"Unable to delete attached policies for user {iam_user}"
+        )
+
+
+async def delete_user_from_groups(aws_account, iam_client, iam_user, user_groups=None):
+    try:
+        if user_groups is None:
+            groups = await call_iam_api(
+                iam_client=iam_client, operation="list_groups_for_user", UserName=iam_user
+            )
+            user_groups = groups["Groups"]
+        await asyncio.gather(
+            *(
+                call_iam_api(
+                    iam_client=iam_client,
+                    operation="remove_user_from_group",
+                    UserName=iam_user,
+                    GroupName=user_group["GroupName"],
+                )
+                for user_group in user_groups
+            )
+        )
+    except botocore.exceptions.ClientError as e:
+        handle_iam_client_error(
+            client_error=e, message=f"Unable remove user {iam_user} from groups"
+        )
+
+
+async def delete_iam_user_account(aws_account, iam_client, iam_user):
+    try:
+        await call_iam_api(iam_client=iam_client, operation="delete_user", UserName=iam_user)
+        logging.info(f"Deleted IAM user {iam_user} from {aws_account}")
+        return True
+    except botocore.exceptions.ClientError as e:
+        logging.error(f"Unable remove user {iam_user} from {aws_account}: {e}")
+        return False
+
+
+async def delete_iam_user_dependencies(aws_account, iam_client, iam_user, user_inventory=None):
+    user_inventory = user_inventory or {}
+    await asyncio.gather(
+        delete_iam_login_profile(aws_account=aws_account, iam_client=iam_client, iam_user=iam_user),
+        delete_user_access_keys(aws_account=aws_account, iam_client=iam_client, iam_user=iam_user),
+        delete_user_signing_certificates(
+            aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
+        ),
+        delete_user_public_ssh_keys(
+            aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
+        ),
+        delete_user_service_specific_credentials(
+            aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
+        ),
+        delete_user_policies(
+            aws_account=aws_account,
+            iam_client=iam_client,
+            iam_user=iam_user,
+            user_policies=user_inventory.get("inline_policies"),
+        ),
+        delete_user_mfa_device(
+            aws_account=aws_account,
+            iam_client=iam_client,
+            iam_user=iam_user,
+            user_mfa_devices=user_inventory.get("mfa_devices"),
+        ),
+        delete_attached_user_policies(
+            aws_account=aws_account,
+            iam_client=iam_client,
+            iam_user=iam_user,
+            user_attached_policies=user_inventory.get("attached_policies"),
+        ),
+        delete_user_from_groups(
+            aws_account=aws_account,
+            iam_client=iam_client,
+            iam_user=iam_user,
+            user_groups=user_inventory.get("groups"),
+        ),
+    )
+
+
+async def delete_iam_user_handler(aws_account, iam_client, iam_user, inventory=None):
+    if inventory is None:
+        user_exists = await check_if_user_exists(aws_account, iam_client, iam_user)
+        user_inventory = None
+    else:
+        user_inventory = inventory["users"].get(iam_user)
+        user_exists = user_inventory is not None
+    if not user_exists:
+        # None rather than False, a missing user is not a failed deletion
+        logging.info(f"Could not find user {iam_user} in {aws_account}, continuing")
+        record_action(action="iam_user_deletion", outcome="not_found")
+        return None
+    await delete_iam_user_dependencies(
+        aws_account=aws_account,
+        iam_client=iam_client,
+        iam_user=iam_user,
+        user_inventory=user_inventory,
+    )
+    user_deleted = await delete_iam_user_account(
+        aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
+    )
+    if not user_deleted and user_inventory is not None:
+        logging.info(
+            f"Deleting {iam_user} using the IAM inventory failed, retrying with a full teardown"
+        )
+        await delete_iam_user_dependencies(
+            aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
+        )
+        user_deleted = await delete_iam_user_account(
+            aws_account=aws_account, iam_client=iam_client, iam_user=iam_user
+        )
+    record_action(action="iam_user_deletion", outcome="deleted" if user_deleted else "failed")
+    return user_deleted
+
+
+async def delete_iam_users(
+    aws_account, iam_client, iam_users, inventory=None, max_concurrency=aws_async_max_concurrency
+):
+    return await gather_with_concurrency(
+        (
+            delete_iam_user_handler(
+                aws_account=aws_account,
+                iam_client=iam_client,
+                iam_user=iam_user,
+                inventory=inventory,
+            )
+            for iam_user in iam_users
+        ),
+        max_concurrency=max_concurrency,
+    )
@@ -1,6 +1,15 @@
 import argparse
 import logging
-from notifications_python_client.notifications import NotificationsAPIClient
+from escalation_policy import (
+    check_tier_already_notified,
+    compile_escalation_policy,
+    create_default_escalation_policy,
+    get_escalation_tier,
+    get_state_key,
+    read_state_file,
+    update_state_file,
+)
+from notify_common import create_notification, dispatch_notifications
 
 logging.basicConfig(level=logging.INFO)
 
@@ -8,6 +17,14 @@ logging.basicConfig(level=logging.INFO)
 def parse_arguments():
     description = "Arguments to manage stale IAM users"
     parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--access-key-grace-period-days",
+        help="The number of days an access key stays deactivated before it is deleted (defaults to 14)",
+        dest="access_key_grace_period_days",
+        type=int,
+        default=14,
+        required=False,
+    )
     parser.add_argument(
         "--account-id",
         help="The name of the relevant user account ID",
@@ -26,12 +43,34 @@ def parse_arguments():
         dest="days_inactive",
         required=True,
     )
+    parser.add_argument(
+        "--deactivation-template-id",
+        help="The ID of the template to use when access keys are deactivated (defaults to --template-id)",
+        dest="deactivation_template_id",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--deletion-template-id",
+        help="The ID of the template to use when access keys are deleted (defaults to --template-id)",
+        dest="deletion_template_id",
+        default=None,
+        required=False,
+    )
     parser.add_argument(
         "--deletion-threshold",
         help="The threshold at which a user should be deleted",
         dest="deletion_threshold",
         required=True,
     )
+    parser.add_argument(
+        "--escalation-policy",
+        help="Comma separated list of <days>:<action> tiers, e.g. 60:warning,75:warning,85:warning,90:deletion. "
+        "Defaults to a warning tier at the warning threshold and a deletion tier at the deletion threshold",
+        dest="escalation_policy",
+        default=None,
+        required=False,
+    )
     parser.add_argument(
         "--ignore-list",
         help="Comma separated containing IAM users to ignore/exclude when filtering through stale users",
@@ -39,6 +78,22 @@ def parse_arguments():
         default="",
         required=False,
     )
+    parser.add_argument(
+        "--notification-spool",
+        help="The name of a file to append the notification to instead of sending it, so that it can be sent as "
+        "part of a digest by send_notification_digests.py",
+        dest="notification_spool",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--state-file",
+        help="The name of a JSON file recording the escalation tier each user has been notified at, so that each "
+        "tier is only notified once",
+        dest="state_file",
+        default=None,
+        required=False,
+    )
     parser.add_argument(
         "--template-id",
         help="The ID of the template to use in order to send emails via Gov UK Notify",
@@ -61,20 +116,34 @@ def parse_arguments():
 
 
 def get_args(args=parse_arguments()):
+    access_key_grace_period_days = args.access_key_grace_period_days
     account_id = args.account_id
     api_key = args.api_key
     days_inactive = args.days_inactive
+    deactivation_template_id = args.deactivation_template_id or args.template_id
+    deletion_template_id = args.deletion_template_id or args.template_id
     deletion_threshold = args.deletion_threshold
+    escalation_policy = args.escalation_policy or create_default_escalation_policy(
+        warning_threshold=args.warning_threshold, deletion_threshold=deletion_threshold
+    )
     ignore_list = args.ignore_list
+    notification_spool = args.notification_spool
+    state_file = args.state_file
     template_id = args.template_id
     username = args.username
     warning_threshold = args.warning_threshold
     return (
+        access_key_grace_period_days,
         account_id,
         api_key,
         days_inactive,
+        deactivation_template_id,
+        deletion_template_id,
         deletion_threshold,
+        escalation_policy,
         ignore_list,
+        notification_spool,
+        state_file,
         template_id,
         username,
         warning_threshold,
@@ -104,27 +173,6 @@ def check_if_user_breaches_threshold(iam_username, number_of_inactive_days, thre
     return action_to_be_taken
 
 
-def send_email_via_notify(
-    api_key,
-    aws_account,
-    email_address,
-    inactive_number_of_days,
-    max_number_of_days,
-    template_id,
-):
-    notifications_client = NotificationsAPIClient(api_key)
-    notifications_client.send_email_notification(
-        email_address=email_address,
-        template_id=template_id,
-        personalisation={
-            "aws_account": aws_account,
-            "iam_user": email_address,
-            "inactive_number_of_days": inactive_number_of_days,
-            "max_number_of_days": max_number_of_days,
-        },
-    )
-
-
 def check_iam_user_has_email_address(iam_user):
     if "@" in iam_user:
         return True
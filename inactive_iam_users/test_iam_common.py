@@ -0,0 +1,249 @@
+from iam_common import (
+    build_iam_inventory, call_iam_api, classify_client_error, delete_iam_user_handler,
+    delete_user_access_keys, iam_requests_per_second, iam_retry_counts, manage_account_access_keys,
+    take_iam_token
+)
+
+import boto3
+import botocore.exceptions
+import datetime
+import pytest
+from botocore.stub import ANY, Stubber
+
+
+@pytest.fixture
+def iam_client(monkeypatch):
+    monkeypatch.setattr("time.sleep", lambda seconds: None)
+    iam_client = boto3.client(
+        "iam",
+        region_name="eu-west-2",
+        aws_access_key_id="testing",
+        aws_secret_access_key="testing",
+    )
+    with Stubber(iam_client) as stubber:
+        yield iam_client, stubber
+
+
+def create_client_error(error_code: str):
+    return botocore.exceptions.ClientError(
+        {"Error": {"Code": error_code, "Message": error_code}}, "DeleteUser"
+    )
+
+
+def test_classify_client_error():
+    assert classify_client_error(create_client_error("Throttling")) == "retryable"
+    assert classify_client_error(create_client_error("LimitExceeded")) == "retryable"
+    assert classify_client_error(create_client_error("DeleteConflict")) == "conflict"
+    assert classify_client_error(create_client_error("AccessDenied")) == "fatal"
+
+
+def test_call_iam_api_retries_throttling(iam_client):
+    iam_client, stubber = iam_client
+    stubber.add_client_error("get_user", service_error_code="Throttling")
+    stubber.add_response(
+        "get_user",
+        {"User": {
+            "Path": "/", "UserName": "user", "UserId": "AIDAEXAMPLEUSERID1",
+            "Arn": "arn:aws:iam::123456789012:user/user", "CreateDate": "2023-01-01T00:00:00Z"
+        }},
+    )
+    retries_before = iam_retry_counts["get_user"]
+
+    response = call_iam_api(iam_client=iam_client, operation="get_user", UserName="user")
+
+    assert response["User"]["UserName"] == "user"
+    assert iam_retry_counts["get_user"] == retries_before + 1
+
+
+def test_take_iam_token_limits_each_client_separately():
+    first_iam_client, second_iam_client = [
+        boto3.client(
+            "iam",
+            region_name="eu-west-2",
+            aws_access_key_id="testing",
+            aws_secret_access_key="testing",
+        )
+        for _ in range(2)
+    ]
+
+    for _ in range(iam_requests_per_second):
+        assert take_iam_token(iam_client=first_iam_client) == 0
+
+    assert take_iam_token(iam_client=first_iam_client) > 0
+    assert take_iam_token(iam_client=second_iam_client) == 0
+
+
+def test_call_iam_api_does_not_retry_fatal_errors(iam_client):
+    iam_client, stubber = iam_client
+    stubber.add_client_error("get_user", service_error_code="AccessDenied")
+
+    with pytest.raises(botocore.exceptions.ClientError):
+        call_iam_api(iam_client=iam_client, operation="get_user", UserName="user")
+
+
+def test_delete_user_access_keys_continues_on_conflict(iam_client):
+    iam_client, stubber = iam_client
+    stubber.add_client_error("list_access_keys", service_error_code="NoSuchEntity")
+
+    assert delete_user_access_keys(
+        aws_account="123456789012", iam_client=iam_client, iam_user="user"
+    ) is None
+
+
+def test_delete_user_access_keys_exits_on_fatal_error(iam_client):
+    iam_client, stubber = iam_client
+    stubber.add_client_error("list_access_keys", service_error_code="AccessDenied")
+
+    with pytest.raises(SystemExit):
+        delete_user_access_keys(
+            aws_account="123456789012", iam_client=iam_client, iam_user="user"
+        )
+
+
+def add_list_access_keys_response(stubber, access_keys):
+    stubber.add_response(
+        "list_access_keys",
+        {"AccessKeyMetadata": [
+            {"UserName": "user", "AccessKeyId": access_key_id, "Status": status,
+             "CreateDate": datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)}
+            for access_key_id, status, _ in access_keys
+        ]},
+        {"UserName": "user"},
+    )
+
+
+def add_access_key_last_used_response(stubber, access_key_id, last_used_date):
+    stubber.add_response(
+        "get_access_key_last_used",
+        {"UserName": "user", "AccessKeyLastUsed": {
+            "LastUsedDate": last_used_date, "ServiceName": "s3", "Region": "eu-west-2"
+        }},
+        {"AccessKeyId": access_key_id},
+    )
+
+
+def create_deactivation_tag(access_key_id, deactivation_time):
+    return {
+        "Key": f"ccs-user-management:access-key-deactivated:{access_key_id}",
+        "Value": deactivation_time.isoformat(),
+    }
+
+
+def test_manage_account_access_keys_deletes_after_the_grace_period_since_deactivation(iam_client):
+    iam_client, stubber = iam_client
+    reference_time = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    access_keys = [
+        ("AKIAEXAMPLEACTIVE01", "Active", reference_time - datetime.timedelta(days=95)),
+        ("AKIAEXAMPLERECENT01", "Active", reference_time - datetime.timedelta(days=3)),
+        ("AKIAEXAMPLEGRACE001", "Inactive", reference_time - datetime.timedelta(days=200)),
+        ("AKIAEXAMPLEEXPIRED1", "Inactive", reference_time - datetime.timedelta(days=110)),
+        ("AKIAEXAMPLEMANUAL01", "Inactive", reference_time - datetime.timedelta(days=400)),
+    ]
+    add_list_access_keys_response(stubber, access_keys)
+    for access_key_id, _, last_used_date in access_keys[:3]:
+        add_access_key_last_used_response(stubber, access_key_id, last_used_date)
+    stubber.add_response(
+        "list_user_tags",
+        {"Tags": [
+            create_deactivation_tag("AKIAEXAMPLEGRACE001", reference_time - datetime.timedelta(days=5)),
+            create_deactivation_tag("AKIAEXAMPLEEXPIRED1", reference_time - datetime.timedelta(days=20)),
+            {"Key": "team", "Value": "platform"},
+        ]},
+        {"UserName": "user"},
+    )
+    for access_key_id, _, last_used_date in access_keys[3:]:
+        add_access_key_last_used_response(stubber, access_key_id, last_used_date)
+    stubber.add_response(
+        "tag_user",
+        {},
+        {"UserName": "user", "Tags": [create_deactivation_tag("AKIAEXAMPLEMANUAL01", reference_time)]},
+    )
+    stubber.add_response(
+        "update_access_key",
+        {},
+        {"UserName": "user", "AccessKeyId": "AKIAEXAMPLEACTIVE01", "Status": "Inactive"},
+    )
+    stubber.add_response("tag_user", {}, {"UserName": "user", "Tags": ANY})
+    stubber.add_response(
+        "delete_access_key", {}, {"UserName": "user", "AccessKeyId": "AKIAEXAMPLEEXPIRED1"}
+    )
+    stubber.add_response(
+        "untag_user",
+        {},
+        {"UserName": "user", "TagKeys": ["ccs-user-management:access-key-deactivated:AKIAEXAMPLEEXPIRED1"]},
+    )
+
+    access_key_actions_by_user = manage_account_access_keys(
+        aws_account="123456789012",
+        iam_client=iam_client,
+        iam_users=["user"],
+        deactivation_threshold=90,
+        grace_period_days=14,
+        reference_time=reference_time,
+    )
+
+    assert [
+        (access_key_action["access_key_id"], access_key_action["action"])
+        for access_key_action in access_key_actions_by_user["user"]
+    ] == [("AKIAEXAMPLEACTIVE01", "deactivate"), ("AKIAEXAMPLEEXPIRED1", "delete")]
+    stubber.assert_no_pending_responses()
+
+
+def test_delete_iam_user_handler_with_inventory_skips_indexed_list_calls(iam_client):
+    iam_client, stubber = iam_client
+    stubber.add_response(
+        "get_account_authorization_details",
+        {"UserDetailList": [{
+            "UserName": "user", "GroupList": ["developers"],
+            "UserPolicyList": [{"PolicyName": "inline"}],
+            "AttachedManagedPolicies": [{"PolicyName": "managed", "PolicyArn": "arn:aws:iam::aws:policy/managed"}],
+        }], "IsTruncated": True, "Marker": "page-2"},
+        {"Filter": ["User"]},
+    )
+    stubber.add_response(
+        "get_account_authorization_details",
+        {"UserDetailList": [], "IsTruncated": False},
+        {"Filter": ["User"], "Marker": "page-2"},
+    )
+    stubber.add_response("list_users", {"Users": [], "IsTruncated": False}, {})
+    stubber.add_response(
+        "list_virtual_mfa_devices",
+        {"VirtualMFADevices": [{"SerialNumber": "arn:aws:iam::123456789012:mfa/user", "User": {
+            "Path": "/", "UserName": "user", "UserId": "AIDAEXAMPLEUSERID1",
+            "Arn": "arn:aws:iam::123456789012:user/user", "CreateDate": "2023-01-01T00:00:00Z"
+        }}], "IsTruncated": False},
+        {"AssignmentStatus": "Assigned"},
+    )
+    inventory = build_iam_inventory(aws_account="123456789012", iam_client=iam_client)
+    stubber.add_response("delete_login_profile", {}, {"UserName": "user"})
+    for operation, result_key in (
+        ("list_access_keys", "AccessKeyMetadata"),
+        ("list_signing_certificates", "Certificates"),
+        ("list_ssh_public_keys", "SSHPublicKeys"),
+        ("list_service_specific_credentials", "ServiceSpecificCredentials"),
+    ):
+        stubber.add_response(operation, {result_key: []}, {"UserName": "user"})
+    stubber.add_response("delete_user_policy", {}, {"UserName": "user", "PolicyName": "inline"})
+    stubber.add_response(
+        "deactivate_mfa_device", {},
+        {"UserName": "user", "SerialNumber": "arn:aws:iam::123456789012:mfa/user"},
+    )
+    stubber.add_response(
+        "delete_virtual_mfa_device", {}, {"SerialNumber": "arn:aws:iam::123456789012:mfa/user"}
+    )
+    stubber.add_response(
+        "detach_user_policy", {},
+        {"UserName": "user", "PolicyArn": "arn:aws:iam::aws:policy/managed"},
+    )
+    stubber.add_response(
+        "remove_user_from_group", {}, {"UserName": "user", "GroupName": "developers"}
+    )
+    stubber.add_response("delete_user", {}, {"UserName": "user"})
+
+    assert delete_iam_user_handler(
+        aws_account="123456789012", iam_client=iam_client, iam_user="user", inventory=inventory
+    )
+    assert delete_iam_user_handler(
+        aws_account="123456789012", iam_client=iam_client, iam_user="missing", inventory=inventory
+    ) is None
+    stubber.assert_no_pending_responses()
@@ -0,0 +1,119 @@
+from iam_common_async import call_iam_api, create_iam_client, delete_iam_users
+from iam_common import iam_retry_counts
+
+import asyncio
+import botocore.exceptions
+import pytest
+from aws_async_common import create_async_session
+from botocore.stub import Stubber
+
+
+async def no_sleep(seconds):
+    return None
+
+
+def run_with_stubbed_iam_client(monkeypatch, add_responses, coroutine_function):
+    monkeypatch.setattr("asyncio.sleep", no_sleep)
+
+    async def run():
+        async with create_iam_client(
+            session=create_async_session(),
+            credentials={"AccessKeyId": "testing", "SecretAccessKey": "testing"},
+        ) as iam_client:
+            with Stubber(iam_client) as stubber:
+                add_responses(stubber)
+                result = await coroutine_function(iam_client)
+                stubber.assert_no_pending_responses()
+                return result
+
+    return asyncio.run(run())
+
+
+def test_call_iam_api_retries_throttling(monkeypatch):
+    def add_responses(stubber):
+        stubber.add_client_error("get_user", service_error_code="Throttling")
+        stubber.add_response(
+            "get_user",
+            {"User": {
+                "Path": "/", "UserName": "user", "UserId": "AIDAEXAMPLEUSERID1",
+                "Arn": "arn:aws:iam::123456789012:user/user", "CreateDate": "2023-01-01T00:00:00Z"
+            }},
+        )
+    retries_before = iam_retry_counts["get_user"]
+
+    response = run_with_stubbed_iam_client(
+        monkeypatch,
+        add_responses,
+        lambda iam_client: call_iam_api(iam_client=iam_client, operation="get_user", UserName="user"),
+    )
+
+    assert response["User"]["UserName"] == "user"
+    assert iam_retry_counts["get_user"] == retries_before + 1
+
+
+def test_call_iam_api_does_not_retry_fatal_errors(monkeypatch):
+    with pytest.raises(botocore.exceptions.ClientError):
+        run_with_stubbed_iam_client(
+            monkeypatch,
+            lambda stubber: stubber.add_client_error("get_user", service_error_code="AccessDenied"),
+            lambda iam_client: call_iam_api(
+                iam_client=iam_client, operation="get_user", UserName="user"
+            ),
+        )
+
+
+def test_delete_iam_users_with_inventory(monkeypatch):
+    inventory = {"aws_account": "123456789012", "users": {
+        iam_user: {
+            "groups": [{"GroupName": "developers"}], "inline_policies": [],
+            "attached_policies": [], "mfa_devices": [],
+        }
+        for iam_user in ("user", "undeletable")
+    }}
+
+    def add_inventory_responses(stubber, iam_user):
+        stubber.add_response("delete_login_profile", {}, {"UserName": iam_user})
+        for operation, result_key in (
+            ("list_access_keys", "AccessKeyMetadata"),
+            ("list_signing_certificates", "Certificates"),
+            ("list_ssh_public_keys", "SSHPublicKeys"),
+            ("list_service_specific_credentials", "ServiceSpecificCredentials"),
+        ):
+            stubber.add_response(operation, {result_key: []}, {"UserName": iam_user})
+        stubber.add_response(
+            "remove_user_from_group", {}, {"UserName": iam_user, "GroupName": "developers"}
+        )
+
+    def add_responses(stubber):
+        add_inventory_responses(stubber, "user")
+        stubber.add_response("delete_user", {}, {"UserName": "user"})
+        add_inventory_responses(stubber, "undeletable")
+        stubber.add_client_error("delete_user", service_error_code="AccessDenied")
+        # The full teardown retry lists every resource before deleting the user again
+        stubber.add_response("delete_login_profile", {}, {"UserName": "undeletable"})
+        for operation, result_key in (
+            ("list_access_keys", "AccessKeyMetadata"),
+            ("list_signing_certificates", "Certificates"),
+            ("list_ssh_public_keys", "SSHPublicKeys"),
+            ("list_service_specific_credentials", "ServiceSpecificCredentials"),
+            ("list_user_policies", "PolicyNames"),
+            ("list_mfa_devices", "MFADevices"),
+            ("list_attached_user_policies", "AttachedPolicies"),
+            ("list_groups_for_user", "Groups"),
+        ):
+            stubber.add_response(operation, {result_key: []}, {"UserName": "undeletable"})
+        stubber.add_client_error("delete_user", service_error_code="AccessDenied")
+
+    results = run_with_stubbed_iam_client(
+        monkeypatch,
+        add_responses,
+        lambda iam_client: delete_iam_users(
+            aws_account="123456789012",
+            iam_client=iam_client,
+            iam_users=["user", "undeletable", "missing"],
+            inventory=inventory,
+            max_concurrency=1,
+        ),
+    )
+
+    assert results == [True, False, None]
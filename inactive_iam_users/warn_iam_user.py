@@ -1,32 +1,48 @@
 import logging
 from inactive_users_common import *
+from run_report import run_with_report
 
 logging.basicConfig(level=logging.INFO)
 
 
-def check_if_user_in_warning_threshold(
-    days_inactive, deletion_threshold, username, warning_threshold
-):
-    if int(warning_threshold) <= int(days_inactive) < int(deletion_threshold):
+def get_user_escalation_tier(days_inactive, escalation_policy, username):
+    tier, action_to_be_taken = get_escalation_tier(
+        compiled_escalation_policy=compile_escalation_policy(
+            escalation_policy=escalation_policy
+        ),
+        number_of_inactive_days=int(days_inactive),
+    )
+    if action_to_be_taken == "warning":
         logging.info(
-            f"{username} has been inactive for {days_inactive} days and should be warned"
+            f"{username} has been inactive for {days_inactive} days and should be warned at the {tier} day tier"
         )
-        action_to_be_taken = True
     else:
         logging.info(
-            f"{username} has been in active for {days_inactive} days, which is not within the warning threshold of {warning_threshold} to under {deletion_threshold} days"
+            f"{username} has been in active for {days_inactive} days, which is not within a warning tier of {escalation_policy}"
         )
-        action_to_be_taken = False
-    return action_to_be_taken
+    return tier, action_to_be_taken
+
+
+def write_warned_tier(state_file, state_key, warned_tier):
+    if warned_tier is None:
+        update_state_file(state_file=state_file, state={}, removed_state_keys=[state_key])
+    else:
+        update_state_file(state_file=state_file, state={state_key: warned_tier})
 
 
 def warn_iam_user():
     (
+        access_key_grace_period_days,
         account_id,
         api_key,
         days_inactive,
+        deactivation_template_id,
+        deletion_template_id,
         deletion_threshold,
+        escalation_policy,
         ignore_list,
+        notification_spool,
+        state_file,
         template_id,
         username,
         warning_threshold,
@@ -36,34 +52,57 @@ def warn_iam_user():
     )
     if user_in_ignore_list:
         logging.info(f"User {username} is in the ignore list, so no action to be taken")
-    else:
-        user_in_warning_threshold = check_if_user_in_warning_threshold(
-            days_inactive=days_inactive,
-            deletion_threshold=deletion_threshold,
-            username=username,
-            warning_threshold=warning_threshold,
+        return
+    tier, action_to_be_taken = get_user_escalation_tier(
+        days_inactive=days_inactive,
+        escalation_policy=escalation_policy,
+        username=username,
+    )
+    state_key = get_state_key(account_id=account_id, iam_username=username)
+    previous_tier = read_state_file(state_file=state_file).get(state_key) if state_file else None
+    warned_tier = previous_tier
+    if previous_tier is not None and (tier is None or tier < previous_tier):
+        logging.info(
+            f"{username} has fallen below the {previous_tier} day tier on {account_id}, clearing their state"
         )
-        if user_in_warning_threshold:
-            user_has_email_address = check_iam_user_has_email_address(iam_user=username)
-            if user_has_email_address:
-                logging.info(
-                    f"Sending email notification to {username} regarding inactivity on {account_id}"
-                )
-                send_email_via_notify(
-                    api_key=api_key,
-                    aws_account=account_id,
-                    email_address=username,
-                    inactive_number_of_days=days_inactive,
-                    max_number_of_days=deletion_threshold,
-                    template_id=template_id,
-                )
+        warned_tier = tier
+    if action_to_be_taken == "warning" and check_tier_already_notified(
+        previous_tier=warned_tier, tier=tier
+    ):
+        logging.info(
+            f"{username} has already been warned at the {tier} day tier on {account_id}, no email to be sent"
+        )
+    elif action_to_be_taken == "warning":
+        user_has_email_address = check_iam_user_has_email_address(iam_user=username)
+        if user_has_email_address:
+            logging.info(
+                f"Sending email notification to {username} regarding inactivity on {account_id}"
+            )
+            dispatch_notifications(
+                api_key=api_key,
+                notifications=[
+                    create_notification(
+                        notification_type="iam_inactivity_warning",
+                        email_address=username,
+                        template_id=template_id,
+                        aws_account=account_id,
+                        inactive_number_of_days=days_inactive,
+                        max_number_of_days=deletion_threshold,
+                    )
+                ],
+                notification_spool=notification_spool,
+            )
+            if not notification_spool:
                 logging.info(
                     f"Email sent to {username} regarding inactivity on {account_id}"
                 )
-            else:
-                logging.info(
-                    f"{username} does not appear to be in an email address format, no email to be sent"
-                )
+            warned_tier = tier
+        else:
+            logging.info(
+                f"{username} does not appear to be in an email address format, no email to be sent"
+            )
+    if state_file and warned_tier != previous_tier:
+        write_warned_tier(state_file=state_file, state_key=state_key, warned_tier=warned_tier)
 
 
-warn_iam_user()
+run_with_report(flow="warn_iam_user", function=warn_iam_user)
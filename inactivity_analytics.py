@@ -0,0 +1,246 @@
+import argparse
+import datetime
+import json
+import logging
+import os
+from report_parsing import parse_inactive_days_column
+
+logging.basicConfig(level=logging.INFO)
+
+analytics_partition_columns = ["report_date", "account_id"]
+analytics_queries = ("crossed-threshold", "clean-accounts", "trend")
+
+
+def parse_arguments():
+    description = "Arguments to query the inactivity analytics store written by stale_iam_users.py"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--analytics-store",
+        help="The directory containing the inactivity analytics store",
+        dest="analytics_store",
+        required=True,
+    )
+    parser.add_argument(
+        "--query",
+        help="The query to run: crossed-threshold, clean-accounts or trend",
+        dest="query",
+        choices=analytics_queries,
+        required=True,
+    )
+    parser.add_argument(
+        "--threshold",
+        help="The number of inactive days to query against (defaults to 80)",
+        dest="threshold",
+        type=int,
+        default=80,
+        required=False,
+    )
+    parser.add_argument(
+        "--start-date",
+        help="The first report date to include in the query, in YYYY-MM-DD format (defaults to 7 days ago)",
+        dest="start_date",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--end-date",
+        help="The last report date to include in the query, in YYYY-MM-DD format (defaults to today)",
+        dest="end_date",
+        default=None,
+        required=False,
+    )
+    return parser.parse_args()
+
+
+def get_args(args):
+    analytics_store = args.analytics_store
+    query = args.query
+    threshold = args.threshold
+    end_date = args.end_date or datetime.date.today().isoformat()
+    start_date = args.start_date or (
+        datetime.date.fromisoformat(end_date) - datetime.timedelta(days=7)
+    ).isoformat()
+    return analytics_store, query, threshold, start_date, end_date
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.csv
+        import pyarrow.dataset
+    except ImportError:
+        logging.error("pyarrow is not installed, unable to use the inactivity analytics store")
+        exit(1)
+    return pyarrow
+
+
+def get_analytics_partitioning(pyarrow):
+    return pyarrow.dataset.partitioning(
+        pyarrow.schema(
+            [("report_date", pyarrow.string()), ("account_id", pyarrow.string())]
+        ),
+        flavor="hive",
+    )
+
+
+def read_inactivity_report(csv_filename, report_date):
+    pyarrow = import_pyarrow()
+    inactivity_report = pyarrow.csv.read_csv(
+        csv_filename,
+        read_options=pyarrow.csv.ReadOptions(
+            column_names=["account_id", "iam_username", "inactivity_in_days"],
+            skip_rows=1,
+        ),
+        convert_options=pyarrow.csv.ConvertOptions(
+            column_types={
+                "account_id": pyarrow.string(),
+                "iam_username": pyarrow.string(),
+                "inactivity_in_days": pyarrow.string(),
+            }
+        ),
+    )
+    inactive_number_of_days = pyarrow.array(
+        parse_inactive_days_column(
+            inactivity_values=inactivity_report["inactivity_in_days"].to_pylist(),
+            reference_time=datetime.datetime.combine(
+                datetime.date.fromisoformat(report_date),
+                datetime.time.max,
+                tzinfo=datetime.timezone.utc,
+            ),
+        ),
+        pyarrow.int32(),
+    )
+    return pyarrow.table(
+        {
+            "report_date": pyarrow.array(
+                [report_date] * inactivity_report.num_rows, pyarrow.string()
+            ),
+            "account_id": inactivity_report["account_id"],
+            "iam_username": inactivity_report["iam_username"],
+            "inactive_number_of_days": inactive_number_of_days,
+        }
+    )
+
+
+def append_inactivity_report(analytics_store, csv_filename, report_date=None):
+    pyarrow = import_pyarrow()
+    report_date = report_date or datetime.date.today().isoformat()
+    inactivity_report = read_inactivity_report(
+        csv_filename=csv_filename, report_date=report_date
+    )
+    pyarrow.dataset.write_dataset(
+        inactivity_report,
+        analytics_store,
+        format="parquet",
+        partitioning=get_analytics_partitioning(pyarrow=pyarrow),
+        basename_template="report-{i}.parquet",
+        existing_data_behavior="delete_matching",
+    )
+    logging.info(
+        f"Appended {inactivity_report.num_rows} users from {csv_filename} to the analytics store "
+        f"{analytics_store} for {report_date}"
+    )
+    return inactivity_report.num_rows
+
+
+def read_analytics_store(analytics_store, start_date, end_date):
+    pyarrow = import_pyarrow()
+    if not os.path.isdir(analytics_store):
+        logging.error(f"The analytics store {analytics_store} does not exist")
+        exit(1)
+    inactivity_dataset = pyarrow.dataset.dataset(
+        analytics_store,
+        format="parquet",
+        partitioning=get_analytics_partitioning(pyarrow=pyarrow),
+    )
+    report_date = pyarrow.dataset.field("report_date")
+    return inactivity_dataset.to_table(
+        filter=(report_date >= start_date) & (report_date <= end_date)
+    )
+
+
+def get_users_crossing_threshold(analytics_store, threshold, start_date, end_date):
+    inactivity = read_analytics_store(
+        analytics_store=analytics_store, start_date=start_date, end_date=end_date
+    )
+    pyarrow = import_pyarrow()
+    # Ordered grouping keeps each user's earliest and latest report, so a user who became active again is
+    # not reported as crossing the threshold
+    inactivity_range = (
+        inactivity.sort_by("report_date")
+        .group_by(["account_id", "iam_username"], use_threads=False)
+        .aggregate([("inactive_number_of_days", "first"), ("inactive_number_of_days", "last")])
+    )
+    crossed_threshold = pyarrow.compute.and_(
+        pyarrow.compute.less(inactivity_range["inactive_number_of_days_first"], threshold),
+        pyarrow.compute.greater_equal(
+            inactivity_range["inactive_number_of_days_last"], threshold
+        ),
+    )
+    return inactivity_range.filter(crossed_threshold).select(["account_id", "iam_username"]).to_pylist()
+
+
+def get_clean_accounts(analytics_store, threshold, report_date):
+    inactivity = read_analytics_store(
+        analytics_store=analytics_store, start_date=report_date, end_date=report_date
+    )
+    pyarrow = import_pyarrow()
+    account_inactivity = inactivity.group_by("account_id").aggregate(
+        [("inactive_number_of_days", "max")]
+    )
+    clean_accounts = account_inactivity.filter(
+        pyarrow.compute.less(account_inactivity["inactive_number_of_days_max"], threshold)
+    )
+    return sorted(clean_accounts["account_id"].to_pylist())
+
+
+def get_inactivity_trend(analytics_store, threshold, start_date, end_date):
+    inactivity = read_analytics_store(
+        analytics_store=analytics_store, start_date=start_date, end_date=end_date
+    )
+    pyarrow = import_pyarrow()
+    over_threshold = inactivity.filter(
+        pyarrow.compute.greater_equal(inactivity["inactive_number_of_days"], threshold)
+    )
+    trend = over_threshold.group_by("report_date").aggregate([("iam_username", "count")])
+    return {
+        row["report_date"]: row["iam_username_count"]
+        for row in trend.sort_by("report_date").to_pylist()
+    }
+
+
+def inactivity_analytics():
+    analytics_store, query, threshold, start_date, end_date = get_args(
+        args=parse_arguments()
+    )
+    if query == "crossed-threshold":
+        result = get_users_crossing_threshold(
+            analytics_store=analytics_store,
+            threshold=threshold,
+            start_date=start_date,
+            end_date=end_date,
+        )
+        logging.info(
+            f"{len(result)} users crossed {threshold} inactive days between {start_date} and {end_date}"
+        )
+    elif query == "clean-accounts":
+        result = get_clean_accounts(
+            analytics_store=analytics_store, threshold=threshold, report_date=end_date
+        )
+        logging.info(
+            f"{len(result)} accounts have no users inactive for {threshold} days or more on {end_date}"
+        )
+    else:
+        result = get_inactivity_trend(
+            analytics_store=analytics_store,
+            threshold=threshold,
+            start_date=start_date,
+            end_date=end_date,
+        )
+    print(json.dumps(result, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    inactivity_analytics()
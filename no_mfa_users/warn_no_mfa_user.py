@@ -1,6 +1,7 @@
 import argparse
 import logging
-from notifications_python_client.notifications import NotificationsAPIClient
+from notify_common import create_notification, dispatch_notifications
+from run_report import run_with_report
 
 logging.basicConfig(level=logging.INFO)
 
@@ -20,6 +21,14 @@ def parse_warn_no_mfa_user_arguments():
         dest="aws_account",
         required=True,
     )
+    parser.add_argument(
+        "--notification-spool",
+        help="The name of a file to append the notification to instead of sending it, so that it can be sent as "
+        "part of a digest by send_notification_digests.py",
+        dest="notification_spool",
+        default=None,
+        required=False,
+    )
     parser.add_argument(
         "--template-id",
         help="The Gov UK Notify template ID used to send notifications r.e. No MFA",
@@ -38,9 +47,10 @@ def parse_warn_no_mfa_user_arguments():
 def get_warn_no_mfa_user_args(args=parse_warn_no_mfa_user_arguments()):
     account_id = args.aws_account
     api_key = args.api_key
+    notification_spool = args.notification_spool
     template_id = args.template_id
     username = args.username
-    return account_id, api_key, template_id, username
+    return account_id, api_key, notification_spool, template_id, username
 
 
 def check_iam_user_has_email_address(iam_user):
@@ -50,38 +60,33 @@ def check_iam_user_has_email_address(iam_user):
         return False
 
 
-def send_no_mfa_notify_email(api_key, aws_account, email_address, template_id):
-    notifications_client = NotificationsAPIClient(api_key)
-    notifications_client.send_email_notification(
-        email_address=email_address,
-        template_id=template_id,
-        personalisation={
-            "aws_account": aws_account,
-            "iam_user": email_address,
-        },
-    )
-
-
 def warn_no_mfa_user():
-    account_id, api_key, template_id, username = get_warn_no_mfa_user_args()
+    account_id, api_key, notification_spool, template_id, username = get_warn_no_mfa_user_args()
     user_has_email_address = check_iam_user_has_email_address(iam_user=username)
     if user_has_email_address:
         logging.info(
             f"Sending email notification to {username} regarding lack of MFA on {account_id}"
         )
-        send_no_mfa_notify_email(
+        dispatch_notifications(
             api_key=api_key,
-            aws_account=account_id,
-            email_address=username,
-            template_id=template_id
-        )
-        logging.info(
-            f"Email sent to {username} regarding lack of MFA on {account_id}"
+            notifications=[
+                create_notification(
+                    notification_type="iam_no_mfa",
+                    email_address=username,
+                    template_id=template_id,
+                    aws_account=account_id,
+                )
+            ],
+            notification_spool=notification_spool,
         )
+        if not notification_spool:
+            logging.info(
+                f"Email sent to {username} regarding lack of MFA on {account_id}"
+            )
     else:
         logging.info(
             f"{username} does not appear to be in an email address format, no email to be sent"
         )
 
 
-warn_no_mfa_user()
+run_with_report(flow="warn_no_mfa_user", function=warn_no_mfa_user)
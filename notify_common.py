@@ -0,0 +1,342 @@
+import asyncio
+import aiohttp
+import json
+import logging
+import os
+from call_metrics import timed_call
+from notifications_python_client import __version__ as notify_client_version
+from notifications_python_client.authentication import create_jwt_token
+from run_report import record_action
+
+logging.basicConfig(level=logging.INFO)
+
+notify_base_url = "https://api.notifications.service.gov.uk"
+notify_max_concurrency = 20
+notify_max_attempts = 3
+notify_retryable_status_codes = (429, 500, 502, 503, 504)
+
+
+def build_iam_inactivity_personalisation(
+    email_address, aws_account, inactive_number_of_days, max_number_of_days
+):
+    return {
+        "aws_account": aws_account,
+        "iam_user": email_address,
+        "inactive_number_of_days": inactive_number_of_days,
+        "max_number_of_days": max_number_of_days,
+    }
+
+
+def build_iam_no_mfa_personalisation(email_address, aws_account):
+    return {
+        "aws_account": aws_account,
+        "iam_user": email_address,
+    }
+
+
+def build_auth0_mfa_personalisation(email_address, auth0_tenant):
+    return {
+        "auth0_user": email_address,
+        "auth0_tenant": auth0_tenant,
+    }
+
+
+def build_digest_personalisation(email_address, notifications):
+    lines = []
+    for notification in notifications:
+        if notification["notification_type"] == "digest":
+            lines.extend(notification["personalisation"]["notifications"])
+        else:
+            lines.append(describe_notification(notification=notification))
+    return {
+        "email_address": email_address,
+        "number_of_notifications": len(lines),
+        "notifications": lines,
+    }
+
+
+def describe_iam_inactivity_warning(personalisation):
+    return (
+        f"AWS account {personalisation['aws_account']}: {personalisation['iam_user']} has been inactive for "
+        f"{personalisation['inactive_number_of_days']} days and will be removed after "
+        f"{personalisation['max_number_of_days']} days"
+    )
+
+
+def describe_iam_user_deletion(personalisation):
+    return (
+        f"AWS account {personalisation['aws_account']}: {personalisation['iam_user']} has been removed after "
+        f"{personalisation['inactive_number_of_days']} days of inactivity"
+    )
+
+
+def describe_iam_access_key_deletion(personalisation):
+    return (
+        f"AWS account {personalisation['aws_account']}: the access keys for {personalisation['iam_user']} have "
+        f"been removed after {personalisation['inactive_number_of_days']} days of inactivity"
+    )
+
+
+def describe_iam_access_key_deactivation(personalisation):
+    return (
+        f"AWS account {personalisation['aws_account']}: the access keys for {personalisation['iam_user']} have "
+        f"been deactivated after {personalisation['inactive_number_of_days']} days without use"
+    )
+
+
+def describe_iam_no_mfa(personalisation):
+    return (
+        f"AWS account {personalisation['aws_account']}: {personalisation['iam_user']} does not have MFA enabled"
+    )
+
+
+def describe_digest(personalisation):
+    return "\n".join(personalisation["notifications"])
+
+
+def describe_auth0_mfa(personalisation):
+    return (
+        f"Auth0 tenant {personalisation['auth0_tenant']}: {personalisation['auth0_user']} does not have MFA "
+        f"enabled"
+    )
+
+
+notification_templates = {
+    "iam_inactivity_warning": {
+        "build_personalisation": build_iam_inactivity_personalisation,
+        "describe": describe_iam_inactivity_warning,
+    },
+    "iam_user_deletion": {
+        "build_personalisation": build_iam_inactivity_personalisation,
+        "describe": describe_iam_user_deletion,
+    },
+    "iam_access_key_deletion": {
+        "build_personalisation": build_iam_inactivity_personalisation,
+        "describe": describe_iam_access_key_deletion,
+    },
+    "iam_access_key_deactivation": {
+        "build_personalisation": build_iam_inactivity_personalisation,
+        "describe": describe_iam_access_key_deactivation,
+    },
+    "iam_no_mfa": {
+        "build_personalisation": build_iam_no_mfa_personalisation,
+        "describe": describe_iam_no_mfa,
+    },
+    "auth0_mfa": {
+        "build_personalisation": build_auth0_mfa_personalisation,
+        "describe": describe_auth0_mfa,
+    },
+    "digest": {
+        "build_personalisation": build_digest_personalisation,
+        "describe": describe_digest,
+    },
+}
+
+
+def create_notification(notification_type, email_address, template_id, **fields):
+    personalisation = notification_templates[notification_type]["build_personalisation"](
+        email_address=email_address, **fields
+    )
+    return {
+        "notification_type": notification_type,
+        "email_address": email_address,
+        "template_id": template_id,
+        "personalisation": personalisation,
+    }
+
+
+def describe_notification(notification):
+    return notification_templates[notification["notification_type"]]["describe"](
+        personalisation=notification["personalisation"]
+    )
+
+
+def aggregate_notifications(notifications, digest_template_id):
+    notifications_by_recipient = {}
+    for notification in notifications:
+        notifications_by_recipient.setdefault(
+            notification["email_address"].lower(), []
+        ).append(notification)
+    aggregated_notifications = []
+    for recipient_notifications in notifications_by_recipient.values():
+        if len(recipient_notifications) == 1:
+            aggregated_notifications.append(recipient_notifications[0])
+        else:
+            email_address = recipient_notifications[0]["email_address"]
+            logging.info(
+                f"Combining {len(recipient_notifications)} notifications for {email_address} into a single digest"
+            )
+            aggregated_notifications.append(
+                create_notification(
+                    notification_type="digest",
+                    email_address=email_address,
+                    template_id=digest_template_id,
+                    notifications=recipient_notifications,
+                )
+            )
+    return aggregated_notifications
+
+
+def write_notifications_to_spool(notification_spool, notifications):
+    with open(notification_spool, "a") as notification_spool_file:
+        for notification in notifications:
+            notification_spool_file.write(f"{json.dumps(notification)}\n")
+    logging.info(f"Written notifications to spool file {notification_spool}")
+
+
+def read_notifications_from_spool(notification_spools):
+    for notification_spool in notification_spools:
+        with open(notification_spool) as notification_spool_file:
+            for line in notification_spool_file:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def create_notify_headers(api_key):
+    service_id = api_key[-73:-37]
+    secret = api_key[-36:]
+    return {
+        "Content-type": "application/json",
+        "Authorization": f"Bearer {create_jwt_token(secret, service_id)}",
+        "User-agent": f"NOTIFY-API-PYTHON-CLIENT/{notify_client_version}",
+    }
+
+
+async def send_notification(session, api_key, notification, base_url):
+    payload = {
+        "email_address": notification["email_address"],
+        "template_id": notification["template_id"],
+        "personalisation": notification["personalisation"],
+    }
+    with timed_call(service="notify", operation="send_email") as call:
+        for attempt in range(1, notify_max_attempts + 1):
+            call["retries"] = attempt - 1
+            try:
+                async with session.post(
+                    f"{base_url}/v2/notifications/email",
+                    json=payload,
+                    headers=create_notify_headers(api_key=api_key),
+                ) as response:
+                    if (
+                        response.status in notify_retryable_status_codes
+                        and attempt < notify_max_attempts
+                    ):
+                        logging.info(
+                            f"Gov UK Notify returned {response.status} for {notification['email_address']}, "
+                            f"retrying (attempt {attempt} of {notify_max_attempts})"
+                        )
+                        await asyncio.sleep(2 ** attempt)
+                        continue
+                    if response.status >= 400:
+                        logging.error(
+                            f"Unable to send email to {notification['email_address']}: "
+                            f"{response.status} {await response.text()}"
+                        )
+                        call["outcome"] = str(response.status)
+                        return False
+                    return True
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == notify_max_attempts:
+                    logging.error(
+                        f"Unable to send email to {notification['email_address']}: {e}"
+                    )
+                    call["outcome"] = "error"
+                    return False
+                await asyncio.sleep(2 ** attempt)
+        call["outcome"] = "error"
+        return False
+
+
+async def notification_worker(session, api_key, queue, results, base_url):
+    while True:
+        position, notification = await queue.get()
+        try:
+            results[position] = await send_notification(
+                session=session,
+                api_key=api_key,
+                notification=notification,
+                base_url=base_url,
+            )
+        finally:
+            queue.task_done()
+
+
+async def enqueue_notifications(notifications, queue):
+    loop = asyncio.get_running_loop()
+    if isinstance(notifications, (list, tuple)):
+        for position, notification in enumerate(notifications):
+            await queue.put((position, notification))
+        return len(notifications)
+    notifications = iter(notifications)
+    position = 0
+    while True:
+        notification = await loop.run_in_executor(None, next, notifications, None)
+        if notification is None:
+            return position
+        await queue.put((position, notification))
+        position += 1
+
+
+async def send_notifications_async(
+    api_key, notifications, max_concurrency=notify_max_concurrency, base_url=notify_base_url
+):
+    queue = asyncio.Queue(maxsize=max_concurrency * 2)
+    results = {}
+    connector = aiohttp.TCPConnector(limit=max_concurrency, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=30)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        workers = [
+            asyncio.create_task(
+                notification_worker(
+                    session=session,
+                    api_key=api_key,
+                    queue=queue,
+                    results=results,
+                    base_url=base_url,
+                )
+            )
+            for _ in range(max_concurrency)
+        ]
+        number_of_notifications = await enqueue_notifications(
+            notifications=notifications, queue=queue
+        )
+        await queue.join()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+    return [results[position] for position in range(number_of_notifications)]
+
+
+def send_notifications(
+    api_key, notifications, max_concurrency=notify_max_concurrency, base_url=None
+):
+    base_url = base_url or os.environ.get("NOTIFY_BASE_URL", notify_base_url)
+    results = asyncio.run(
+        send_notifications_async(
+            api_key=api_key,
+            notifications=notifications,
+            max_concurrency=max_concurrency,
+            base_url=base_url,
+        )
+    )
+    logging.info(
+        f"Sent {sum(results)} of {len(results)} email notifications via Gov UK Notify"
+    )
+    record_action(action="notification", outcome="sent", count=sum(results))
+    record_action(action="notification", outcome="failed", count=len(results) - sum(results))
+    if not all(results):
+        logging.error(
+            f"Unable to send {len(results) - sum(results)} email notifications via Gov UK Notify"
+        )
+        exit(1)
+    return results
+
+
+def dispatch_notifications(api_key, notifications, notification_spool=None):
+    if notification_spool:
+        write_notifications_to_spool(
+            notification_spool=notification_spool, notifications=notifications
+        )
+        record_action(action="notification", outcome="spooled", count=len(notifications))
+        return []
+    return send_notifications(api_key=api_key, notifications=notifications)
@@ -0,0 +1,263 @@
+import argparse
+import concurrent.futures
+import json
+import logging
+import os
+import time
+from auth0_common import delete_auth0_users_by_email
+from aws_client_registry import get_client
+from iam_common import delete_iam_user_handler, log_iam_retry_counts
+from remove_users import remove_github_users
+from run_report import record_action, record_stage, run_with_report
+
+logging.basicConfig(level=logging.INFO)
+
+offboarding_max_workers = int(os.environ.get("OFFBOARDING_MAX_WORKERS", 16))
+
+
+def parse_arguments():
+    description = "Arguments to offboard a leaver from every AWS account, GitHub and Auth0 in one run"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--email",
+        help="The email address of the leaver",
+        dest="email",
+        required=True,
+    )
+    parser.add_argument(
+        "--github-login",
+        help="The GitHub login of the leaver, using the GITHUB_TOKEN and GITHUB_ORG environment variables",
+        dest="github_login",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--iam-username",
+        help="The name of the leaver's IAM user (defaults to their email address)",
+        dest="iam_username",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--aws-account-ids",
+        help="Comma separated list of AWS account IDs to delete the leaver's IAM user from",
+        dest="aws_account_ids",
+        default="",
+        required=False,
+    )
+    parser.add_argument(
+        "--role-name",
+        help="The name of the IAM role to assume in each account, when not set the current credentials are used "
+        "and only one account can be given",
+        dest="role_name",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--auth0-domain",
+        help="The domain of the Auth0 Tenant to delete the leaver from, using the AUTH0_CLIENT_ID and "
+        "AUTH0_CLIENT_SECRET environment variables",
+        dest="auth0_domain",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--github-org-removal",
+        help="Remove the leaver from the GitHub organisation in one call rather than team by team",
+        dest="github_org_removal",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--github-ignore",
+        help="Comma separated list of GitHub teams not to remove the leaver from",
+        dest="github_ignore",
+        default="",
+        required=False,
+    )
+    parser.add_argument(
+        "--report-filename",
+        help="The name of a JSON file to write the consolidated offboarding result to",
+        dest="report_filename",
+        default=None,
+        required=False,
+    )
+    args = parser.parse_args()
+    # The current credentials only reach one account, so the other accounts would be reported as offboarded
+    aws_account_ids = [aws_account_id for aws_account_id in args.aws_account_ids.split(",") if aws_account_id]
+    if len(aws_account_ids) > 1 and not args.role_name:
+        parser.error("--role-name is required to offboard a leaver from more than one AWS account")
+    return args
+
+
+def get_args(args):
+    email = args.email
+    github_login = args.github_login
+    iam_username = args.iam_username or email
+    aws_account_ids = [
+        aws_account_id for aws_account_id in args.aws_account_ids.split(",") if aws_account_id
+    ]
+    role_name = args.role_name
+    auth0_domain = args.auth0_domain
+    github_org_removal = args.github_org_removal
+    github_ignored_teams = [team for team in args.github_ignore.split(",") if team]
+    report_filename = args.report_filename
+    return (
+        email,
+        github_login,
+        iam_username,
+        aws_account_ids,
+        role_name,
+        auth0_domain,
+        github_org_removal,
+        github_ignored_teams,
+        report_filename,
+    )
+
+
+def offboard_aws_account(aws_account_id, role_name, iam_username):
+    iam_client = get_client(
+        service_name="iam",
+        account_id=aws_account_id if role_name else None,
+        role_name=role_name,
+    )
+    iam_user_deleted = delete_iam_user_handler(
+        aws_account=aws_account_id, iam_client=iam_client, iam_user=iam_username
+    )
+    return {
+        "outcome": "failed" if iam_user_deleted is False else "success",
+        "deleted": bool(iam_user_deleted),
+    }
+
+
+def offboard_github_user(github_login, github_ignored_teams, github_org_removal):
+    report = remove_github_users(
+        users=[github_login], ignored_teams=github_ignored_teams, org_removal=github_org_removal
+    )
+    user_report = report["users"].get(github_login, {"removed_from": [], "failed": []})
+    return {
+        "outcome": "failed" if user_report["failed"] else "success",
+        "removed_from": user_report["removed_from"],
+        "failed": user_report["failed"],
+    }
+
+
+def offboard_auth0_user(auth0_domain, email):
+    deleted_user_ids = delete_auth0_users_by_email(
+        auth0_domain=auth0_domain,
+        client_id=os.environ.get("AUTH0_CLIENT_ID"),
+        client_secret=os.environ.get("AUTH0_CLIENT_SECRET"),
+        email=email,
+    )
+    return {"deleted": deleted_user_ids}
+
+
+def create_offboarding_tasks(
+    email,
+    github_login,
+    iam_username,
+    aws_account_ids,
+    role_name,
+    auth0_domain,
+    github_org_removal,
+    github_ignored_teams,
+):
+    offboarding_tasks = {}
+    for aws_account_id in aws_account_ids:
+        offboarding_tasks[("aws", aws_account_id)] = lambda aws_account_id=aws_account_id: (
+            offboard_aws_account(
+                aws_account_id=aws_account_id, role_name=role_name, iam_username=iam_username
+            )
+        )
+    if github_login:
+        offboarding_tasks[("github", github_login)] = lambda: offboard_github_user(
+            github_login=github_login,
+            github_ignored_teams=github_ignored_teams,
+            github_org_removal=github_org_removal,
+        )
+    if auth0_domain:
+        offboarding_tasks[("auth0", auth0_domain)] = lambda: offboard_auth0_user(
+            auth0_domain=auth0_domain, email=email
+        )
+    return offboarding_tasks
+
+
+def run_offboarding_task(offboarding_task):
+    start_time = time.perf_counter()
+    try:
+        # Tasks report their own outcome when a removal failed without raising
+        result = {"outcome": "success", **offboarding_task()}
+    except (Exception, SystemExit) as e:
+        result = {"outcome": "failed", "error": repr(e)}
+    result["duration_seconds"] = round(time.perf_counter() - start_time, 3)
+    return result
+
+
+def run_offboarding_tasks(offboarding_tasks, max_workers=offboarding_max_workers):
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(run_offboarding_task, offboarding_task): task_key
+            for task_key, offboarding_task in offboarding_tasks.items()
+        }
+        for future in concurrent.futures.as_completed(futures):
+            platform, target = futures[future]
+            result = {"platform": platform, "target": target, **future.result()}
+            logging.info(
+                f"Offboarding from {platform} {target} finished with outcome {result['outcome']} "
+                f"in {result['duration_seconds']} seconds"
+            )
+            record_action(action=f"offboarding_{platform}", outcome=result["outcome"])
+            results.append(result)
+    return sorted(results, key=lambda result: (result["platform"], result["target"]))
+
+
+def offboard_leaver():
+    (
+        email,
+        github_login,
+        iam_username,
+        aws_account_ids,
+        role_name,
+        auth0_domain,
+        github_org_removal,
+        github_ignored_teams,
+        report_filename,
+    ) = get_args(args=parse_arguments())
+    start_time = time.perf_counter()
+    offboarding_tasks = create_offboarding_tasks(
+        email=email,
+        github_login=github_login,
+        iam_username=iam_username,
+        aws_account_ids=aws_account_ids,
+        role_name=role_name,
+        auth0_domain=auth0_domain,
+        github_org_removal=github_org_removal,
+        github_ignored_teams=github_ignored_teams,
+    )
+    logging.info(f"Offboarding {email} from {len(offboarding_tasks)} targets")
+    results = run_offboarding_tasks(offboarding_tasks=offboarding_tasks)
+    record_stage(
+        stage="offboard", wall_seconds=time.perf_counter() - start_time, items=len(offboarding_tasks)
+    )
+    offboarding_result = {
+        "email": email,
+        "github_login": github_login,
+        "iam_username": iam_username,
+        "succeeded": all(result["outcome"] == "success" for result in results),
+        "duration_seconds": round(time.perf_counter() - start_time, 3),
+        "results": results,
+    }
+    log_iam_retry_counts()
+    logging.info(
+        f"Offboarding {email} {'succeeded' if offboarding_result['succeeded'] else 'failed'} "
+        f"in {offboarding_result['duration_seconds']} seconds"
+    )
+    if report_filename:
+        with open(report_filename, "w") as report_file:
+            json.dump(offboarding_result, report_file, indent=2)
+    if not offboarding_result["succeeded"]:
+        exit(1)
+
+
+if __name__ == "__main__":
+    run_with_report(flow="offboard_leaver", function=offboard_leaver)
@@ -0,0 +1,107 @@
+from offboard_leaver import create_offboarding_tasks, parse_arguments, run_offboarding_tasks
+from auth0_stand_in import start_auth0_stand_in
+
+import boto3
+import offboard_leaver
+import pytest
+from botocore.stub import Stubber
+
+
+@pytest.fixture
+def iam_clients(monkeypatch):
+    iam_clients = {}
+    stubbers = []
+    for aws_account_id, error_code in (("111111111111", "NoSuchEntity"), ("222222222222", "AccessDenied")):
+        iam_client = boto3.client(
+            "iam",
+            region_name="eu-west-2",
+            aws_access_key_id="testing",
+            aws_secret_access_key="testing",
+        )
+        stubber = Stubber(iam_client)
+        stubber.add_client_error("get_user", service_error_code=error_code)
+        stubber.activate()
+        iam_clients[aws_account_id] = iam_client
+        stubbers.append(stubber)
+    monkeypatch.setattr(
+        offboard_leaver,
+        "get_client",
+        lambda service_name, account_id=None, role_name=None: iam_clients[account_id],
+    )
+    yield iam_clients
+    for stubber in stubbers:
+        stubber.deactivate()
+
+
+def test_run_offboarding_tasks(iam_clients, monkeypatch):
+    monkeypatch.setenv("AUTH0_CLIENT_ID", "client-id")
+    monkeypatch.setenv("AUTH0_CLIENT_SECRET", "client-secret")
+    auth0_users = [{"user_id": "auth0|1", "email": "leaver@example.com"}]
+    server, base_url = start_auth0_stand_in(auth0_users=auth0_users)
+
+    offboarding_tasks = create_offboarding_tasks(
+        email="leaver@example.com",
+        github_login=None,
+        iam_username="leaver@example.com",
+        aws_account_ids=list(iam_clients),
+        role_name="user-management",
+        auth0_domain=base_url,
+        github_org_removal=False,
+        github_ignored_teams=[],
+    )
+    results = run_offboarding_tasks(offboarding_tasks=offboarding_tasks)
+    server.shutdown()
+
+    assert [(result["platform"], result["target"], result["outcome"]) for result in results] == [
+        ("auth0", base_url, "success"),
+        ("aws", "111111111111", "success"),
+        ("aws", "222222222222", "failed"),
+    ]
+    assert results[0]["deleted"] == ["auth0|1"]
+    assert results[1]["deleted"] is False
+    assert auth0_users == []
+
+
+def test_run_offboarding_tasks_fails_targets_that_were_not_removed(monkeypatch):
+    monkeypatch.setattr(offboard_leaver, "get_client", lambda **kwargs: None)
+    monkeypatch.setattr(offboard_leaver, "delete_iam_user_handler", lambda **kwargs: False)
+    monkeypatch.setattr(
+        offboard_leaver,
+        "remove_github_users",
+        lambda **kwargs: {
+            "users": {"leaver": {"removed_from": ["test-admins"], "failed": ["test-ops"]}}
+        },
+    )
+
+    offboarding_tasks = create_offboarding_tasks(
+        email="leaver@example.com",
+        github_login="leaver",
+        iam_username="leaver@example.com",
+        aws_account_ids=["111111111111"],
+        role_name=None,
+        auth0_domain=None,
+        github_org_removal=False,
+        github_ignored_teams=[],
+    )
+    results = run_offboarding_tasks(offboarding_tasks=offboarding_tasks)
+
+    assert [(result["platform"], result["outcome"]) for result in results] == [
+        ("aws", "failed"),
+        ("github", "failed"),
+    ]
+    assert results[1]["failed"] == ["test-ops"]
+
+
+def test_parse_arguments_requires_a_role_for_more_than_one_account(monkeypatch):
+    arguments = ["offboard_leaver.py", "--email", "leaver@example.com", "--aws-account-ids"]
+    monkeypatch.setattr("sys.argv", arguments + ["111111111111,222222222222"])
+    with pytest.raises(SystemExit):
+        parse_arguments()
+
+    monkeypatch.setattr("sys.argv", arguments + ["111111111111"])
+    assert parse_arguments().aws_account_ids == "111111111111"
+
+    monkeypatch.setattr(
+        "sys.argv", arguments + ["111111111111,222222222222", "--role-name", "user-management"]
+    )
+    assert parse_arguments().role_name == "user-management"
@@ -1,10 +1,15 @@
 import argparse
-import boto3
 import botocore.exceptions
+import heapq
+import json
 import logging
+from aws_client_registry import get_client
 
 logging.basicConfig(level=logging.INFO)
 
+balance_by_options = ("size", "rows")
+row_count_metadata_key = "row-count"
+
 
 def parse_arguments():
     description = (
@@ -31,18 +36,38 @@ def parse_arguments():
         default="",
         required=False,
     )
+    parser.add_argument(
+        "--shards",
+        help="The number of CI jobs to balance the files across, when set a JSON job matrix is printed instead of a "
+        "list of files",
+        dest="shards",
+        type=int,
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--balance-by",
+        help="Balance the shards by object size, or by the row-count object metadata where present (defaults to "
+        "size)",
+        dest="balance_by",
+        choices=balance_by_options,
+        default="size",
+        required=False,
+    )
     return parser.parse_args()
 
 
-def get_args(args=parse_arguments()):
+def get_args(args):
     s3_bucket_name = args.s3_bucket_name
     folder_path = args.folder_path
     ignore_list = args.ignore_list
-    return s3_bucket_name, folder_path, ignore_list
+    shards = args.shards
+    balance_by = args.balance_by
+    return s3_bucket_name, folder_path, ignore_list, shards, balance_by
 
 
 def create_s3_client():
-    s3_client = boto3.client("s3", region_name="eu-west-2")
+    s3_client = get_client(service_name="s3")
     return s3_client
 
 
@@ -55,32 +80,29 @@ def check_if_user_in_ignore_list(username, ignore_list):
                 return user_should_be_ignored
 
 
-def get_list_of_files_from_s3(folder_path, ignore_list, s3_bucket_name, s3_client):
+def get_objects_from_s3(folder_path, ignore_list, s3_bucket_name, s3_client):
     try:
-        list_of_files_from_s3 = []
+        objects_from_s3 = []
         logging.info(
             f"Attempting to obtain list of files from path {folder_path} in {s3_bucket_name}"
         )
-        objects_in_path = s3_client.list_objects(
-            Bucket=s3_bucket_name, Prefix=folder_path
-        )
-        for object in objects_in_path["Contents"]:
-            user_in_ignore_list = check_if_user_in_ignore_list(
-                username=object["Key"], ignore_list=ignore_list
-            )
-            if user_in_ignore_list:
-                logging.info(f'{object["Key"]} is in the ignore list, so no action to be taken')
-            else:
-                list_of_files_from_s3.append(object["Key"])
-                print(list_of_files_from_s3)
-                for file in list_of_files_from_s3:
-                    if file == folder_path:
-                        logging.debug(
-                            f"Removing returned object that matches folder path {folder_path}"
-                        )
-                        list_of_files_from_s3.remove(file)
+        paginator = s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=s3_bucket_name, Prefix=folder_path):
+            for object in page.get("Contents", []):
+                if object["Key"] == folder_path:
+                    logging.debug(
+                        f"Removing returned object that matches folder path {folder_path}"
+                    )
+                    continue
+                user_in_ignore_list = check_if_user_in_ignore_list(
+                    username=object["Key"], ignore_list=ignore_list
+                )
+                if user_in_ignore_list:
+                    logging.info(f'{object["Key"]} is in the ignore list, so no action to be taken')
+                    continue
+                objects_from_s3.append({"key": object["Key"], "size": object["Size"]})
         logging.info("List of files successfully obtained")
-        return list_of_files_from_s3
+        return objects_from_s3
     except botocore.exceptions.ClientError as e:
         logging.error(
             f"Unable to obtain list of files in {folder_path} path for {s3_bucket_name}: {e}"
@@ -88,9 +110,97 @@ def get_list_of_files_from_s3(folder_path, ignore_list, s3_bucket_name, s3_clien
         exit(1)
 
 
+def get_list_of_files_from_s3(folder_path, ignore_list, s3_bucket_name, s3_client):
+    objects_from_s3 = get_objects_from_s3(
+        folder_path=folder_path,
+        ignore_list=ignore_list,
+        s3_bucket_name=s3_bucket_name,
+        s3_client=s3_client,
+    )
+    return [object_from_s3["key"] for object_from_s3 in objects_from_s3]
+
+
+def get_object_row_count(object_from_s3, s3_bucket_name, s3_client):
+    try:
+        object_metadata = s3_client.head_object(
+            Bucket=s3_bucket_name, Key=object_from_s3["key"]
+        )["Metadata"]
+    except botocore.exceptions.ClientError as e:
+        logging.error(f'Unable to obtain metadata for {object_from_s3["key"]}: {e}')
+        exit(1)
+    if row_count_metadata_key in object_metadata:
+        return int(object_metadata[row_count_metadata_key])
+    logging.info(f'{object_from_s3["key"]} has no {row_count_metadata_key} metadata')
+    return None
+
+
+def shard_files(objects_from_s3, number_of_shards, weight_key="size"):
+    shards = [
+        {"shard": shard_number, "files": [], "weight": 0}
+        for shard_number in range(min(number_of_shards, len(objects_from_s3)))
+    ]
+    shard_weights = [(0, shard_number) for shard_number in range(len(shards))]
+    for object_from_s3 in sorted(
+        objects_from_s3, key=lambda object_from_s3: object_from_s3[weight_key], reverse=True
+    ):
+        weight, shard_number = heapq.heappop(shard_weights)
+        shards[shard_number]["files"].append(object_from_s3["key"])
+        shards[shard_number]["weight"] += object_from_s3[weight_key]
+        heapq.heappush(shard_weights, (shards[shard_number]["weight"], shard_number))
+    return shards
+
+
+def create_job_matrix(
+    folder_path, ignore_list, s3_bucket_name, s3_client, number_of_shards, balance_by="size"
+):
+    objects_from_s3 = get_objects_from_s3(
+        folder_path=folder_path,
+        ignore_list=ignore_list,
+        s3_bucket_name=s3_bucket_name,
+        s3_client=s3_client,
+    )
+    if balance_by == "rows":
+        for object_from_s3 in objects_from_s3:
+            object_from_s3["rows"] = get_object_row_count(
+                object_from_s3=object_from_s3,
+                s3_bucket_name=s3_bucket_name,
+                s3_client=s3_client,
+            )
+        # Rows and bytes cannot be balanced against each other, so one file without a row count means
+        # every file is balanced by size
+        if any(object_from_s3["rows"] is None for object_from_s3 in objects_from_s3):
+            logging.warning(
+                f"Not every file has {row_count_metadata_key} metadata, balancing every file by size instead"
+            )
+            balance_by = "size"
+    shards = shard_files(
+        objects_from_s3=objects_from_s3,
+        number_of_shards=number_of_shards,
+        weight_key=balance_by,
+    )
+    for shard in shards:
+        logging.info(
+            f'Shard {shard["shard"]} has {len(shard["files"])} files with a total {balance_by} of {shard["weight"]}'
+        )
+    return {"include": shards}
+
+
 def download_from_s3():
-    s3_bucket_name, folder_path, ignore_list = get_args()
+    s3_bucket_name, folder_path, ignore_list, shards, balance_by = get_args(
+        args=parse_arguments()
+    )
     s3_client = create_s3_client()
+    if shards:
+        job_matrix = create_job_matrix(
+            folder_path=folder_path,
+            ignore_list=ignore_list,
+            s3_bucket_name=s3_bucket_name,
+            s3_client=s3_client,
+            number_of_shards=shards,
+            balance_by=balance_by,
+        )
+        print(json.dumps(job_matrix))
+        return job_matrix
     list_of_files_from_s3 = get_list_of_files_from_s3(
         folder_path=folder_path, s3_bucket_name=s3_bucket_name, s3_client=s3_client, ignore_list=ignore_list
     )
@@ -98,4 +208,5 @@ def download_from_s3():
     return list_of_files_from_s3
 
 
-download_from_s3()
+if __name__ == "__main__":
+    download_from_s3()
@@ -0,0 +1,130 @@
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from inactive_iam_users_orchestrator import create_job_matrix, get_list_of_files_from_s3, shard_files
+
+
+@pytest.fixture
+def s3_client():
+    s3_client = boto3.client(
+        "s3",
+        region_name="eu-west-2",
+        aws_access_key_id="testing",
+        aws_secret_access_key="testing",
+    )
+    with Stubber(s3_client) as stubber:
+        yield s3_client, stubber
+
+
+def add_list_objects_responses(stubber, pages):
+    for page_number, keys_and_sizes in enumerate(pages):
+        response = {
+            "Contents": [{"Key": key, "Size": size} for key, size in keys_and_sizes],
+            "IsTruncated": page_number < len(pages) - 1,
+        }
+        if page_number < len(pages) - 1:
+            response["NextContinuationToken"] = f"token-{page_number}"
+        expected_params = {"Bucket": "bucket", "Prefix": "expired_iam_users/"}
+        if page_number:
+            expected_params["ContinuationToken"] = f"token-{page_number - 1}"
+        stubber.add_response("list_objects_v2", response, expected_params)
+
+
+def test_get_list_of_files_from_s3_follows_pagination(s3_client):
+    s3_client, stubber = s3_client
+    add_list_objects_responses(
+        stubber,
+        [
+            [("expired_iam_users/", 0), ("expired_iam_users/111.csv", 10)],
+            [("expired_iam_users/222.csv", 20), ("expired_iam_users/333.csv", 30)],
+        ],
+    )
+    assert get_list_of_files_from_s3(
+        folder_path="expired_iam_users/",
+        ignore_list="expired_iam_users/333.csv",
+        s3_bucket_name="bucket",
+        s3_client=s3_client,
+    ) == ["expired_iam_users/111.csv", "expired_iam_users/222.csv"]
+
+
+def test_shard_files_balances_by_weight():
+    objects_from_s3 = [
+        {"key": f"{size}.csv", "size": size} for size in (100, 60, 50, 30, 20, 10, 5)
+    ]
+    shards = shard_files(objects_from_s3=objects_from_s3, number_of_shards=3)
+    assert sorted(shard["weight"] for shard in shards) == [85, 90, 100]
+    assert sorted(key for shard in shards for key in shard["files"]) == sorted(
+        object_from_s3["key"] for object_from_s3 in objects_from_s3
+    )
+
+
+def test_shard_files_never_returns_empty_shards():
+    shards = shard_files(
+        objects_from_s3=[{"key": "a.csv", "size": 1}], number_of_shards=4
+    )
+    assert shards == [{"shard": 0, "files": ["a.csv"], "weight": 1}]
+
+
+def test_create_job_matrix_balances_by_row_count(s3_client):
+    s3_client, stubber = s3_client
+    add_list_objects_responses(
+        stubber,
+        [[("expired_iam_users/111.csv", 1000), ("expired_iam_users/222.csv", 10)]],
+    )
+    stubber.add_response(
+        "head_object",
+        {"Metadata": {"row-count": "1"}},
+        {"Bucket": "bucket", "Key": "expired_iam_users/111.csv"},
+    )
+    stubber.add_response(
+        "head_object",
+        {"Metadata": {"row-count": "500"}},
+        {"Bucket": "bucket", "Key": "expired_iam_users/222.csv"},
+    )
+    job_matrix = create_job_matrix(
+        folder_path="expired_iam_users/",
+        ignore_list="",
+        s3_bucket_name="bucket",
+        s3_client=s3_client,
+        number_of_shards=2,
+        balance_by="rows",
+    )
+    assert job_matrix == {
+        "include": [
+            {"shard": 0, "files": ["expired_iam_users/222.csv"], "weight": 500},
+            {"shard": 1, "files": ["expired_iam_users/111.csv"], "weight": 1},
+        ]
+    }
+
+
+def test_create_job_matrix_balances_by_size_when_a_row_count_is_missing(s3_client):
+    s3_client, stubber = s3_client
+    add_list_objects_responses(
+        stubber,
+        [[("expired_iam_users/111.csv", 1000), ("expired_iam_users/222.csv", 10)]],
+    )
+    stubber.add_response(
+        "head_object",
+        {"Metadata": {"row-count": "1"}},
+        {"Bucket": "bucket", "Key": "expired_iam_users/111.csv"},
+    )
+    stubber.add_response(
+        "head_object",
+        {"Metadata": {}},
+        {"Bucket": "bucket", "Key": "expired_iam_users/222.csv"},
+    )
+    job_matrix = create_job_matrix(
+        folder_path="expired_iam_users/",
+        ignore_list="",
+        s3_bucket_name="bucket",
+        s3_client=s3_client,
+        number_of_shards=2,
+        balance_by="rows",
+    )
+    assert job_matrix == {
+        "include": [
+            {"shard": 0, "files": ["expired_iam_users/111.csv"], "weight": 1000},
+            {"shard": 1, "files": ["expired_iam_users/222.csv"], "weight": 10},
+        ]
+    }
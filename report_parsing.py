@@ -0,0 +1,154 @@
+import array
+import concurrent.futures
+import csv
+import datetime
+import logging
+import multiprocessing
+import os
+import re
+import sys
+
+logging.basicConfig(level=logging.INFO)
+
+report_parsing_chunk_bytes = int(os.environ.get("REPORT_PARSING_CHUNK_BYTES", 16 * 1024 * 1024))
+report_parsing_max_workers = int(
+    os.environ.get("REPORT_PARSING_MAX_WORKERS", os.cpu_count() or 1)
+)
+inactive_days_pattern = re.compile(r"\s*(\d+)\s*days?\b")
+
+
+def get_reference_time(reference_time=None):
+    return reference_time or datetime.datetime.now(datetime.timezone.utc)
+
+
+def parse_number_of_inactive_days(inactivity_in_days, reference_time):
+    number_of_days, _, _ = inactivity_in_days.strip().partition(" ")
+    if number_of_days.isdigit():
+        return int(number_of_days)
+    number_of_days_match = inactive_days_pattern.match(inactivity_in_days)
+    if number_of_days_match:
+        return int(number_of_days_match.group(1))
+    try:
+        last_activity = datetime.datetime.fromisoformat(inactivity_in_days.strip())
+    except ValueError:
+        logging.error(
+            f"Unable to parse inactivity value {inactivity_in_days}, expected <days> days or an ISO timestamp"
+        )
+        exit(1)
+    if last_activity.tzinfo is None:
+        last_activity = last_activity.replace(tzinfo=datetime.timezone.utc)
+    return max(0, (reference_time - last_activity).days)
+
+
+def parse_inactive_days_column(inactivity_values, reference_time):
+    inactive_days = array.array("l")
+    for inactivity_in_days in inactivity_values:
+        inactive_days.append(
+            parse_number_of_inactive_days(
+                inactivity_in_days=inactivity_in_days, reference_time=reference_time
+            )
+        )
+    return inactive_days
+
+
+def read_csv_header(csv_filename):
+    with open(csv_filename, newline="") as csv_file:
+        return next(csv.reader(csv_file), [])
+
+
+def split_csv_into_chunks(csv_filename, chunk_bytes=report_parsing_chunk_bytes):
+    file_size = os.path.getsize(csv_filename)
+    with open(csv_filename, "rb") as csv_file:
+        csv_file.readline()
+        boundaries = [csv_file.tell()]
+        while boundaries[-1] + chunk_bytes < file_size:
+            csv_file.seek(boundaries[-1] + chunk_bytes)
+            csv_file.readline()
+            boundaries.append(csv_file.tell())
+    boundaries.append(file_size)
+    return [
+        (csv_filename, start, end)
+        for start, end in zip(boundaries, boundaries[1:])
+        if end > start
+    ]
+
+
+def parse_csv_chunk(csv_filename, start, end, reference_time):
+    accounts = {}
+    account_indexes = array.array("I")
+    iam_usernames = []
+    inactivity_values = []
+    with open(csv_filename, "rb") as csv_file:
+        csv_file.seek(start)
+        chunk = csv_file.read(end - start).decode()
+    for row in csv.reader(chunk.splitlines()):
+        if not row:
+            continue
+        account_indexes.append(accounts.setdefault(sys.intern(row[0]), len(accounts)))
+        iam_usernames.append(row[1])
+        inactivity_values.append(row[2])
+    inactive_days = parse_inactive_days_column(
+        inactivity_values=inactivity_values, reference_time=reference_time
+    )
+    return {
+        "accounts": list(accounts),
+        "account_indexes": account_indexes,
+        "iam_usernames": iam_usernames,
+        "inactive_days": inactive_days,
+    }
+
+
+def iterate_parsed_chunks(
+    csv_filenames,
+    chunk_bytes=report_parsing_chunk_bytes,
+    max_workers=report_parsing_max_workers,
+    reference_time=None,
+):
+    reference_time = get_reference_time(reference_time=reference_time)
+    chunks = [
+        (*chunk, reference_time)
+        for csv_filename in csv_filenames
+        for chunk in split_csv_into_chunks(csv_filename=csv_filename, chunk_bytes=chunk_bytes)
+    ]
+    if len(chunks) < 2 or max_workers < 2:
+        for chunk in chunks:
+            yield parse_csv_chunk(*chunk)
+        return
+    logging.info(
+        f"Parsing {len(csv_filenames)} inactivity reports in {len(chunks)} chunks "
+        f"across {min(max_workers, len(chunks))} processes"
+    )
+    # The pool can be started once the pipeline threads are running, and forking a threaded process can
+    # copy a lock another thread holds, so workers come from a fork server instead
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=min(max_workers, len(chunks)),
+        mp_context=multiprocessing.get_context("forkserver"),
+    ) as executor:
+        yield from executor.map(parse_csv_chunk, *zip(*chunks))
+
+
+def parse_inactivity_reports(
+    csv_filenames,
+    chunk_bytes=report_parsing_chunk_bytes,
+    max_workers=report_parsing_max_workers,
+    reference_time=None,
+):
+    return list(
+        iterate_parsed_chunks(
+            csv_filenames=csv_filenames,
+            chunk_bytes=chunk_bytes,
+            max_workers=max_workers,
+            reference_time=reference_time,
+        )
+    )
+
+
+def iterate_inactivity_rows(parsed_chunks):
+    for parsed_chunk in parsed_chunks:
+        accounts = parsed_chunk["accounts"]
+        for account_index, iam_username, number_of_inactive_days in zip(
+            parsed_chunk["account_indexes"],
+            parsed_chunk["iam_usernames"],
+            parsed_chunk["inactive_days"],
+        ):
+            yield accounts[account_index], iam_username, number_of_inactive_days
@@ -0,0 +1,177 @@
+import collections
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from call_metrics import summarise_calls
+
+logging.basicConfig(level=logging.INFO)
+
+run_report_dir = os.environ.get("RUN_REPORT_DIR")
+run_report_metric_prefix = "ccs_user_management"
+run_report = {
+    "flow": None,
+    "started": None,
+    "start_time": None,
+    "actions": collections.Counter(),
+    "stages": {},
+    "lock": threading.Lock(),
+}
+
+
+def start_run_report(flow):
+    with run_report["lock"]:
+        run_report["flow"] = flow
+        run_report["started"] = datetime.datetime.now(datetime.timezone.utc)
+        run_report["start_time"] = time.perf_counter()
+        run_report["actions"].clear()
+        run_report["stages"].clear()
+
+
+def record_action(action, outcome, count=1):
+    with run_report["lock"]:
+        run_report["actions"][(action, outcome)] += count
+
+
+def record_stage(stage, wall_seconds, items=None):
+    with run_report["lock"]:
+        stage_report = run_report["stages"].setdefault(stage, {"wall_seconds": 0.0, "items": 0})
+        stage_report["wall_seconds"] = round(stage_report["wall_seconds"] + wall_seconds, 3)
+        stage_report["items"] += items or 0
+
+
+def record_stage_metrics(stage_metrics):
+    for stage, stage_summary in stage_metrics.items():
+        record_stage(
+            stage=stage,
+            wall_seconds=stage_summary["wall_seconds"],
+            items=stage_summary["items_in"],
+        )
+
+
+@contextmanager
+def timed_stage(stage):
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage=stage, wall_seconds=time.perf_counter() - start_time)
+
+
+def build_run_report(status):
+    with run_report["lock"]:
+        actions = {}
+        for (action, outcome), count in sorted(run_report["actions"].items()):
+            actions.setdefault(action, {})[outcome] = count
+        return {
+            "flow": run_report["flow"],
+            "status": status,
+            "started": run_report["started"].isoformat(),
+            "wall_seconds": round(time.perf_counter() - run_report["start_time"], 3),
+            "actions": actions,
+            "stages": {stage: dict(stage_report) for stage, stage_report in run_report["stages"].items()},
+            "calls": summarise_calls(),
+        }
+
+
+def escape_label_value(label_value):
+    return str(label_value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_metric(name, labels, value):
+    formatted_labels = ",".join(
+        f'{label}="{escape_label_value(label_value)}"' for label, label_value in labels.items()
+    )
+    return f"{run_report_metric_prefix}_{name}{{{formatted_labels}}} {value}"
+
+
+def format_prometheus_metrics(report):
+    flow = {"flow": report["flow"]}
+    metrics = [
+        f"# TYPE {run_report_metric_prefix}_run_success gauge",
+        format_metric("run_success", flow, int(report["status"] == "success")),
+        f"# TYPE {run_report_metric_prefix}_run_wall_seconds gauge",
+        format_metric("run_wall_seconds", flow, report["wall_seconds"]),
+        f"# TYPE {run_report_metric_prefix}_run_timestamp_seconds gauge",
+        format_metric(
+            "run_timestamp_seconds",
+            flow,
+            int(datetime.datetime.fromisoformat(report["started"]).timestamp()),
+        ),
+        f"# TYPE {run_report_metric_prefix}_actions gauge",
+    ]
+    for action, outcomes in report["actions"].items():
+        for outcome, count in outcomes.items():
+            metrics.append(
+                format_metric("actions", {**flow, "action": action, "outcome": outcome}, count)
+            )
+    metrics.append(f"# TYPE {run_report_metric_prefix}_stage_wall_seconds gauge")
+    for stage, stage_report in report["stages"].items():
+        metrics.append(
+            format_metric("stage_wall_seconds", {**flow, "stage": stage}, stage_report["wall_seconds"])
+        )
+    metrics.append(f"# TYPE {run_report_metric_prefix}_stage_items gauge")
+    for stage, stage_report in report["stages"].items():
+        metrics.append(format_metric("stage_items", {**flow, "stage": stage}, stage_report["items"]))
+    metrics.append(f"# TYPE {run_report_metric_prefix}_api_calls gauge")
+    for call_name, call_summary in report["calls"].items():
+        for outcome, count in call_summary["outcomes"].items():
+            metrics.append(
+                format_metric("api_calls", {**flow, "call": call_name, "outcome": outcome}, count)
+            )
+    metrics.append(f"# TYPE {run_report_metric_prefix}_api_retries gauge")
+    for call_name, call_summary in report["calls"].items():
+        metrics.append(
+            format_metric("api_retries", {**flow, "call": call_name}, call_summary["retries"])
+        )
+    metrics.append(f"# TYPE {run_report_metric_prefix}_api_call_p95_milliseconds gauge")
+    for call_name, call_summary in report["calls"].items():
+        metrics.append(
+            format_metric("api_call_p95_milliseconds", {**flow, "call": call_name}, call_summary["p95_ms"])
+        )
+    return "\n".join(metrics) + "\n"
+
+
+def write_atomically(filename, contents):
+    with open(f"{filename}.tmp", "w") as report_file:
+        report_file.write(contents)
+    os.replace(f"{filename}.tmp", filename)
+
+
+def write_run_report(report, report_dir):
+    os.makedirs(report_dir, exist_ok=True)
+    started = datetime.datetime.fromisoformat(report["started"])
+    json_filename = os.path.join(
+        report_dir, f"{report['flow']}-{started.strftime('%Y%m%dT%H%M%SZ')}.json"
+    )
+    write_atomically(filename=json_filename, contents=json.dumps(report, indent=2))
+    write_atomically(
+        filename=os.path.join(report_dir, f"{report['flow']}.prom"),
+        contents=format_prometheus_metrics(report=report),
+    )
+    logging.info(f"Written the {report['flow']} run report to {report_dir}")
+
+
+def run_with_report(flow, function, report_dir=None):
+    report_dir = report_dir or run_report_dir
+    start_run_report(flow=flow)
+    status = "failed"
+    try:
+        result = function()
+        status = "success"
+        return result
+    except SystemExit as e:
+        if not e.code:
+            status = "success"
+        raise
+    finally:
+        report = build_run_report(status=status)
+        logging.info(
+            f"Run of {flow} finished with status {status} in {report['wall_seconds']} seconds, "
+            f"actions {report['actions']}"
+        )
+        if report_dir:
+            write_run_report(report=report, report_dir=report_dir)
@@ -0,0 +1,59 @@
+import argparse
+import logging
+from notify_common import (
+    aggregate_notifications,
+    read_notifications_from_spool,
+    send_notifications,
+)
+from run_report import run_with_report
+
+logging.basicConfig(level=logging.INFO)
+
+
+def parse_arguments():
+    description = "Arguments to send a single digest email per recipient from spooled notifications"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--api-key",
+        help="The API Key needed to authenticate with Gov UK Notify",
+        dest="api_key",
+        required=True,
+    )
+    parser.add_argument(
+        "--digest-template-id",
+        help="The ID of the template used to send digest emails via Gov UK Notify",
+        dest="digest_template_id",
+        required=True,
+    )
+    parser.add_argument(
+        "--notification-spools",
+        help="Comma separated list of notification spool files written by the IAM and no MFA flows",
+        dest="notification_spools",
+        required=True,
+    )
+    return parser.parse_args()
+
+
+def get_args(args):
+    api_key = args.api_key
+    digest_template_id = args.digest_template_id
+    notification_spools = args.notification_spools.split(",")
+    return api_key, digest_template_id, notification_spools
+
+
+def send_notification_digests():
+    api_key, digest_template_id, notification_spools = get_args(args=parse_arguments())
+    notifications = list(
+        read_notifications_from_spool(notification_spools=notification_spools)
+    )
+    aggregated_notifications = aggregate_notifications(
+        notifications=notifications, digest_template_id=digest_template_id
+    )
+    logging.info(
+        f"Sending {len(aggregated_notifications)} emails for {len(notifications)} spooled notifications"
+    )
+    send_notifications(api_key=api_key, notifications=aggregated_notifications)
+
+
+if __name__ == "__main__":
+    run_with_report(flow="send_notification_digests", function=send_notification_digests)
@@ -1,6 +1,7 @@
 import argparse
-import boto3
 import logging
+from aws_client_registry import get_client
+from run_report import record_action, run_with_report
 
 logging.basicConfig(level=logging.INFO)
 
@@ -42,7 +43,7 @@ def get_args(args=parse_arguments()):
 def create_client(resource_name, region_name):
     try:
         logging.debug(f"Creating client for {resource_name} in {region_name}")
-        client = boto3.client(resource_name, region_name=region_name)
+        client = get_client(service_name=resource_name, region_name=region_name)
         logging.debug(f"Successfully created {resource_name} client in {region_name}")
         return client
     except Exception as ssm_client_exception:
@@ -185,24 +186,29 @@ def upload_secrets_manager_resources(
 
 def create_ssm_user():
     iam_username, iam_policy_name, region = get_args()
-    iam_client, sts_client, secrets_manager_client = create_boto3_clients(region=region)
-    aws_account_id = get_aws_account_id(sts_client=sts_client)
-    access_key, secret_access_key = iam_user_handler(
-        aws_account_id=aws_account_id,
-        iam_client=iam_client,
-        iam_policy_name=iam_policy_name,
-        iam_username=iam_username,
-    )
-    secrets_manager_resources_dict = create_dict_for_secrets_manager_resources(
-        aws_access_key=access_key,
-        aws_region=region,
-        aws_secret_access_key=secret_access_key,
-    )
-    upload_secrets_manager_resources(
-        iam_username=iam_username,
-        secrets_manager_client=secrets_manager_client,
-        secrets_manager_resources_dict=secrets_manager_resources_dict,
-    )
+    try:
+        iam_client, sts_client, secrets_manager_client = create_boto3_clients(region=region)
+        aws_account_id = get_aws_account_id(sts_client=sts_client)
+        access_key, secret_access_key = iam_user_handler(
+            aws_account_id=aws_account_id,
+            iam_client=iam_client,
+            iam_policy_name=iam_policy_name,
+            iam_username=iam_username,
+        )
+        secrets_manager_resources_dict = create_dict_for_secrets_manager_resources(
+            aws_access_key=access_key,
+            aws_region=region,
+            aws_secret_access_key=secret_access_key,
+        )
+        upload_secrets_manager_resources(
+            iam_username=iam_username,
+            secrets_manager_client=secrets_manager_client,
+            secrets_manager_resources_dict=secrets_manager_resources_dict,
+        )
+    except (Exception, SystemExit):
+        record_action(action="ssm_user_creation", outcome="failed")
+        raise
+    record_action(action="ssm_user_creation", outcome="created")
 
 
-create_ssm_user()
+run_with_report(flow="create_ssm_user", function=create_ssm_user)
@@ -0,0 +1,154 @@
+import logging
+import os
+import queue
+import threading
+import time
+
+logging.basicConfig(level=logging.INFO)
+
+pipeline_queue_size = int(os.environ.get("PIPELINE_QUEUE_SIZE", 1000))
+pipeline_end_of_stream = object()
+
+
+def create_stage(name, function, workers=1, queue_size=pipeline_queue_size, finish=None, drain=False):
+    # A draining stage keeps handling the items it was already given after another stage fails
+    return {
+        "name": name,
+        "function": function,
+        "workers": workers,
+        "queue_size": queue_size,
+        "finish": finish,
+        "drain": drain,
+    }
+
+
+def create_stage_metrics():
+    return {
+        "items_in": 0,
+        "items_out": 0,
+        "busy_seconds": 0.0,
+        "started": None,
+        "finished": None,
+        "lock": threading.Lock(),
+    }
+
+
+def put_outputs(outputs, output_queue, stage_metrics, pipeline_errors, next_stage_drains=False):
+    for output in outputs or ():
+        if pipeline_errors and not next_stage_drains:
+            return
+        with stage_metrics["lock"]:
+            stage_metrics["items_out"] += 1
+        if output_queue is not None:
+            output_queue.put(output)
+
+
+def run_stage_worker(stage, input_queue, output_queue, stage_metrics, stage_workers, pipeline_errors):
+    while True:
+        item = input_queue.get()
+        if item is pipeline_end_of_stream:
+            break
+        if pipeline_errors and not stage["drain"]:
+            continue
+        start_time = time.perf_counter()
+        try:
+            outputs = stage["function"](item)
+            put_outputs(
+                outputs=outputs,
+                output_queue=output_queue,
+                stage_metrics=stage_metrics,
+                pipeline_errors=pipeline_errors,
+                next_stage_drains=stage_workers["next_stage_drains"],
+            )
+        except BaseException as e:
+            logging.error(f"Pipeline stage {stage['name']} failed: {e!r}")
+            pipeline_errors.append(e)
+        with stage_metrics["lock"]:
+            stage_metrics["items_in"] += 1
+            stage_metrics["busy_seconds"] += time.perf_counter() - start_time
+    with stage_metrics["lock"]:
+        stage_workers["running"] -= 1
+        last_worker = stage_workers["running"] == 0
+    if not last_worker:
+        return
+    if stage["finish"] and not pipeline_errors:
+        try:
+            put_outputs(
+                outputs=stage["finish"](),
+                output_queue=output_queue,
+                stage_metrics=stage_metrics,
+                pipeline_errors=pipeline_errors,
+                next_stage_drains=stage_workers["next_stage_drains"],
+            )
+        except BaseException as e:
+            logging.error(f"Pipeline stage {stage['name']} failed to finish: {e!r}")
+            pipeline_errors.append(e)
+    stage_metrics["finished"] = time.perf_counter()
+    if output_queue is not None:
+        for _ in range(stage_workers["next_stage_workers"]):
+            output_queue.put(pipeline_end_of_stream)
+
+
+def summarise_stage_metrics(stage_metrics):
+    wall_seconds = (stage_metrics["finished"] or time.perf_counter()) - stage_metrics["started"]
+    return {
+        "items_in": stage_metrics["items_in"],
+        "items_out": stage_metrics["items_out"],
+        "busy_seconds": round(stage_metrics["busy_seconds"], 3),
+        "wall_seconds": round(wall_seconds, 3),
+        "items_per_second": round(stage_metrics["items_in"] / wall_seconds, 2) if wall_seconds else 0,
+    }
+
+
+def run_pipeline(source, stages):
+    queues = [queue.Queue(maxsize=stage["queue_size"]) for stage in stages]
+    metrics = {stage["name"]: create_stage_metrics() for stage in stages}
+    pipeline_errors = []
+    threads = []
+    start_time = time.perf_counter()
+    for stage_index, stage in enumerate(stages):
+        metrics[stage["name"]]["started"] = start_time
+        next_stage = stages[stage_index + 1] if stage_index + 1 < len(stages) else None
+        stage_workers = {
+            "running": stage["workers"],
+            "next_stage_workers": next_stage["workers"] if next_stage else 0,
+            "next_stage_drains": next_stage["drain"] if next_stage else False,
+        }
+        for _ in range(stage["workers"]):
+            thread = threading.Thread(
+                target=run_stage_worker,
+                kwargs={
+                    "stage": stage,
+                    "input_queue": queues[stage_index],
+                    "output_queue": queues[stage_index + 1] if next_stage else None,
+                    "stage_metrics": metrics[stage["name"]],
+                    "stage_workers": stage_workers,
+                    "pipeline_errors": pipeline_errors,
+                },
+                daemon=True,
+            )
+            thread.start()
+            threads.append(thread)
+    try:
+        for item in source:
+            if pipeline_errors:
+                break
+            queues[0].put(item)
+    finally:
+        for _ in range(stages[0]["workers"]):
+            queues[0].put(pipeline_end_of_stream)
+        for thread in threads:
+            thread.join()
+    stage_summaries = {
+        stage_name: summarise_stage_metrics(stage_metrics=stage_metrics)
+        for stage_name, stage_metrics in metrics.items()
+    }
+    for stage_name, stage_summary in stage_summaries.items():
+        logging.info(
+            f"Pipeline stage {stage_name}: {stage_summary['items_in']} in, {stage_summary['items_out']} out, "
+            f"{stage_summary['items_per_second']} per second, busy for {stage_summary['busy_seconds']} of "
+            f"{stage_summary['wall_seconds']} seconds"
+        )
+    if pipeline_errors:
+        raise pipeline_errors[0]
+    return stage_summaries
@@ -1,21 +1,60 @@
 import argparse
-import boto3
 import botocore.exceptions
-import csv
+import collections
+import json
 import logging
-from notifications_python_client.notifications import NotificationsAPIClient
+import os
+import threading
+from aws_client_registry import get_client
+from escalation_policy import (
+    check_tier_already_notified,
+    compile_escalation_policy,
+    create_default_escalation_policy,
+    get_escalation_tier,
+    get_state_key,
+    read_state_file,
+    update_state_file,
+)
+from iam_common import (
+    build_iam_inventory,
+    delete_iam_user_handler,
+    iam_inventory_min_deletions,
+    manage_account_access_keys,
+)
+from inactivity_analytics import append_inactivity_report
+from notify_common import (
+    aggregate_notifications,
+    create_notification,
+    dispatch_notifications,
+)
+from report_parsing import (
+    iterate_inactivity_rows,
+    iterate_parsed_chunks,
+    parse_inactivity_reports,
+    read_csv_header,
+)
+from run_report import record_action, record_stage_metrics, run_with_report, timed_stage
+from staged_pipeline import create_stage, run_pipeline
 
 logging.basicConfig(level=logging.INFO)
 
+stale_iam_workers = int(os.environ.get("STALE_IAM_WORKERS", 4))
+stale_notify_batch_size = int(os.environ.get("STALE_NOTIFY_BATCH_SIZE", 100))
+access_key_notification_types = {
+    "deactivate": "iam_access_key_deactivation",
+    "delete": "iam_access_key_deletion",
+}
+tiered_notification_types = {"iam_user_deletion", "iam_inactivity_warning"}
+
 
 def parse_arguments():
     description = "Arguments to manage stale IAM users"
     parser = argparse.ArgumentParser(description=description)
     parser.add_argument(
         "--csv-filename",
-        help="The name of the CSV file containing stale IAM users",
+        help="The name of the CSV file containing stale IAM users, or a comma separated list of CSV files",
         dest="csv_filename",
-        required=True,
+        required=False,
     )
     parser.add_argument(
         "--ignore-list",
@@ -38,6 +77,23 @@ def parse_arguments():
         default=90,
         required=False,
     )
+    parser.add_argument(
+        "--escalation-policy",
+        help="Comma separated list of <days>:<action> tiers, where action is warning, access_key_deactivation or "
+        "deletion, e.g. 60:warning,75:warning,85:warning,88:access_key_deactivation,90:deletion. Defaults to a "
+        "warning tier at the warning threshold and a deletion tier at the deletion threshold",
+        dest="escalation_policy",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--access-key-grace-period-days",
+        help="The number of days an access key stays deactivated before it is deleted (defaults to 14)",
+        dest="access_key_grace_period_days",
+        type=int,
+        default=14,
+        required=False,
+    )
     parser.add_argument(
         "--api-key-resource-name",
         help="The name of the API Key resource in Secrets Manager",
@@ -59,25 +115,104 @@ def parse_arguments():
         default="ccs_user_management_notify_warning_template",
         required=False,
     )
-    return parser.parse_args()
+    parser.add_argument(
+        "--access-key-template-resource-name",
+        help="The name of the access key template resource in Secrets Manager, used to notify users whose access "
+        "keys are deactivated or deleted by access_key_deactivation escalation tiers",
+        dest="access_key_template_resource_name",
+        default="ccs_user_management_notify_access_key_template",
+        required=False,
+    )
+    parser.add_argument(
+        "--digest-template-resource-name",
+        help="The name of the digest template resource in Secrets Manager, when set users with notifications for "
+        "multiple accounts receive a single digest email",
+        dest="digest_template_resource_name",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--notification-spool",
+        help="The name of a file to append notifications to instead of sending them, so that they can be sent as "
+        "digests by send_notification_digests.py",
+        dest="notification_spool",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--plan-filename",
+        help="The name of a JSON file to write the planned actions to, without deleting users or sending emails",
+        dest="plan_filename",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--apply-plan-filename",
+        help="The name of a JSON file written by --plan-filename containing the actions to apply",
+        dest="apply_plan_filename",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--analytics-store",
+        help="The directory of a columnar store to append the credential data in the CSV file to, for trend "
+        "queries with inactivity_analytics.py",
+        dest="analytics_store",
+        default=None,
+        required=False,
+    )
+    parser.add_argument(
+        "--state-file",
+        help="The name of a JSON file holding the action taken on each user in the previous run, so that only "
+        "users whose action has changed are processed",
+        dest="state_file",
+        default=None,
+        required=False,
+    )
+    args = parser.parse_args()
+    if not args.csv_filename and not args.apply_plan_filename:
+        parser.error("one of --csv-filename or --apply-plan-filename is required")
+    return args
 
 
-def get_args(args=parse_arguments()):
+def get_args(args):
     csv_filename = args.csv_filename
     ignore_list = args.ignore_list
     warning_threshold = args.warning_threshold
     deletion_threshold = args.deletion_threshold
+    escalation_policy = args.escalation_policy or create_default_escalation_policy(
+        warning_threshold=warning_threshold, deletion_threshold=deletion_threshold
+    )
+    access_key_grace_period_days = args.access_key_grace_period_days
     api_key_resource_name = args.api_key_resource_name
     deletion_template_resource_name = args.deletion_template_resource_name
     warning_template_resource_name = args.warning_template_resource_name
+    access_key_template_resource_name = (
+        args.access_key_template_resource_name
+    )
+    digest_template_resource_name = args.digest_template_resource_name
+    notification_spool = args.notification_spool
+    plan_filename = args.plan_filename
+    apply_plan_filename = args.apply_plan_filename
+    analytics_store = args.analytics_store
+    state_file = args.state_file
     return (
         csv_filename,
         ignore_list,
         warning_threshold,
         deletion_threshold,
+        escalation_policy,
+        access_key_grace_period_days,
         api_key_resource_name,
         deletion_template_resource_name,
         warning_template_resource_name,
+        access_key_template_resource_name,
+        digest_template_resource_name,
+        notification_spool,
+        plan_filename,
+        apply_plan_filename,
+        analytics_store,
+        state_file,
     )
 
 
@@ -90,38 +225,29 @@ def check_if_user_in_ignore_list(iam_username, ignore_list):
                 return user_should_be_ignored
 
 
-def get_number_of_inactive_days_for_user(inactivity_in_days):
-    number_of_inactive_days = int(
-        "".join(list(filter(str.isdigit, inactivity_in_days)))
-    )
-    return number_of_inactive_days
-
-
 def check_action_to_be_taken_on_user(
-    deletion_threshold, iam_username, number_of_inactive_days, warning_threshold
+    compiled_escalation_policy, iam_username, number_of_inactive_days
 ):
-    if number_of_inactive_days >= deletion_threshold:
-        logging.info(
-            f"{iam_username} has been inactive for {number_of_inactive_days} days, and should therefore be deleted"
-        )
-        action_to_be_taken = "deletion"
-    elif number_of_inactive_days >= warning_threshold:
+    tier, action_to_be_taken = get_escalation_tier(
+        compiled_escalation_policy=compiled_escalation_policy,
+        number_of_inactive_days=number_of_inactive_days,
+    )
+    if action_to_be_taken:
         logging.info(
-            f"{iam_username} has been inactive for {number_of_inactive_days} days, and should therefore be warned"
+            f"{iam_username} has been inactive for {number_of_inactive_days} days, and has reached the {tier} day "
+            f"{action_to_be_taken} tier"
         )
-        action_to_be_taken = "warning"
     else:
         logging.info(
             f"{iam_username} has been inactive for {number_of_inactive_days} days, no action needed"
         )
-        action_to_be_taken = False
-    return action_to_be_taken
+    return tier, action_to_be_taken
 
 
 def create_iam_client():
     try:
         logging.debug('Creating IAM Client')
-        iam_client = boto3.client("iam", region_name="eu-west-2")
+        iam_client = get_client(service_name="iam")
         logging.debug('Successfully created IAM Client')
         return iam_client
     except botocore.exceptions.ClientError as e:
@@ -129,18 +255,8 @@ def create_iam_client():
         exit(1)
 
 
-def delete_iam_user(aws_account, iam_client, iam_user):
-    try:
-        logging.info(f'Attempting to delete IAM user {iam_user} from AWS account: {aws_account}')
-        iam_client.delete_user(UserName=iam_user)
-        logging.info(f'IAM user {iam_user} has been deleted from AWS account: {aws_account}')
-    except botocore.exceptions.ClientError as e:
-        logging.error(f'Unable to delete IAM user {iam_user}: {e}')
-        exit(1)
-
-
 def create_secretsmanager_client():
-    secretsmanager_client = boto3.client("secretsmanager", region_name="eu-west-2")
+    secretsmanager_client = get_client(service_name="secretsmanager")
     return secretsmanager_client
 
 
@@ -169,25 +285,378 @@ def configure_secretsmanager_resources(
     return api_key, deletion_template, warning_template
 
 
-def send_email_via_notify(
-    api_key,
-    aws_account,
-    email_address,
-    inactive_number_of_days,
-    max_number_of_days,
-    template_id,
+def compile_stale_escalation_policy(escalation_policy, warning_threshold, deletion_threshold):
+    return compile_escalation_policy(
+        escalation_policy=escalation_policy
+        or create_default_escalation_policy(
+            warning_threshold=warning_threshold, deletion_threshold=deletion_threshold
+        )
+    )
+
+
+def plan_user_action(
+    compiled_escalation_policy,
+    account_id,
+    iam_username,
+    number_of_inactive_days,
+    ignore_list,
+    state,
+    previous_state=None,
+):
+    user_in_ignore_list = check_if_user_in_ignore_list(
+        iam_username=iam_username, ignore_list=ignore_list
+    )
+    if user_in_ignore_list:
+        logging.info(
+            f"User {iam_username} is in the ignore list, no action required"
+        )
+        return None
+    tier, action_to_be_taken = check_action_to_be_taken_on_user(
+        compiled_escalation_policy=compiled_escalation_policy,
+        iam_username=iam_username,
+        number_of_inactive_days=number_of_inactive_days,
+    )
+    if not action_to_be_taken:
+        return None
+    state_key = get_state_key(account_id=account_id, iam_username=iam_username)
+    state[state_key] = tier
+    if action_to_be_taken != "access_key_deactivation" and previous_state is not None and (
+        check_tier_already_notified(previous_tier=previous_state.get(state_key), tier=tier)
+    ):
+        logging.info(
+            f"{iam_username} in AWS account {account_id} has already been notified at the {tier} day tier, "
+            f"no action required"
+        )
+        record_action(action="stale_user_plan", outcome="already_notified")
+        return {"aws_account": account_id, "iam_user": iam_username, "action": None, "tier": tier}
+    record_action(action="stale_user_plan", outcome="planned")
+    return {
+        "aws_account": account_id,
+        "iam_user": iam_username,
+        "action": action_to_be_taken,
+        "tier": tier,
+        "inactive_number_of_days": number_of_inactive_days,
+    }
+
+
+def build_action_plan(
+    csv_filename,
+    deletion_threshold,
+    ignore_list,
+    warning_threshold,
+    previous_state=None,
+    escalation_policy=None,
+    access_key_grace_period_days=14,
+    reference_time=None,
+):
+    compiled_escalation_policy = compile_stale_escalation_policy(
+        escalation_policy=escalation_policy,
+        warning_threshold=warning_threshold,
+        deletion_threshold=deletion_threshold,
+    )
+    actions = []
+    access_key_reviews = []
+    state = {}
+    account_ids = set()
+    number_of_unchanged_users = 0
+    csv_filenames = csv_filename.split(",")
+    logging.info(f'Column names are {", ".join(read_csv_header(csv_filename=csv_filenames[0]))}')
+    for account_id, iam_username, number_of_inactive_days in iterate_inactivity_rows(
+        parsed_chunks=parse_inactivity_reports(
+            csv_filenames=csv_filenames, reference_time=reference_time
+        )
+    ):
+        account_ids.add(account_id)
+        planned_action = plan_user_action(
+            compiled_escalation_policy=compiled_escalation_policy,
+            account_id=account_id,
+            iam_username=iam_username,
+            number_of_inactive_days=number_of_inactive_days,
+            ignore_list=ignore_list,
+            state=state,
+            previous_state=previous_state,
+        )
+        if not planned_action:
+            continue
+        if planned_action["action"] == "access_key_deactivation":
+            access_key_reviews.append(
+                {"aws_account": account_id, "iam_user": iam_username, "tier": planned_action["tier"]}
+            )
+        elif planned_action["action"] is None:
+            number_of_unchanged_users += 1
+        else:
+            actions.append(planned_action)
+    actions.sort(key=lambda planned_action: planned_action["aws_account"])
+    access_key_reviews.sort(key=lambda access_key_review: access_key_review["aws_account"])
+    if previous_state is not None:
+        logging.info(
+            f"{len(actions)} users have reached a new tier and {number_of_unchanged_users} have already been "
+            f"notified at their current tier"
+        )
+    return {
+        "csv_filename": csv_filename,
+        "escalation_policy": compiled_escalation_policy["escalation_policy"],
+        "deletion_threshold": compiled_escalation_policy["deletion_threshold"]
+        or deletion_threshold,
+        "warning_threshold": warning_threshold,
+        "actions": actions,
+        "access_key_grace_period_days": access_key_grace_period_days,
+        "access_key_reviews": access_key_reviews,
+        "state": state,
+        "account_ids": sorted(account_ids),
+    }
+
+
+def write_action_plan(action_plan, plan_filename):
+    with open(plan_filename, "w") as plan_file:
+        json.dump(action_plan, plan_file, indent=2)
+    logging.info(
+        f"Written {len(action_plan['actions'])} planned actions to {plan_filename}, no changes have been made"
+    )
+
+
+def read_action_plan(plan_filename):
+    with open(plan_filename) as plan_file:
+        action_plan = json.load(plan_file)
+    logging.info(
+        f"Read {len(action_plan['actions'])} planned actions from {plan_filename}"
+    )
+    return action_plan
+
+
+def build_iam_inventories(action_plan, iam_client):
+    deletions_by_account = {}
+    for planned_action in action_plan["actions"]:
+        if planned_action["action"] == "deletion":
+            deletions_by_account[planned_action["aws_account"]] = (
+                deletions_by_account.get(planned_action["aws_account"], 0) + 1
+            )
+    return {
+        account_id: build_iam_inventory(aws_account=account_id, iam_client=iam_client)
+        for account_id, number_of_deletions in deletions_by_account.items()
+        if number_of_deletions >= iam_inventory_min_deletions
+    }
+
+
+def review_access_keys(action_plan, iam_client, access_key_template_resource_name):
+    access_key_reviews_by_account = {}
+    for access_key_review in action_plan["access_key_reviews"]:
+        access_key_reviews_by_account.setdefault(
+            (access_key_review["aws_account"], access_key_review["tier"]), []
+        ).append(access_key_review["iam_user"])
+    access_key_template = None
+    notifications = []
+    for (account_id, tier), iam_usernames in access_key_reviews_by_account.items():
+        access_key_actions_by_user = manage_account_access_keys(
+            aws_account=account_id,
+            iam_client=iam_client,
+            iam_users=iam_usernames,
+            deactivation_threshold=tier,
+            grace_period_days=action_plan["access_key_grace_period_days"],
+        )
+        for iam_username, access_key_actions in access_key_actions_by_user.items():
+            if access_key_template is None:
+                access_key_template = get_secret_from_secretsmanager(
+                    secretsmanager_client=create_secretsmanager_client(),
+                    secret_name=access_key_template_resource_name,
+                )
+            for action in sorted({access_key_action["action"] for access_key_action in access_key_actions}):
+                notifications.append(
+                    create_notification(
+                        notification_type=access_key_notification_types[action],
+                        email_address=iam_username,
+                        template_id=access_key_template,
+                        aws_account=account_id,
+                        inactive_number_of_days=max(
+                            access_key_action["inactive_number_of_days"]
+                            for access_key_action in access_key_actions
+                            if access_key_action["action"] == action
+                        ),
+                        max_number_of_days=action_plan["deletion_threshold"],
+                    )
+                )
+            logging.info(
+                f"Access key notification email queued for user {iam_username} for AWS Account: {account_id}"
+            )
+    return notifications
+
+
+def create_planned_action_notification(
+    planned_action, deletion_template, warning_template, deletion_threshold
 ):
-    notifications_client = NotificationsAPIClient(api_key)
-    notifications_client.send_email_notification(
-        email_address=email_address,
+    notification_type, template_id, description = {
+        "deletion": ("iam_user_deletion", deletion_template, "Deletion"),
+        "warning": ("iam_inactivity_warning", warning_template, "Warning"),
+    }[planned_action["action"]]
+    logging.info(
+        f"{description} notification email queued for user {planned_action['iam_user']} for AWS Account: "
+        f"{planned_action['aws_account']}"
+    )
+    return create_notification(
+        notification_type=notification_type,
+        email_address=planned_action["iam_user"],
         template_id=template_id,
-        personalisation={
-            "aws_account": aws_account,
-            "iam_user": email_address,
-            "inactive_number_of_days": inactive_number_of_days,
-            "max_number_of_days": max_number_of_days,
-        },
+        aws_account=planned_action["aws_account"],
+        inactive_number_of_days=planned_action["inactive_number_of_days"],
+        max_number_of_days=deletion_threshold,
+    )
+
+
+def delete_planned_user(planned_action, iam_client, inventory):
+    iam_user_deleted = delete_iam_user_handler(
+        aws_account=planned_action["aws_account"],
+        iam_client=iam_client,
+        iam_user=planned_action["iam_user"],
+        inventory=inventory,
+    )
+    if not iam_user_deleted:
+        logging.error(
+            f"Unable to delete {planned_action['iam_user']} in AWS account {planned_action['aws_account']}, "
+            f"no deletion notification will be sent"
+        )
+        record_action(action="stale_user_deletion", outcome="failed")
+    return bool(iam_user_deleted)
+
+
+def check_failed_deletions(failed_state_keys):
+    if failed_state_keys:
+        logging.error(
+            f"Unable to delete {len(failed_state_keys)} IAM users: {', '.join(sorted(failed_state_keys))}"
+        )
+        exit(1)
+
+
+def dispatch_queued_notifications(
+    api_key, notifications, digest_template_resource_name=None, notification_spool=None
+):
+    if not notifications:
+        return
+    # Spooled notifications are combined into digests by send_notification_digests.py
+    if digest_template_resource_name and not notification_spool:
+        digest_template = get_secret_from_secretsmanager(
+            secretsmanager_client=create_secretsmanager_client(),
+            secret_name=digest_template_resource_name,
+        )
+        notifications = aggregate_notifications(
+            notifications=notifications, digest_template_id=digest_template
+        )
+    dispatch_notifications(
+        api_key=api_key,
+        notifications=notifications,
+        notification_spool=notification_spool,
+    )
+
+
+def apply_action_plan(
+    action_plan,
+    api_key_resource_name,
+    deletion_template_resource_name,
+    warning_template_resource_name,
+    digest_template_resource_name=None,
+    notification_spool=None,
+    state_file=None,
+    access_key_template_resource_name=None,
+):
+    api_key, deletion_template, warning_template = configure_secretsmanager_resources(
+        api_key_resource_name=api_key_resource_name,
+        deletion_template_resource_name=deletion_template_resource_name,
+        warning_template_resource_name=warning_template_resource_name,
+    )
+    iam_client = create_iam_client()
+    deletion_threshold = action_plan["deletion_threshold"]
+    iam_inventories = build_iam_inventories(action_plan=action_plan, iam_client=iam_client)
+    notifications = []
+    failed_state_keys = []
+
+    try:
+        for planned_action in action_plan["actions"]:
+            if planned_action["action"] == "deletion" and not delete_planned_user(
+                planned_action=planned_action,
+                iam_client=iam_client,
+                inventory=iam_inventories.get(planned_action["aws_account"]),
+            ):
+                failed_state_keys.append(
+                    get_state_key(
+                        account_id=planned_action["aws_account"], iam_username=planned_action["iam_user"]
+                    )
+                )
+                continue
+            notifications.append(
+                create_planned_action_notification(
+                    planned_action=planned_action,
+                    deletion_template=deletion_template,
+                    warning_template=warning_template,
+                    deletion_threshold=deletion_threshold,
+                )
+            )
+        if action_plan.get("access_key_reviews"):
+            notifications.extend(
+                review_access_keys(
+                    action_plan=action_plan,
+                    iam_client=iam_client,
+                    access_key_template_resource_name=access_key_template_resource_name,
+                )
+            )
+    except (Exception, SystemExit):
+        logging.error(
+            f"Applying the action plan failed, sending the {len(notifications)} notifications queued so far"
+        )
+        dispatch_queued_notifications(
+            api_key=api_key,
+            notifications=notifications,
+            digest_template_resource_name=digest_template_resource_name,
+            notification_spool=notification_spool,
+        )
+        raise
+    dispatch_queued_notifications(
+        api_key=api_key,
+        notifications=notifications,
+        digest_template_resource_name=digest_template_resource_name,
+        notification_spool=notification_spool,
     )
+    if state_file and "state" in action_plan:
+        update_state_file(
+            state_file=state_file,
+            state=action_plan["state"],
+            replaced_account_ids=action_plan.get("account_ids", ()),
+            kept_state_keys=failed_state_keys,
+        )
+    check_failed_deletions(failed_state_keys=failed_state_keys)
+
+
+def get_notified_state(notifications, state):
+    notified_state = {}
+    for notification in notifications:
+        if notification["notification_type"] not in tiered_notification_types:
+            continue
+        state_key = get_state_key(
+            account_id=notification["personalisation"]["aws_account"],
+            iam_username=notification["email_address"],
+        )
+        notified_state[state_key] = state[state_key]
+    return notified_state
+
+
+def create_streamed_inventory_getter(iam_client):
+    deletions_by_account = collections.Counter()
+    iam_inventories = {}
+    account_locks = collections.defaultdict(threading.Lock)
+    lock = threading.Lock()
+
+    def get_streamed_iam_inventory(account_id):
+        with lock:
+            deletions_by_account[account_id] += 1
+            if deletions_by_account[account_id] < iam_inventory_min_deletions:
+                return None
+            account_lock = account_locks[account_id]
+        with account_lock:
+            if account_id not in iam_inventories:
+                iam_inventories[account_id] = build_iam_inventory(
+                    aws_account=account_id, iam_client=iam_client
+                )
+        return iam_inventories[account_id]
+
+    return get_streamed_iam_inventory
 
 
 def csv_file_handler(
@@ -198,75 +667,160 @@ def csv_file_handler(
     ignore_list,
     warning_threshold,
     warning_template_resource_name,
+    digest_template_resource_name=None,
+    notification_spool=None,
+    state_file=None,
+    escalation_policy=None,
+    access_key_template_resource_name=None,
+    access_key_grace_period_days=14,
 ):
+    compiled_escalation_policy = compile_stale_escalation_policy(
+        escalation_policy=escalation_policy,
+        warning_threshold=warning_threshold,
+        deletion_threshold=deletion_threshold,
+    )
+    deletion_threshold = compiled_escalation_policy["deletion_threshold"] or deletion_threshold
+    previous_state = read_state_file(state_file=state_file) if state_file else None
     api_key, deletion_template, warning_template = configure_secretsmanager_resources(
         api_key_resource_name=api_key_resource_name,
         deletion_template_resource_name=deletion_template_resource_name,
         warning_template_resource_name=warning_template_resource_name,
     )
+    digest_template = None
+    # Spooled notifications are combined into digests by send_notification_digests.py
+    if digest_template_resource_name and not notification_spool:
+        digest_template = get_secret_from_secretsmanager(
+            secretsmanager_client=create_secretsmanager_client(),
+            secret_name=digest_template_resource_name,
+        )
     iam_client = create_iam_client()
+    get_streamed_iam_inventory = create_streamed_inventory_getter(iam_client=iam_client)
+    state = {}
+    account_ids = set()
+    access_key_reviews = []
+    pending_notifications = []
+    failed_state_keys = []
 
-    with open(csv_filename) as stale_iam_users_file:
-        csv_reader = csv.reader(stale_iam_users_file, delimiter=",")
-        line_count = 0
-        for row in csv_reader:
-            if line_count == 0:
-                logging.info(f'Column names are {", ".join(row)}')
-                line_count += 1
-            else:
-                account_id = row[0]
-                iam_username = row[1]
-                inactivity_in_days = row[2]
-                user_in_ignore_list = check_if_user_in_ignore_list(
-                    iam_username=iam_username, ignore_list=ignore_list
-                )
-                if user_in_ignore_list:
-                    logging.info(" ")
-                    logging.info(
-                        f"User {iam_username} is in the ignore list, no action required"
-                    )
-                else:
-                    logging.info(f"Proceeding with relevant action for {iam_username}")
-                    number_of_inactive_days = get_number_of_inactive_days_for_user(
-                        inactivity_in_days=inactivity_in_days
-                    )
-                    action_to_be_taken = check_action_to_be_taken_on_user(
-                        deletion_threshold=deletion_threshold,
-                        iam_username=iam_username,
-                        number_of_inactive_days=number_of_inactive_days,
-                        warning_threshold=warning_threshold,
-                    )
-                    if action_to_be_taken == "deletion":
-                        delete_iam_user(aws_account=account_id, iam_client=iam_client, iam_user=iam_username)
-                        send_email_via_notify(
-                            api_key=api_key,
-                            aws_account=account_id,
-                            email_address=iam_username,
-                            inactive_number_of_days=number_of_inactive_days,
-                            max_number_of_days=deletion_threshold,
-                            template_id=deletion_template,
-                        )
-                        logging.info(
-                            f"Deletion notification email sent to user {iam_username} for AWS Account: {account_id}"
-                        )
-                        continue
-                    elif action_to_be_taken == "warning":
-                        send_email_via_notify(
-                            api_key=api_key,
-                            aws_account=account_id,
-                            email_address=iam_username,
-                            inactive_number_of_days=number_of_inactive_days,
-                            max_number_of_days=deletion_threshold,
-                            template_id=warning_template,
-                        )
-                        logging.info(
-                            f"Warning notification email sent to user {iam_username} for AWS Account: {account_id}"
-                        )
-                    else:
-                        logging.info(
-                            f"No notification email needs to be sent to user {iam_username} for AWS Account: {account_id}"
-                        )
-                line_count += 1
+    def parse(parsed_chunk):
+        return iterate_inactivity_rows(parsed_chunks=[parsed_chunk])
+
+    def decide(inactive_user):
+        account_id, iam_username, number_of_inactive_days = inactive_user
+        account_ids.add(account_id)
+        planned_action = plan_user_action(
+            compiled_escalation_policy=compiled_escalation_policy,
+            account_id=account_id,
+            iam_username=iam_username,
+            number_of_inactive_days=number_of_inactive_days,
+            ignore_list=ignore_list,
+            state=state,
+            previous_state=previous_state,
+        )
+        if planned_action and planned_action["action"]:
+            return [planned_action]
+        return []
+
+    def act(planned_action):
+        if planned_action["action"] == "access_key_deactivation":
+            access_key_reviews.append(planned_action)
+            return []
+        if planned_action["action"] == "deletion" and not delete_planned_user(
+            planned_action=planned_action,
+            iam_client=iam_client,
+            inventory=get_streamed_iam_inventory(account_id=planned_action["aws_account"]),
+        ):
+            failed_state_keys.append(
+                get_state_key(account_id=planned_action["aws_account"], iam_username=planned_action["iam_user"])
+            )
+            return []
+        return [
+            create_planned_action_notification(
+                planned_action=planned_action,
+                deletion_template=deletion_template,
+                warning_template=warning_template,
+                deletion_threshold=deletion_threshold,
+            )
+        ]
+
+    def review_streamed_access_keys():
+        if not access_key_reviews:
+            return []
+        return review_access_keys(
+            action_plan={
+                "access_key_reviews": access_key_reviews,
+                "access_key_grace_period_days": access_key_grace_period_days,
+                "deletion_threshold": deletion_threshold,
+            },
+            iam_client=iam_client,
+            access_key_template_resource_name=access_key_template_resource_name,
+        )
+
+    def notify(notification):
+        pending_notifications.append(notification)
+        # Digests need every notification for a recipient, so they are only sent once the stream ends
+        if digest_template is None and len(pending_notifications) >= stale_notify_batch_size:
+            send_pending_notifications()
+        return []
+
+    def send_pending_notifications():
+        notifications = pending_notifications[:]
+        pending_notifications.clear()
+        if not notifications:
+            return []
+        dispatched_notifications = notifications
+        if digest_template is not None:
+            dispatched_notifications = aggregate_notifications(
+                notifications=notifications, digest_template_id=digest_template
+            )
+        dispatch_notifications(
+            api_key=api_key,
+            notifications=dispatched_notifications,
+            notification_spool=notification_spool,
+        )
+        # Recording each sent batch stops a failed run from notifying the same users again
+        if state_file:
+            update_state_file(
+                state_file=state_file,
+                state=get_notified_state(notifications=notifications, state=state),
+            )
+        return []
+
+    csv_filenames = csv_filename.split(",")
+    logging.info(f'Column names are {", ".join(read_csv_header(csv_filename=csv_filenames[0]))}')
+    try:
+        stage_metrics = run_pipeline(
+            source=iterate_parsed_chunks(csv_filenames=csv_filenames),
+            stages=[
+                create_stage(name="parse", function=parse),
+                create_stage(name="decide", function=decide),
+                create_stage(
+                    name="act",
+                    function=act,
+                    workers=stale_iam_workers,
+                    finish=review_streamed_access_keys,
+                ),
+                create_stage(
+                    name="notify", function=notify, finish=send_pending_notifications, drain=True
+                ),
+            ],
+        )
+    except (Exception, SystemExit):
+        logging.error(
+            f"Processing {csv_filename} failed, sending the {len(pending_notifications)} notifications "
+            f"queued so far"
+        )
+        send_pending_notifications()
+        raise
+    record_stage_metrics(stage_metrics=stage_metrics)
+    if state_file:
+        update_state_file(
+            state_file=state_file,
+            state=state,
+            replaced_account_ids=account_ids,
+            kept_state_keys=failed_state_keys,
+        )
+    check_failed_deletions(failed_state_keys=failed_state_keys)
+    return stage_metrics
 
 
 def stale_iam_users():
@@ -275,19 +829,63 @@ def stale_iam_users():
         ignore_list,
         warning_threshold,
         deletion_threshold,
+        escalation_policy,
+        access_key_grace_period_days,
         api_key_resource_name,
         deletion_template_resource_name,
         warning_template_resource_name,
-    ) = get_args()
-    csv_file_handler(
-        api_key_resource_name=api_key_resource_name,
-        csv_filename=csv_filename,
-        deletion_template_resource_name=deletion_template_resource_name,
-        deletion_threshold=int(deletion_threshold),
-        ignore_list=ignore_list,
-        warning_threshold=int(warning_threshold),
-        warning_template_resource_name=warning_template_resource_name,
-    )
+        access_key_template_resource_name,
+        digest_template_resource_name,
+        notification_spool,
+        plan_filename,
+        apply_plan_filename,
+        analytics_store,
+        state_file,
+    ) = get_args(args=parse_arguments())
+    if analytics_store and csv_filename:
+        for report_filename in csv_filename.split(","):
+            append_inactivity_report(analytics_store=analytics_store, csv_filename=report_filename)
+    if apply_plan_filename:
+        with timed_stage(stage="apply"):
+            apply_action_plan(
+                action_plan=read_action_plan(plan_filename=apply_plan_filename),
+                api_key_resource_name=api_key_resource_name,
+                deletion_template_resource_name=deletion_template_resource_name,
+                warning_template_resource_name=warning_template_resource_name,
+                digest_template_resource_name=digest_template_resource_name,
+                notification_spool=notification_spool,
+                state_file=state_file,
+                access_key_template_resource_name=access_key_template_resource_name,
+            )
+    elif plan_filename:
+        with timed_stage(stage="plan"):
+            action_plan = build_action_plan(
+                csv_filename=csv_filename,
+                deletion_threshold=int(deletion_threshold),
+                ignore_list=ignore_list,
+                warning_threshold=int(warning_threshold),
+                previous_state=read_state_file(state_file=state_file) if state_file else None,
+                escalation_policy=escalation_policy,
+                access_key_grace_period_days=access_key_grace_period_days,
+            )
+        write_action_plan(action_plan=action_plan, plan_filename=plan_filename)
+    else:
+        csv_file_handler(
+            api_key_resource_name=api_key_resource_name,
+            csv_filename=csv_filename,
+            deletion_template_resource_name=deletion_template_resource_name,
+            deletion_threshold=int(deletion_threshold),
+            ignore_list=ignore_list,
+            warning_threshold=int(warning_threshold),
+            warning_template_resource_name=warning_template_resource_name,
+            digest_template_resource_name=digest_template_resource_name,
+            notification_spool=notification_spool,
+            state_file=state_file,
+            escalation_policy=escalation_policy,
+            access_key_template_resource_name=access_key_template_resource_name,
+            access_key_grace_period_days=access_key_grace_period_days,
+        )
 
 
-stale_iam_users()
+if __name__ == "__main__":
+    run_with_report(flow="stale_iam_users", function=stale_iam_users)
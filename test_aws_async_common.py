@@ -0,0 +1,68 @@
+from aws_async_common import (
+    create_async_client, create_async_session, delete_all_files_within_folder,
+    gather_with_concurrency, get_objects_from_s3
+)
+
+import asyncio
+from botocore.stub import Stubber
+
+
+def test_gather_with_concurrency_limits_in_flight_coroutines():
+    in_flight = {"current": 0, "peak": 0}
+
+    async def track(value):
+        in_flight["current"] += 1
+        in_flight["peak"] = max(in_flight["peak"], in_flight["current"])
+        await asyncio.sleep(0)
+        in_flight["current"] -= 1
+        return value
+
+    results = asyncio.run(
+        gather_with_concurrency((track(value) for value in range(10)), max_concurrency=3)
+    )
+
+    assert results == list(range(10))
+    assert in_flight["peak"] == 3
+
+
+def test_get_objects_from_s3_and_delete_all_files_within_folder():
+    async def run():
+        async with create_async_client(
+            session=create_async_session(),
+            service_name="s3",
+            credentials={"AccessKeyId": "testing", "SecretAccessKey": "testing"},
+        ) as s3_client:
+            with Stubber(s3_client) as stubber:
+                stubber.add_response(
+                    "list_objects_v2",
+                    {"Contents": [
+                        {"Key": "folder/", "Size": 0},
+                        {"Key": "folder/ignored", "Size": 1},
+                        {"Key": "folder/file", "Size": 2},
+                    ]},
+                    {"Bucket": "bucket", "Prefix": "folder/"},
+                )
+                objects_from_s3 = await get_objects_from_s3(
+                    folder_path="folder/",
+                    ignore_list="folder/ignored",
+                    s3_bucket_name="bucket",
+                    s3_client=s3_client,
+                )
+                stubber.add_response(
+                    "list_objects_v2",
+                    {"Contents": [{"Key": "folder/file", "Size": 2}]},
+                    {"Bucket": "bucket", "Prefix": "folder/"},
+                )
+                stubber.add_response(
+                    "delete_object", {}, {"Bucket": "bucket", "Key": "folder/file"}
+                )
+                deleted_files = await delete_all_files_within_folder(
+                    s3_client=s3_client, bucket_name="bucket", bucket_path="folder"
+                )
+                stubber.assert_no_pending_responses()
+        return objects_from_s3, deleted_files
+
+    objects_from_s3, deleted_files = asyncio.run(run())
+
+    assert objects_from_s3 == [{"key": "folder/file", "size": 2}]
+    assert deleted_files == 1
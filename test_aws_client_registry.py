@@ -0,0 +1,102 @@
+import aws_client_registry
+from aws_client_registry import clear_client_registry, get_client
+
+import datetime
+import pytest
+import threading
+from botocore.stub import Stubber
+
+
+@pytest.fixture(autouse=True)
+def client_registry(monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+    clear_client_registry()
+    yield
+    clear_client_registry()
+
+
+def add_assume_role_response(stubber, expiration):
+    stubber.add_response(
+        "assume_role",
+        {"Credentials": {
+            "AccessKeyId": "ASIAEXAMPLEKEYID001", "SecretAccessKey": "secret",
+            "SessionToken": "token", "Expiration": expiration,
+        }},
+        {
+            "RoleArn": "arn:aws:iam::123456789012:role/user-management",
+            "RoleSessionName": "ccs-user-management",
+        },
+    )
+
+
+def test_get_client_reuses_clients_per_service_and_region():
+    iam_client = get_client(service_name="iam")
+
+    assert get_client(service_name="iam") is iam_client
+    assert get_client(service_name="iam", region_name="eu-west-1") is not iam_client
+    assert iam_client.meta.config.max_pool_connections == 50
+    assert iam_client.meta.config.tcp_keepalive
+
+
+def test_get_client_leaves_iam_retries_to_call_iam_api():
+    assert get_client(service_name="iam").meta.config.retries["total_max_attempts"] == 1
+    assert get_client(service_name="s3").meta.config.retries["mode"] == "adaptive"
+
+
+def test_get_client_reassumes_role_when_credentials_expire():
+    now = datetime.datetime.now(datetime.timezone.utc)
+    with Stubber(get_client(service_name="sts")) as stubber:
+        add_assume_role_response(stubber, expiration=now + datetime.timedelta(hours=1))
+        iam_client = get_client(
+            service_name="iam", account_id="123456789012", role_name="user-management"
+        )
+        assert get_client(
+            service_name="iam", account_id="123456789012", role_name="user-management"
+        ) is iam_client
+        stubber.assert_no_pending_responses()
+
+    clear_client_registry()
+    with Stubber(get_client(service_name="sts")) as stubber:
+        add_assume_role_response(stubber, expiration=now + datetime.timedelta(minutes=1))
+        add_assume_role_response(stubber, expiration=now + datetime.timedelta(hours=1))
+        expiring_iam_client = get_client(
+            service_name="iam", account_id="123456789012", role_name="user-management"
+        )
+        assert get_client(
+            service_name="iam", account_id="123456789012", role_name="user-management"
+        ) is not expiring_iam_client
+        stubber.assert_no_pending_responses()
+
+
+def test_get_client_assumes_roles_in_different_accounts_concurrently(monkeypatch):
+    first_role_assumed = threading.Event()
+    release_first_role = threading.Event()
+
+    def assume_role(account_id, role_name, region_name):
+        if account_id == "111111111111":
+            first_role_assumed.set()
+            assert release_first_role.wait(timeout=5)
+        return {
+            "AccessKeyId": "ASIAEXAMPLEKEYID001", "SecretAccessKey": "secret", "SessionToken": "token",
+            "Expiration": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1),
+        }
+
+    monkeypatch.setattr(aws_client_registry, "assume_role", assume_role)
+    first_account_thread = threading.Thread(
+        target=get_client,
+        kwargs={"service_name": "iam", "account_id": "111111111111", "role_name": "user-management"},
+    )
+    first_account_thread.start()
+    assert first_role_assumed.wait(timeout=5)
+
+    second_iam_client = get_client(
+        service_name="iam", account_id="222222222222", role_name="user-management"
+    )
+
+    assert first_account_thread.is_alive()
+    release_first_role.set()
+    first_account_thread.join(timeout=5)
+    assert second_iam_client is not get_client(
+        service_name="iam", account_id="111111111111", role_name="user-management"
+    )
@@ -0,0 +1,50 @@
+from call_metrics import (
+    calculate_percentile, instrument_boto3_client, summarise_calls, timed_call
+)
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+
+def test_calculate_percentile():
+    sorted_durations = [duration / 100 for duration in range(1, 101)]
+
+    assert calculate_percentile(sorted_durations, 50) == 0.5
+    assert calculate_percentile(sorted_durations, 95) == 0.95
+    assert calculate_percentile(sorted_durations, 99) == 0.99
+    assert calculate_percentile([0.1], 99) == 0.1
+
+
+def test_timed_call_records_errors():
+    with pytest.raises(ValueError):
+        with timed_call(service="test", operation="failing_call"):
+            raise ValueError("failed")
+    with timed_call(service="test", operation="failing_call") as call:
+        call["retries"] = 2
+
+    summary = summarise_calls()["test.failing_call"]
+
+    assert summary["count"] == 2
+    assert summary["retries"] == 2
+    assert summary["outcomes"] == {"error": 1, "success": 1}
+
+
+def test_instrument_boto3_client():
+    s3_client = instrument_boto3_client(boto3.client(
+        "s3",
+        region_name="eu-west-2",
+        aws_access_key_id="testing",
+        aws_secret_access_key="testing",
+    ))
+    with Stubber(s3_client) as stubber:
+        stubber.add_response("list_buckets", {"Buckets": []})
+        stubber.add_client_error("list_buckets", service_error_code="AccessDenied")
+        s3_client.list_buckets()
+        with pytest.raises(s3_client.exceptions.ClientError):
+            s3_client.list_buckets()
+
+    summary = summarise_calls()["s3.ListBuckets"]
+
+    assert summary["count"] == 2
+    assert summary["outcomes"] == {"success": 1, "AccessDenied": 1}
@@ -0,0 +1,93 @@
+import json
+import pytest
+import threading
+from escalation_policy import (
+    check_tier_already_notified,
+    compile_escalation_policy,
+    create_default_escalation_policy,
+    get_escalation_tier,
+    read_state_file,
+    update_state_file,
+)
+
+tiered_escalation_policy = "60:warning,75:warning,85:warning,88:access_key_deactivation,90:deletion"
+
+
+@pytest.mark.parametrize(
+    "number_of_inactive_days,expected_tier",
+    [
+        (0, (None, False)),
+        (59, (None, False)),
+        (60, (60, "warning")),
+        (74, (60, "warning")),
+        (75, (75, "warning")),
+        (87, (85, "warning")),
+        (88, (88, "access_key_deactivation")),
+        (90, (90, "deletion")),
+        (400, (90, "deletion")),
+    ],
+)
+def test_get_escalation_tier(number_of_inactive_days, expected_tier):
+    compiled_escalation_policy = compile_escalation_policy(
+        escalation_policy=tiered_escalation_policy
+    )
+    assert (
+        get_escalation_tier(
+            compiled_escalation_policy=compiled_escalation_policy,
+            number_of_inactive_days=number_of_inactive_days,
+        )
+        == expected_tier
+    )
+
+
+def test_compile_escalation_policy_sorts_tiers():
+    compiled_escalation_policy = compile_escalation_policy(
+        escalation_policy="90:deletion,80:warning"
+    )
+    assert compiled_escalation_policy["thresholds"] == [80, 90]
+    assert compiled_escalation_policy["deletion_threshold"] == 90
+
+
+def test_default_escalation_policy_matches_thresholds():
+    assert create_default_escalation_policy(warning_threshold=80, deletion_threshold=90) == (
+        "80:warning,90:deletion"
+    )
+
+
+def test_compile_escalation_policy_rejects_unknown_actions():
+    with pytest.raises(SystemExit):
+        compile_escalation_policy(escalation_policy="60:warning,90:suspend")
+
+
+def test_check_tier_already_notified():
+    assert not check_tier_already_notified(previous_tier=None, tier=60)
+    assert check_tier_already_notified(previous_tier=60, tier=60)
+    assert not check_tier_already_notified(previous_tier=60, tier=75)
+    assert not check_tier_already_notified(previous_tier="3f9a1c", tier=60)
+
+
+def test_read_state_file_ignores_action_hashes(tmp_path):
+    state_file = tmp_path / "state.json"
+    state_file.write_text(json.dumps({"111/alice": "3f9a1c", "111/bob": 60}))
+
+    assert read_state_file(state_file=str(state_file)) == {"111/bob": 60}
+
+
+def test_update_state_file_removes_and_keeps_concurrent_updates(tmp_path):
+    state_file = str(tmp_path / "state.json")
+    update_state_file(state_file=state_file, state={"111/alice": 60})
+    threads = [
+        threading.Thread(
+            target=update_state_file,
+            kwargs={"state_file": state_file, "state": {f"222/user{index}": 75}},
+        )
+        for index in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    update_state_file(state_file=state_file, state={}, removed_state_keys=["111/alice"])
+
+    assert read_state_file(state_file=state_file) == {f"222/user{index}": 75 for index in range(20)}
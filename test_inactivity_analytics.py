@@ -0,0 +1,64 @@
+from inactivity_analytics import (
+    append_inactivity_report,
+    get_clean_accounts,
+    get_inactivity_trend,
+    get_users_crossing_threshold,
+)
+
+
+def write_inactivity_report(tmp_path, report_date, rows):
+    csv_filename = tmp_path / f"{report_date}.csv"
+    csv_filename.write_text(
+        "account_id,iam_username,inactivity_in_days\n"
+        + "".join(f"{account_id},{iam_username},{days} days\n" for account_id, iam_username, days in rows)
+    )
+    return str(csv_filename)
+
+
+def create_analytics_store(tmp_path):
+    analytics_store = str(tmp_path / "analytics")
+    for report_date, rows in (
+        ("2024-01-01", [("111", "alice", 70), ("111", "bob", 10), ("222", "carol", 5), ("222", "dave", 85)]),
+        ("2024-01-08", [("111", "alice", 81), ("111", "bob", 17), ("222", "carol", 12), ("222", "dave", 2)]),
+    ):
+        append_inactivity_report(
+            analytics_store=analytics_store,
+            csv_filename=write_inactivity_report(tmp_path, report_date, rows),
+            report_date=report_date,
+        )
+    return analytics_store
+
+
+def test_get_users_crossing_threshold(tmp_path):
+    analytics_store = create_analytics_store(tmp_path)
+    assert get_users_crossing_threshold(
+        analytics_store=analytics_store,
+        threshold=80,
+        start_date="2024-01-01",
+        end_date="2024-01-08",
+    ) == [{"account_id": "111", "iam_username": "alice"}]
+
+
+def test_get_clean_accounts(tmp_path):
+    analytics_store = create_analytics_store(tmp_path)
+    assert get_clean_accounts(
+        analytics_store=analytics_store, threshold=80, report_date="2024-01-01"
+    ) == ["111"]
+    assert get_clean_accounts(
+        analytics_store=analytics_store, threshold=80, report_date="2024-01-08"
+    ) == ["222"]
+
+
+def test_appending_the_same_report_date_replaces_it(tmp_path):
+    analytics_store = create_analytics_store(tmp_path)
+    append_inactivity_report(
+        analytics_store=analytics_store,
+        csv_filename=write_inactivity_report(tmp_path, "2024-01-08", [("111", "alice", 90)]),
+        report_date="2024-01-08",
+    )
+    assert get_inactivity_trend(
+        analytics_store=analytics_store,
+        threshold=0,
+        start_date="2024-01-01",
+        end_date="2024-01-08",
+    ) == {"2024-01-01": 4, "2024-01-08": 3}
@@ -0,0 +1,190 @@
+from notify_common import (
+    aggregate_notifications, create_notification, read_notifications_from_spool,
+    send_notifications, write_notifications_to_spool
+)
+
+import json
+import pytest
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+api_key = "test-26785a09-ab16-4eb0-8407-a37497a57506-3d844edf-8d35-48ac-975b-e847b4f122b0"
+
+
+def start_notify_stand_in(failing_email_addresses=()):
+    received_notifications = []
+
+    class NotifyStandInHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_POST(self):
+            notification = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            assert self.headers["Authorization"].startswith("Bearer ")
+            if notification["email_address"] in failing_email_addresses:
+                status_code = 400
+            else:
+                received_notifications.append(notification)
+                status_code = 201
+            self.send_response(status_code)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), NotifyStandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://{server.server_address[0]}:{server.server_address[1]}"
+    return server, base_url, received_notifications
+
+
+def test_create_notification():
+    notification = create_notification(
+        notification_type="iam_inactivity_warning",
+        email_address="user@example.com",
+        template_id="template",
+        aws_account="123456789012",
+        inactive_number_of_days=85,
+        max_number_of_days=90,
+    )
+
+    assert notification["personalisation"] == {
+        "aws_account": "123456789012",
+        "iam_user": "user@example.com",
+        "inactive_number_of_days": 85,
+        "max_number_of_days": 90,
+    }
+
+
+def test_send_notifications_from_generator():
+    server, base_url, received_notifications = start_notify_stand_in()
+    notifications = (
+        create_notification(
+            notification_type="auth0_mfa",
+            email_address=f"user{user_number}@example.com",
+            template_id="template",
+            auth0_tenant="tenant",
+        )
+        for user_number in range(50)
+    )
+
+    results = send_notifications(
+        api_key=api_key, notifications=notifications, max_concurrency=5, base_url=base_url
+    )
+    server.shutdown()
+
+    assert results == [True] * 50
+    assert len(received_notifications) == 50
+    assert received_notifications[0]["personalisation"] == {
+        "auth0_user": received_notifications[0]["email_address"],
+        "auth0_tenant": "tenant",
+    }
+
+
+def test_send_notifications_exits_on_failure():
+    server, base_url, received_notifications = start_notify_stand_in(
+        failing_email_addresses=("user1@example.com",)
+    )
+    notifications = [
+        create_notification(
+            notification_type="iam_no_mfa",
+            email_address=f"user{user_number}@example.com",
+            template_id="template",
+            aws_account="123456789012",
+        )
+        for user_number in range(3)
+    ]
+
+    with pytest.raises(SystemExit):
+        send_notifications(api_key=api_key, notifications=notifications, base_url=base_url)
+    server.shutdown()
+
+    assert len(received_notifications) == 2
+
+
+def test_aggregate_notifications():
+    notifications = [
+        create_notification(
+            notification_type="iam_inactivity_warning",
+            email_address="User@example.com",
+            template_id="warning-template",
+            aws_account=aws_account,
+            inactive_number_of_days=85,
+            max_number_of_days=90,
+        )
+        for aws_account in ("111111111111", "222222222222")
+    ]
+    notifications.append(
+        create_notification(
+            notification_type="iam_no_mfa",
+            email_address="user@example.com",
+            template_id="no-mfa-template",
+            aws_account="333333333333",
+        )
+    )
+    notifications.append(
+        create_notification(
+            notification_type="iam_no_mfa",
+            email_address="other@example.com",
+            template_id="no-mfa-template",
+            aws_account="333333333333",
+        )
+    )
+
+    result = aggregate_notifications(
+        notifications=notifications, digest_template_id="digest-template"
+    )
+
+    assert len(result) == 2
+    assert result[0]["template_id"] == "digest-template"
+    assert result[0]["personalisation"]["number_of_notifications"] == 3
+    assert result[0]["personalisation"]["notifications"][2] == (
+        "AWS account 333333333333: user@example.com does not have MFA enabled"
+    )
+    assert result[1] == notifications[3]
+
+
+def test_notification_spool(tmp_path):
+    notification_spool = str(tmp_path / "notifications.jsonl")
+    notification = create_notification(
+        notification_type="iam_access_key_deletion",
+        email_address="user@example.com",
+        template_id="template",
+        aws_account="123456789012",
+        inactive_number_of_days=95,
+        max_number_of_days=90,
+    )
+
+    write_notifications_to_spool(notification_spool=notification_spool, notifications=[notification])
+    write_notifications_to_spool(notification_spool=notification_spool, notifications=[notification])
+
+    assert list(read_notifications_from_spool(notification_spools=[notification_spool])) == [
+        notification, notification
+    ]
+
+
+def test_aggregate_notifications_flattens_spooled_digests():
+    def create_warning(aws_account):
+        return create_notification(
+            notification_type="iam_inactivity_warning",
+            email_address="user@example.com",
+            template_id="warning-template",
+            aws_account=aws_account,
+            inactive_number_of_days=85,
+            max_number_of_days=90,
+        )
+
+    digests = aggregate_notifications(
+        notifications=[create_warning("111111111111"), create_warning("222222222222")],
+        digest_template_id="digest-template",
+    )
+
+    result = aggregate_notifications(
+        notifications=digests + [create_warning("333333333333")],
+        digest_template_id="digest-template",
+    )
+
+    assert len(result) == 1
+    assert result[0]["personalisation"]["number_of_notifications"] == 3
+    assert [line.split(":")[0] for line in result[0]["personalisation"]["notifications"]] == [
+        "AWS account 111111111111", "AWS account 222222222222", "AWS account 333333333333"
+    ]
@@ -0,0 +1,62 @@
+from report_parsing import (
+    iterate_inactivity_rows, parse_inactivity_reports, parse_number_of_inactive_days,
+    split_csv_into_chunks
+)
+
+import datetime
+import pytest
+
+
+def write_inactivity_report(tmp_path, filename, rows):
+    csv_filename = tmp_path / filename
+    csv_filename.write_text(
+        "account_id,iam_username,inactivity_in_days\n"
+        + "".join(f"{account_id},{iam_username},{inactivity} days\n" for account_id, iam_username, inactivity in rows)
+    )
+    return str(csv_filename)
+
+
+def test_split_csv_into_chunks_aligns_to_rows(tmp_path):
+    rows = [("123456789012", f"user-{index}", index) for index in range(100)]
+    csv_filename = write_inactivity_report(tmp_path, "report.csv", rows)
+
+    chunks = split_csv_into_chunks(csv_filename=csv_filename, chunk_bytes=64)
+
+    assert len(chunks) > 1
+    with open(csv_filename, "rb") as csv_file:
+        contents = csv_file.read()
+    assert all(contents[start - 1:start] == b"\n" for _, start, _ in chunks)
+    assert chunks[-1][2] == len(contents)
+
+
+def test_parse_inactivity_reports_across_processes(tmp_path):
+    first_rows = [("123456789012", f"user-{index}", index) for index in range(100)]
+    second_rows = [("210987654321", f"user-{index}", index * 2) for index in range(50)]
+    csv_filenames = [
+        write_inactivity_report(tmp_path, "first.csv", first_rows),
+        write_inactivity_report(tmp_path, "second.csv", second_rows),
+    ]
+
+    parsed_chunks = parse_inactivity_reports(
+        csv_filenames=csv_filenames, chunk_bytes=256, max_workers=2
+    )
+
+    assert len(parsed_chunks) > 2
+    assert list(iterate_inactivity_rows(parsed_chunks=parsed_chunks)) == first_rows + second_rows
+    assert list(iterate_inactivity_rows(
+        parsed_chunks=parse_inactivity_reports(csv_filenames=csv_filenames, max_workers=1)
+    )) == first_rows + second_rows
+
+
+def test_parse_number_of_inactive_days():
+    reference_time = datetime.datetime(2024, 1, 1, 12, tzinfo=datetime.timezone.utc)
+
+    assert parse_number_of_inactive_days("90 days", reference_time) == 90
+    assert parse_number_of_inactive_days("90 days (since 2023-10-03)", reference_time) == 90
+    assert parse_number_of_inactive_days("1day", reference_time) == 1
+    assert parse_number_of_inactive_days("45", reference_time) == 45
+    assert parse_number_of_inactive_days("2023-12-01T08:00:00+00:00", reference_time) == 31
+    assert parse_number_of_inactive_days("2023-12-01", reference_time) == 31
+    assert parse_number_of_inactive_days("2024-01-02T00:00:00Z", reference_time) == 0
+    with pytest.raises(SystemExit):
+        parse_number_of_inactive_days("N/A", reference_time)
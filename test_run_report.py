@@ -0,0 +1,120 @@
+import json
+
+from call_metrics import record_call
+from run_report import (
+    build_run_report,
+    format_prometheus_metrics,
+    record_action,
+    record_stage,
+    record_stage_metrics,
+    run_with_report,
+    start_run_report,
+    timed_stage,
+)
+
+import pytest
+
+
+def test_build_run_report_groups_actions_and_stages():
+    start_run_report(flow="stale_iam_users")
+    record_action(action="iam_user_deletion", outcome="deleted")
+    record_action(action="iam_user_deletion", outcome="deleted")
+    record_action(action="iam_user_deletion", outcome="failed")
+    record_action(action="notification", outcome="sent", count=3)
+    record_stage(stage="plan", wall_seconds=1.5)
+    record_stage(stage="plan", wall_seconds=0.5, items=2)
+    record_stage_metrics(stage_metrics={"act": {"wall_seconds": 2.0, "items_in": 10}})
+    with timed_stage(stage="apply"):
+        pass
+
+    report = build_run_report(status="success")
+
+    assert report["flow"] == "stale_iam_users"
+    assert report["status"] == "success"
+    assert report["actions"] == {
+        "iam_user_deletion": {"deleted": 2, "failed": 1},
+        "notification": {"sent": 3},
+    }
+    assert report["stages"]["plan"] == {"wall_seconds": 2.0, "items": 2}
+    assert report["stages"]["act"] == {"wall_seconds": 2.0, "items": 10}
+    assert report["stages"]["apply"]["items"] == 0
+
+
+def test_start_run_report_clears_the_previous_run():
+    start_run_report(flow="first")
+    record_action(action="notification", outcome="sent")
+    record_stage(stage="notify", wall_seconds=1.0)
+
+    start_run_report(flow="second")
+
+    report = build_run_report(status="success")
+    assert report["flow"] == "second"
+    assert report["actions"] == {}
+    assert report["stages"] == {}
+
+
+def test_format_prometheus_metrics_labels_every_sample_with_the_flow():
+    start_run_report(flow="remove_github_users")
+    record_action(action="github_team_removal", outcome="removed", count=4)
+    record_stage(stage="remove", wall_seconds=3.25, items=4)
+    record_call(service="github", operation="delete_team_membership", duration=0.2, outcome="success")
+
+    metrics = format_prometheus_metrics(report=build_run_report(status="failed"))
+
+    assert 'ccs_user_management_run_success{flow="remove_github_users"} 0' in metrics
+    assert (
+        'ccs_user_management_actions{flow="remove_github_users",action="github_team_removal",outcome="removed"} 4'
+        in metrics
+    )
+    assert 'ccs_user_management_stage_wall_seconds{flow="remove_github_users",stage="remove"} 3.25' in metrics
+    assert 'ccs_user_management_stage_items{flow="remove_github_users",stage="remove"} 4' in metrics
+    assert (
+        'ccs_user_management_api_calls{flow="remove_github_users",call="github.delete_team_membership",outcome="success"}'
+        in metrics
+    )
+    assert metrics.count("# TYPE ccs_user_management_actions gauge") == 1
+    assert metrics.endswith("\n")
+
+
+def test_run_with_report_writes_json_and_prometheus_files(tmp_path):
+    def flow():
+        record_action(action="iam_user_deletion", outcome="deleted")
+        return "done"
+
+    assert run_with_report(flow="delete_iam_user", function=flow, report_dir=str(tmp_path)) == "done"
+
+    json_files = list(tmp_path.glob("delete_iam_user-*.json"))
+    assert len(json_files) == 1
+    report = json.loads(json_files[0].read_text())
+    assert report["status"] == "success"
+    assert report["actions"] == {"iam_user_deletion": {"deleted": 1}}
+    assert 'ccs_user_management_run_success{flow="delete_iam_user"} 1' in (
+        tmp_path / "delete_iam_user.prom"
+    ).read_text()
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_run_with_report_records_a_failed_run_on_exit(tmp_path):
+    def flow():
+        record_action(action="iam_user_deletion", outcome="failed")
+        exit(1)
+
+    with pytest.raises(SystemExit):
+        run_with_report(flow="delete_iam_user", function=flow, report_dir=str(tmp_path))
+
+    report = json.loads(next(tmp_path.glob("delete_iam_user-*.json")).read_text())
+    assert report["status"] == "failed"
+    assert 'ccs_user_management_run_success{flow="delete_iam_user"} 0' in (
+        tmp_path / "delete_iam_user.prom"
+    ).read_text()
+
+
+def test_run_with_report_treats_a_clean_exit_as_success(tmp_path):
+    def flow():
+        exit(0)
+
+    with pytest.raises(SystemExit):
+        run_with_report(flow="warn_iam_user", function=flow, report_dir=str(tmp_path))
+
+    report = json.loads(next(tmp_path.glob("warn_iam_user-*.json")).read_text())
+    assert report["status"] == "success"
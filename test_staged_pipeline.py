@@ -0,0 +1,70 @@
+from staged_pipeline import create_stage, run_pipeline
+
+import pytest
+import time
+
+
+def test_run_pipeline_runs_every_stage_and_flushes_on_finish():
+    collected = []
+
+    stage_metrics = run_pipeline(
+        source=range(100),
+        stages=[
+            create_stage(name="split", function=lambda item: [item, item], queue_size=1),
+            create_stage(
+                name="double",
+                function=lambda item: [item * 2] if item % 2 else [],
+                workers=4,
+                queue_size=2,
+                finish=lambda: [-1],
+            ),
+            create_stage(name="collect", function=lambda item: collected.append(item) or []),
+        ],
+    )
+
+    assert sorted(collected) == [-1] + sorted([item * 2 for item in range(100) if item % 2] * 2)
+    assert stage_metrics["split"]["items_in"] == 100
+    assert stage_metrics["split"]["items_out"] == 200
+    assert stage_metrics["double"]["items_out"] == 101
+    assert stage_metrics["collect"]["items_in"] == 101
+
+
+def test_run_pipeline_raises_the_first_stage_error():
+    def fail_on_ten(item):
+        if item == 10:
+            exit(1)
+        return [item]
+
+    with pytest.raises(SystemExit):
+        run_pipeline(
+            source=range(1000),
+            stages=[
+                create_stage(name="fail", function=fail_on_ten, queue_size=1),
+                create_stage(name="collect", function=lambda item: [], queue_size=1),
+            ],
+        )
+
+
+def test_run_pipeline_drains_completed_items_after_an_error():
+    collected = []
+
+    def fail_on_ten(item):
+        if item == 10:
+            raise RuntimeError("failed")
+        return [item]
+
+    with pytest.raises(RuntimeError):
+        run_pipeline(
+            source=range(1000),
+            stages=[
+                create_stage(name="fail", function=fail_on_ten),
+                create_stage(
+                    name="collect",
+                    function=lambda item: time.sleep(0.001) or collected.append(item) or [],
+                    finish=lambda: collected.append("finished") or [],
+                    drain=True,
+                ),
+            ],
+        )
+
+    assert collected == list(range(10))
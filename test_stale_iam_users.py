@@ -0,0 +1,317 @@
+import stale_iam_users
+from stale_iam_users import (
+    apply_action_plan,
+    build_action_plan,
+    csv_file_handler,
+    read_state_file,
+    update_state_file,
+)
+
+import pytest
+
+
+def write_stale_iam_users_csv(tmp_path, rows):
+    csv_filename = tmp_path / "stale_iam_users.csv"
+    csv_filename.write_text(
+        "account_id,iam_username,inactivity_in_days\n"
+        + "".join(f"{account_id},{iam_username},{days} days\n" for account_id, iam_username, days in rows)
+    )
+    return str(csv_filename)
+
+
+def build_test_action_plan(csv_filename, previous_state=None):
+    return build_action_plan(
+        csv_filename=csv_filename,
+        deletion_threshold=90,
+        ignore_list="",
+        warning_threshold=80,
+        previous_state=previous_state,
+    )
+
+
+@pytest.fixture
+def stale_clients(monkeypatch):
+    stale_clients = {"dispatched": [], "deleted": [], "inventories": []}
+
+    def delete_iam_user_handler(aws_account, iam_client, iam_user, inventory=None):
+        if iam_user == "carol":
+            exit(1)
+        if iam_user == "mallory":
+            return False
+        stale_clients["deleted"].append((aws_account, iam_user, inventory))
+        return True
+
+    def build_iam_inventory(aws_account, iam_client):
+        stale_clients["inventories"].append(aws_account)
+        return {"users": {}}
+
+    monkeypatch.setattr(
+        stale_iam_users,
+        "configure_secretsmanager_resources",
+        lambda **kwargs: ("api-key", "deletion-template", "warning-template"),
+    )
+    monkeypatch.setattr(stale_iam_users, "create_iam_client", lambda: None)
+    monkeypatch.setattr(stale_iam_users, "build_iam_inventory", build_iam_inventory)
+    monkeypatch.setattr(stale_iam_users, "iam_inventory_min_deletions", 2)
+    monkeypatch.setattr(stale_iam_users, "delete_iam_user_handler", delete_iam_user_handler)
+    monkeypatch.setattr(
+        stale_iam_users,
+        "dispatch_notifications",
+        lambda api_key, notifications, notification_spool=None: stale_clients["dispatched"].append(
+            notifications
+        ),
+    )
+    return stale_clients
+
+
+def run_test_csv_file_handler(csv_filename, state_file):
+    return csv_file_handler(
+        api_key_resource_name="api-key",
+        csv_filename=csv_filename,
+        deletion_template_resource_name="deletion-template",
+        deletion_threshold=90,
+        ignore_list="",
+        warning_threshold=80,
+        warning_template_resource_name="warning-template",
+        state_file=state_file,
+    )
+
+
+def test_build_action_plan_without_state_plans_every_action(tmp_path):
+    csv_filename = write_stale_iam_users_csv(
+        tmp_path, [("111", "alice", 85), ("111", "bob", 10), ("222", "carol", 95)]
+    )
+    action_plan = build_test_action_plan(csv_filename=csv_filename)
+    assert [planned_action["action"] for planned_action in action_plan["actions"]] == [
+        "warning",
+        "deletion",
+    ]
+    assert sorted(action_plan["state"]) == ["111/alice", "222/carol"]
+
+
+def test_build_action_plan_only_plans_changed_actions(tmp_path):
+    previous_action_plan = build_test_action_plan(
+        csv_filename=write_stale_iam_users_csv(
+            tmp_path, [("111", "alice", 85), ("111", "bob", 79), ("222", "carol", 88)]
+        )
+    )
+    state_file = str(tmp_path / "state.json")
+    update_state_file(state_file=state_file, state=previous_action_plan["state"])
+    action_plan = build_test_action_plan(
+        csv_filename=write_stale_iam_users_csv(
+            tmp_path, [("111", "alice", 86), ("111", "bob", 80), ("222", "carol", 90)]
+        ),
+        previous_state=read_state_file(state_file=state_file),
+    )
+    assert [
+        (planned_action["iam_user"], planned_action["action"])
+        for planned_action in action_plan["actions"]
+    ] == [("bob", "warning"), ("carol", "deletion")]
+    assert len(action_plan["state"]) == 3
+
+
+def test_read_state_file_that_does_not_exist(tmp_path):
+    assert read_state_file(state_file=str(tmp_path / "missing.json")) == {}
+
+
+def test_build_action_plan_fires_each_escalation_tier_once_and_reviews_access_keys(tmp_path):
+    escalation_policy = "60:warning,75:warning,88:access_key_deactivation,90:deletion"
+    previous_state = None
+    planned_actions = []
+    access_key_review_days = []
+    for days in (59, 60, 61, 75, 76, 88, 89, 90):
+        action_plan = build_action_plan(
+            csv_filename=write_stale_iam_users_csv(tmp_path, [("111", "alice", days)]),
+            deletion_threshold=90,
+            ignore_list="",
+            warning_threshold=80,
+            previous_state=previous_state,
+            escalation_policy=escalation_policy,
+        )
+        planned_actions.extend(
+            (planned_action["tier"], planned_action["action"])
+            for planned_action in action_plan["actions"]
+        )
+        if action_plan["access_key_reviews"]:
+            access_key_review_days.append(days)
+        previous_state = action_plan["state"]
+    assert planned_actions == [(60, "warning"), (75, "warning"), (90, "deletion")]
+    assert access_key_review_days == [88, 89]
+
+
+def test_apply_action_plan_sends_queued_notifications_before_exiting(tmp_path, monkeypatch):
+    dispatched = []
+
+    def delete_iam_user_handler(aws_account, iam_client, iam_user, inventory=None):
+        if iam_user == "carol":
+            exit(1)
+        return True
+
+    monkeypatch.setattr(
+        stale_iam_users,
+        "configure_secretsmanager_resources",
+        lambda **kwargs: ("api-key", "deletion-template", "warning-template"),
+    )
+    monkeypatch.setattr(stale_iam_users, "create_iam_client", lambda: None)
+    monkeypatch.setattr(stale_iam_users, "build_iam_inventories", lambda **kwargs: {})
+    monkeypatch.setattr(stale_iam_users, "delete_iam_user_handler", delete_iam_user_handler)
+    monkeypatch.setattr(
+        stale_iam_users,
+        "dispatch_notifications",
+        lambda api_key, notifications, notification_spool=None: dispatched.extend(notifications),
+    )
+    action_plan = build_test_action_plan(
+        csv_filename=write_stale_iam_users_csv(
+            tmp_path, [("111", "alice", 85), ("111", "bob", 95), ("222", "carol", 95)]
+        )
+    )
+
+    with pytest.raises(SystemExit):
+        apply_action_plan(
+            action_plan=action_plan,
+            api_key_resource_name="api-key",
+            deletion_template_resource_name="deletion-template",
+            warning_template_resource_name="warning-template",
+        )
+
+    assert [
+        (notification["notification_type"], notification["email_address"]) for notification in dispatched
+    ] == [("iam_inactivity_warning", "alice"), ("iam_user_deletion", "bob")]
+
+
+def test_action_plan_state_only_replaces_the_accounts_in_the_report(tmp_path):
+    state_file = str(tmp_path / "state.json")
+    update_state_file(
+        state_file=state_file, state={"111/alice": 80, "111/bob": 80, "222/carol": 80}
+    )
+    action_plan = build_test_action_plan(
+        csv_filename=write_stale_iam_users_csv(tmp_path, [("111", "alice", 85), ("111", "bob", 3)]),
+        previous_state=read_state_file(state_file=state_file),
+    )
+
+    update_state_file(
+        state_file=state_file,
+        state=action_plan["state"],
+        replaced_account_ids=action_plan["account_ids"],
+    )
+
+    assert read_state_file(state_file=state_file) == {"111/alice": 80, "222/carol": 80}
+
+
+def test_csv_file_handler_sends_batches_and_records_each_in_the_state_file(
+    tmp_path, monkeypatch, stale_clients
+):
+    monkeypatch.setattr(stale_iam_users, "stale_notify_batch_size", 2)
+    state_file = str(tmp_path / "state.json")
+    update_state_file(state_file=state_file, state={"111/frank": 80, "333/grace": 80})
+    state_after_each_batch = []
+    dispatch_notifications = stale_iam_users.dispatch_notifications
+    monkeypatch.setattr(
+        stale_iam_users,
+        "dispatch_notifications",
+        lambda **kwargs: state_after_each_batch.append(read_state_file(state_file=state_file))
+        or dispatch_notifications(**kwargs),
+    )
+
+    stage_metrics = run_test_csv_file_handler(
+        csv_filename=write_stale_iam_users_csv(
+            tmp_path,
+            [
+                ("111", "alice", 85),
+                ("111", "bob", 95),
+                ("111", "dave", 95),
+                ("222", "erin", 95),
+                ("222", "ivan", 3),
+            ],
+        ),
+        state_file=state_file,
+    )
+
+    assert list(stage_metrics) == ["parse", "decide", "act", "notify"]
+    assert stage_metrics["decide"]["items_in"] == 5
+    assert stage_metrics["notify"]["items_in"] == 4
+    assert [len(notifications) for notifications in stale_clients["dispatched"]] == [2, 2]
+    assert len(state_after_each_batch[1]) == 4
+    assert stale_clients["inventories"] == ["111"]
+    assert sorted(
+        (aws_account, inventory is not None) for aws_account, _, inventory in stale_clients["deleted"]
+    ) == [("111", False), ("111", True), ("222", False)]
+    assert read_state_file(state_file=state_file) == {
+        "111/alice": 80,
+        "111/bob": 90,
+        "111/dave": 90,
+        "222/erin": 90,
+        "333/grace": 80,
+    }
+
+
+def test_csv_file_handler_sends_completed_notifications_before_exiting(
+    tmp_path, monkeypatch, stale_clients
+):
+    monkeypatch.setattr(stale_iam_users, "stale_iam_workers", 1)
+    state_file = str(tmp_path / "state.json")
+    update_state_file(state_file=state_file, state={"111/frank": 80})
+
+    with pytest.raises(SystemExit):
+        run_test_csv_file_handler(
+            csv_filename=write_stale_iam_users_csv(
+                tmp_path,
+                [("111", "alice", 85), ("111", "bob", 95), ("111", "carol", 95), ("111", "dave", 95)],
+            ),
+            state_file=state_file,
+        )
+
+    assert [
+        (notification["notification_type"], notification["email_address"])
+        for notifications in stale_clients["dispatched"]
+        for notification in notifications
+    ] == [("iam_inactivity_warning", "alice"), ("iam_user_deletion", "bob")]
+    assert read_state_file(state_file=state_file) == {"111/frank": 80, "111/alice": 80, "111/bob": 90}
+
+
+def test_csv_file_handler_does_not_notify_or_record_failed_deletions(
+    tmp_path, monkeypatch, stale_clients
+):
+    state_file = str(tmp_path / "state.json")
+    update_state_file(state_file=state_file, state={"111/mallory": 80})
+
+    with pytest.raises(SystemExit):
+        run_test_csv_file_handler(
+            csv_filename=write_stale_iam_users_csv(
+                tmp_path, [("111", "alice", 85), ("111", "bob", 95), ("111", "mallory", 95)]
+            ),
+            state_file=state_file,
+        )
+
+    assert sorted(
+        (notification["notification_type"], notification["email_address"])
+        for notifications in stale_clients["dispatched"]
+        for notification in notifications
+    ) == [("iam_inactivity_warning", "alice"), ("iam_user_deletion", "bob")]
+    assert read_state_file(state_file=state_file) == {"111/alice": 80, "111/bob": 90, "111/mallory": 80}
+
+
+def test_apply_action_plan_does_not_notify_or_record_failed_deletions(
+    tmp_path, monkeypatch, stale_clients
+):
+    monkeypatch.setattr(stale_iam_users, "build_iam_inventories", lambda **kwargs: {})
+    state_file = str(tmp_path / "state.json")
+    action_plan = build_test_action_plan(
+        csv_filename=write_stale_iam_users_csv(tmp_path, [("111", "bob", 95), ("111", "mallory", 95)])
+    )
+
+    with pytest.raises(SystemExit):
+        apply_action_plan(
+            action_plan=action_plan,
+            api_key_resource_name="api-key",
+            deletion_template_resource_name="deletion-template",
+            warning_template_resource_name="warning-template",
+            state_file=state_file,
+        )
+
+    assert [
+        notification["email_address"]
+        for notifications in stale_clients["dispatched"]
+        for notification in notifications
+    ] == ["bob"]
+    assert read_state_file(state_file=state_file) == {"111/bob": 90}
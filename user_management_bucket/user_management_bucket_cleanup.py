@@ -1,6 +1,7 @@
 import argparse
-import boto3
 import logging
+from aws_client_registry import get_client
+from run_report import record_action, run_with_report
 
 logging.basicConfig(level=logging.INFO)
 
@@ -23,14 +24,14 @@ def parse_arguments():
     return parser.parse_args()
 
 
-def get_args(args=parse_arguments()):
+def get_args(args):
     bucket_name = args.bucket_name
     bucket_paths = args.bucket_paths.split(",")
     return bucket_name, bucket_paths
 
 
 def create_s3_client():
-    client = boto3.client('s3')
+    client = get_client(service_name='s3')
     return client
 
 
@@ -51,16 +52,19 @@ def delete_file_within_folder(s3_client, bucket_name, bucket_resource):
         logging.debug(f"Deleting {bucket_resource} from S3 Bucket: {bucket_name}")
         s3_client.delete_object(Bucket=bucket_name, Key=bucket_resource)
         logging.info(f"Successfully deleted {bucket_resource}")
+        record_action(action="bucket_object_deletion", outcome="deleted")
     except Exception as e:
         logging.error(f"Failed to delete {bucket_resource} from S3 Bucket: {bucket_name}: {e}")
+        record_action(action="bucket_object_deletion", outcome="failed")
         exit(1)
 
 
 def user_management_bucket_cleanup():
-    bucket_name, bucket_paths = get_args()
+    bucket_name, bucket_paths = get_args(args=parse_arguments())
     s3_client = create_s3_client()
     for bucket_path in bucket_paths:
         delete_all_files_within_folder(s3_client=s3_client, bucket_name=bucket_name, bucket_path=bucket_path)
 
 
-user_management_bucket_cleanup()
+if __name__ == "__main__":
+    run_with_report(flow="user_management_bucket_cleanup", function=user_management_bucket_cleanup)